@@ -1,10 +1,57 @@
 # Usage
 # python getwebpage.py ed_article https://www.theguardian.com/technology/2025/mar/31/bridget-phillipson-eyes-ais-potential-to-free-up-teachers-time
+# python getwebpage.py --batch pages.tsv --workers 4 --output-dir pages   # One 'file_id<TAB>url' per line (or a .jsonl of {"id", "url"})
 
+import os
 import argparse
 import requests
 import validators
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+from getwebpagebatch import run_batch
+from streamtext import TextExtractor
+
+# Obtain the 'User-Agent' at 'https://httpbin.org/headers'
+# Setting up the 'User-Agent' may not prevent websites from restricting automated access and returning a 403 Forbidden error
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36 Edg/135.0.0.0'}
+TEXT_TAGS = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p']
+CHUNK_SIZE = 64 * 1024  # Characters read from the response and fed to the text extractor at a time
+
+
+def new_session(pool_size=1):
+    """A requests session with a connection pool large enough for 'pool_size' concurrent fetches."""
+    http = requests.Session()
+    http.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    http.mount('https://', adapter)
+    http.mount('http://', adapter)
+    return http
+
+
+def fetch_page(http, file_id, url, output_dir='.'):
+    """Fetch a web page, save it as an HTML file, and extract 'h' and 'p' tags' text to a separate file. Raises on failure."""
+    if not validators.url(url):
+        raise ValueError(f'Invalid URL: {url}')
+
+    # Fetch the web page with a timeout; the body is read in chunks so a page of any size is never held whole
+    html_file_path = os.path.join(output_dir, f"{file_id}.html")
+    text_file_path = os.path.join(output_dir, f"{file_id}.txt")
+    with http.get(url, timeout=10, stream=True) as response:
+        response.raise_for_status()  # Raise an HTTPError for bad responses
+        # Without a charset in Content-Type, requests decodes text/* as ISO-8859-1 (and guesses with apparent_encoding,
+        # which needs the whole body, for other types); such pages are decoded as UTF-8, the HTML5 default, instead
+        if 'charset' not in response.headers.get('Content-Type', '').lower():
+            response.encoding = 'utf-8'
+
+        # Save the HTML content to a file and extract text from 'h' and 'p' tags as it arrives
+        with open(html_file_path, 'w', encoding='utf-8') as html_file, open(text_file_path, 'w', encoding='utf-8') as text_file:
+            extractor = TextExtractor(text_file, TEXT_TAGS)
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE, decode_unicode=True):
+                html_file.write(chunk)
+                extractor.feed(chunk)
+            extractor.close()
+    return html_file_path, text_file_path
+
 
 def main(file_id, url):
     """Fetch a web page, save it as an HTML file, and extract 'h' and 'p' tags' text to a separate file."""
@@ -13,39 +60,32 @@ def main(file_id, url):
         print("Invalid URL. Please provide a valid URL.")
         return
 
-    http = requests.Session()
-    # Obtain the 'User-Agent' at 'https://httpbin.org/headers'
-    # Setting up the 'User-Agent' may not prevent websites from restricting automated access and returning a 403 Forbidden error
-    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36 Edg/135.0.0.0'}
     try:
-        # Fetch the web page with a timeout
-        response = http.get(url, headers=headers, timeout=10)
-        response.raise_for_status()  # Raise an HTTPError for bad responses
-
-        # Save the HTML content to a file
-        html_file_path = f"{file_id}.html"
-        with open(html_file_path, 'w', encoding='utf-8') as html_file:
-            html_file.write(response.text)
+        html_file_path, text_file_path = fetch_page(new_session(), file_id, url)
         print(f"Successfully saved HTML to {html_file_path}")
-
-        # Extract text from 'h' and 'p' tags
-        soup = BeautifulSoup(response.text, 'lxml')
-        text_content = []
-        for tag in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p']):
-            text_content.append(tag.get_text(strip=True))
-
-        # Save the extracted text to a file
-        text_file_path = f"{file_id}.txt"
-        with open(text_file_path, 'w', encoding='utf-8') as text_file:
-            text_file.write("\n".join(text_content))
         print(f"Successfully saved extracted text to {text_file_path}")
-
     except requests.exceptions.RequestException as e:
         print(f"Failed to fetch the URL: {e}")
 
+
+def main_batch(batch_path, workers, status_path, output_dir):
+    """Fetch every page of a batch file through one pooled session, with at most 'workers' requests in flight."""
+    http = new_session(workers)
+    run_batch(batch_path, lambda file_id, url, out: fetch_page(http, file_id, url, out), workers, status_path, output_dir)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Get a web page, save its HTML, and extract 'h' and 'p' tags' text.")
-    parser.add_argument('file_id', type=str, help="Web page's filename (without extension)")
-    parser.add_argument('url', type=str, help="Web page's URL")
+    parser.add_argument('file_id', type=str, nargs='?', help="Web page's filename (without extension)")
+    parser.add_argument('url', type=str, nargs='?', help="Web page's URL")
+    parser.add_argument('--batch', type=str, help="TSV ('file_id<TAB>url' per line) or JSONL ({\"id\", \"url\"}) of pages to fetch")
+    parser.add_argument('--workers', type=int, default=4, help="Concurrent fetches in batch mode (default: 4)")
+    parser.add_argument('--status', type=str, help="Batch status file (default: <batch>.status.jsonl); 'ok' entries are skipped on re-run")
+    parser.add_argument('--output-dir', type=str, default='.', help="Directory for the batch outputs (default: current directory)")
     args = parser.parse_args()
-    main(args.file_id, args.url)
+    if args.batch:
+        main_batch(args.batch, args.workers, args.status, args.output_dir)
+    elif args.file_id and args.url:
+        main(args.file_id, args.url)
+    else:
+        parser.error("Give a file_id and a url, or --batch")
@@ -0,0 +1,118 @@
+# Batch helpers shared by getwebpage.py and getwebpageselenium.py (--batch)
+
+import os
+import json
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def read_batch(batch_path):
+    """Yield (file_id, url) pairs from a TSV file (file_id<TAB>url per line) or a JSONL file ({"id": ..., "url": ...})."""
+    with open(batch_path, 'r', encoding='utf-8') as batch_file:
+        for line in batch_file:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if batch_path.endswith('.jsonl'):
+                entry = json.loads(line)
+                yield entry['id'], entry['url']
+            else:
+                file_id, url = line.split('\t', 1)
+                yield file_id.strip(), url.strip()
+
+
+class BatchStatus:
+    """
+    Append-only JSONL status file: one line per fetched URL; the last line for an id wins.
+    Superseded and torn lines are compacted away on load, and every line is fsync'd.
+    """
+
+    def __init__(self, status_path):
+        self.status_path = status_path
+        self.lock = threading.Lock()
+        self.entries = {}
+        lines = 0
+        if os.path.exists(status_path):
+            with open(status_path, 'r', encoding='utf-8') as status_file:
+                for line in status_file:
+                    lines += 1
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Torn last line after a crash
+                    self.entries[entry['id']] = entry
+        if lines != len(self.entries):
+            # Rewrite without the superseded and torn lines, so nothing is appended to a torn line
+            tmp_path = f'{status_path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as tmp_file:
+                for entry in self.entries.values():
+                    tmp_file.write(json.dumps(entry) + '\n')
+            os.replace(tmp_path, status_path)
+        self.status_file = open(status_path, 'a', encoding='utf-8')
+
+    def is_done(self, file_id, url):
+        with self.lock:
+            entry = self.entries.get(file_id)
+        return entry is not None and entry['status'] == 'ok' and entry['url'] == url
+
+    def record(self, file_id, url, status, error=None):
+        entry = {'id': file_id, 'url': url, 'status': status, 'time': datetime.now(timezone.utc).isoformat(timespec='seconds')}
+        if error:
+            entry['error'] = error
+        with self.lock:
+            self.entries[file_id] = entry
+            self.status_file.write(json.dumps(entry) + '\n')
+            self.status_file.flush()
+            os.fsync(self.status_file.fileno())
+
+    def close(self):
+        self.status_file.close()
+
+
+def run_batch(batch_path, fetch_one, workers, status_path=None, output_dir='.'):
+    """
+    Fetch every (file_id, url) pair of a batch file with at most 'workers' fetches in flight.
+    fetch_one(file_id, url, output_dir) saves the outputs and raises on failure.
+    Pairs already fetched successfully according to the status file are skipped.
+    """
+    status_path = status_path or f'{batch_path}.status.jsonl'
+    os.makedirs(output_dir, exist_ok=True)
+    status = BatchStatus(status_path)
+    counts = {'ok': 0, 'failed': 0, 'skipped': 0}
+
+    def task(file_id, url):
+        try:
+            fetch_one(file_id, url, output_dir)
+        except Exception as e:
+            status.record(file_id, url, 'failed', f'{type(e).__name__}: {e}')
+            return file_id, 'failed'
+        status.record(file_id, url, 'ok')
+        return file_id, 'ok'
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+            for file_id, url in read_batch(batch_path):
+                if status.is_done(file_id, url):
+                    counts['skipped'] += 1
+                    continue
+                # Bounded: never more than two pairs per worker waiting, so huge batch files are streamed
+                if len(pending) >= 2 * workers:
+                    done = next(as_completed(pending))
+                    pending.remove(done)
+                    report(done, counts)
+                pending.add(executor.submit(task, file_id, url))
+            for done in as_completed(pending):
+                report(done, counts)
+    finally:
+        status.close()
+
+    print(f"Batch finished: {counts['ok']} saved, {counts['failed']} failed, {counts['skipped']} already done (status in {status_path})")
+    return counts
+
+
+def report(future, counts):
+    file_id, result = future.result()
+    counts[result] += 1
+    print(f'{file_id}: {result}')
@@ -1,10 +1,11 @@
 # Usage
 # python getwebpageselenium.py wwf_index_sample https://www.worldwildlife.org/stories?page=1&threat_id=effects-of-climate-change
+# python getwebpageselenium.py --batch pages.tsv --workers 2 --output-dir pages   # One 'file_id<TAB>url' per line (or a .jsonl of {"id", "url"})
 
+import os
 import argparse
+import threading
 import validators
-from bs4 import BeautifulSoup
-import time
 from selenium import webdriver
 #from selenium.webdriver.edge.service import Service
 from selenium.webdriver.firefox.service import Service
@@ -13,15 +14,34 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 #from selenium.webdriver.edge.options import Options
 from selenium.webdriver.firefox.options import Options
-
-def main(file_id, url):
-    """Fetch a web page using Selenium, save it as an HTML file, and extract 'h', 'p', 'ul' and 'ol' tags text."""
-
-    # Validate URL
-    if not validators.url(url):
-        print("Invalid URL. Please provide a valid URL.")
-        return
-
+from selenium.common.exceptions import WebDriverException
+
+from getwebpagebatch import run_batch
+from streamtext import TextExtractor
+
+TEXT_TAGS = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'ul', 'ol']
+CHUNK_SIZE = 64 * 1024  # Characters of the page source fed to the text extractor at a time
+
+# Resolves once the page has finished loading and the DOM has not changed for 'quietMs',
+# or after 'maxMs' at the latest. Returns the milliseconds waited.
+STABLE_PAGE_JS = """
+const quietMs = arguments[0], maxMs = arguments[1], done = arguments[arguments.length - 1];
+const start = performance.now();
+let quietTimer = null;
+const finish = () => { observer.disconnect(); clearTimeout(quietTimer); clearTimeout(maxTimer); done(performance.now() - start); };
+const restart = () => {
+    clearTimeout(quietTimer);
+    if (document.readyState === 'complete') { quietTimer = setTimeout(finish, quietMs); }
+};
+const observer = new MutationObserver(restart);
+observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true, characterData: true});
+document.addEventListener('readystatechange', restart);
+const maxTimer = setTimeout(finish, maxMs);
+restart();
+"""
+
+def setup_driver():
+    """Start a headless browser; in batch mode each worker keeps one for all its pages."""
     # Set up the WebDriver (make sure you have downloaded the Microsoft Edge WebDriver executable)
     # https://developer.microsoft.com/en-us/microsoft-edge/tools/webdriver/
     # Set up the WebDriver (make sure you have downloaded the latest 'geckodrive' executable)
@@ -46,57 +66,111 @@ def main(file_id, url):
     options = Options()
     options.add_argument('--headless')
 
-    #driver = webdriver.Edge(service=service, options=options)
-    driver = webdriver.Firefox(service=service, options=options)
+    #return webdriver.Edge(service=service, options=options)
+    return webdriver.Firefox(service=service, options=options)
 
-    try:
-        # Navigate to the URL
-        driver.get(url)
-
-        # Explicit wait for stable page load
-        wait = WebDriverWait(driver, 10)
-        wait.until(EC.presence_of_element_located((By.TAG_NAME, 'body')))
-
-        # Extra reliability check: Wait until the page source stops changing
-        max_wait_time = 30  # Max time in seconds
-        start_time = time.time()
-        previous_html = ''
-
-        while True:
-            current_html = driver.page_source
-            if current_html == previous_html or time.time() - start_time > max_wait_time:
-                break  # Exit loop if page stops changing or max wait time is exceeded
-            previous_html = current_html
-            time.sleep(2)  # Short delay before checking again
-
-        # Now, the page is fully loaded - extract content!
-
-        # Get the full page source
-        page_source = driver.page_source
-
-        # Save the HTML content to a file
-        html_file_path = f"{file_id}.html"
-        with open(html_file_path, 'w', encoding='utf-8') as html_file:
-            html_file.write(page_source)
-        print(f"Successfully saved HTML to {html_file_path}")
 
-        # Extract text from 'h' and 'p' tags
-        soup = BeautifulSoup(page_source, 'lxml')
-        text_content = [tag.get_text(strip=True) for tag in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'ul', 'ol'])]
+def fetch_page(driver, file_id, url, output_dir='.'):
+    """Load a web page in the driver, save it as an HTML file, and extract 'h', 'p', 'ul' and 'ol' tags text. Raises on failure."""
+    if not validators.url(url):
+        raise ValueError(f'Invalid URL: {url}')
 
-        # Save the extracted text to a file
-        text_file_path = f"{file_id}.txt"
-        with open(text_file_path, 'w', encoding='utf-8') as text_file:
-            text_file.write("\n".join(text_content))
-        print(f"Successfully saved extracted text to {text_file_path}")
+    # Navigate to the URL
+    driver.get(url)
+
+    # Explicit wait for stable page load
+    wait = WebDriverWait(driver, 10)
+    wait.until(EC.presence_of_element_located((By.TAG_NAME, 'body')))
+
+    # Extra reliability check: Wait until the page stops changing
+    # A MutationObserver in the page signals when the DOM has been quiet for a moment,
+    # instead of pulling and comparing the whole page_source every 2 seconds
+    max_wait_time = 30  # Max time in seconds
+    quiet_time = 1  # Seconds without DOM changes that count as stable
+    driver.set_script_timeout(max_wait_time + 10)
+    driver.execute_async_script(STABLE_PAGE_JS, quiet_time * 1000, max_wait_time * 1000)
+
+    # Now, the page is fully loaded - extract content!
+
+    # Get the full page source
+    page_source = driver.page_source
+
+    # Save the HTML content to a file
+    html_file_path = os.path.join(output_dir, f"{file_id}.html")
+    with open(html_file_path, 'w', encoding='utf-8') as html_file:
+        html_file.write(page_source)
+
+    # Extract text from 'h', 'p', 'ul' and 'ol' tags, written out as each element closes
+    text_file_path = os.path.join(output_dir, f"{file_id}.txt")
+    with open(text_file_path, 'w', encoding='utf-8') as text_file:
+        extractor = TextExtractor(text_file, TEXT_TAGS)
+        for start in range(0, len(page_source), CHUNK_SIZE):
+            extractor.feed(page_source[start:start + CHUNK_SIZE])
+        extractor.close()
+    return html_file_path, text_file_path
 
+
+def main(file_id, url):
+    """Fetch a web page using Selenium, save it as an HTML file, and extract 'h', 'p', 'ul' and 'ol' tags text."""
+
+    # Validate URL
+    if not validators.url(url):
+        print("Invalid URL. Please provide a valid URL.")
+        return
+
+    driver = setup_driver()
+    try:
+        html_file_path, text_file_path = fetch_page(driver, file_id, url)
+        print(f"Successfully saved HTML to {html_file_path}")
+        print(f"Successfully saved extracted text to {text_file_path}")
     finally:
         # Close the WebDriver
         driver.quit()
 
+
+def main_batch(batch_path, workers, status_path, output_dir):
+    """Fetch every page of a batch file with 'workers' browsers, each started once and reused for its pages."""
+    local = threading.local()
+    drivers = []
+    drivers_lock = threading.Lock()
+
+    def fetch_one(file_id, url, out):
+        if getattr(local, 'driver', None) is None:
+            local.driver = setup_driver()
+            with drivers_lock:
+                drivers.append(local.driver)
+        try:
+            fetch_page(local.driver, file_id, url, out)
+        except WebDriverException:
+            # The browser may have crashed or lost its session: replace it for this worker's next page
+            driver, local.driver = local.driver, None
+            with drivers_lock:
+                drivers.remove(driver)
+            try:
+                driver.quit()
+            except Exception:
+                pass
+            raise
+
+    try:
+        run_batch(batch_path, fetch_one, workers, status_path, output_dir)
+    finally:
+        for driver in drivers:
+            driver.quit()
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Get a web page with Selenium, save its HTML, and extract 'h' and 'p' tags' text.")
-    parser.add_argument('file_id', type=str, help="Web page's filename (without extension)")
-    parser.add_argument('url', type=str, help="Web page's URL")
+    parser.add_argument('file_id', type=str, nargs='?', help="Web page's filename (without extension)")
+    parser.add_argument('url', type=str, nargs='?', help="Web page's URL")
+    parser.add_argument('--batch', type=str, help="TSV ('file_id<TAB>url' per line) or JSONL ({\"id\", \"url\"}) of pages to fetch")
+    parser.add_argument('--workers', type=int, default=1, help="Browsers fetching in parallel in batch mode (default: 1)")
+    parser.add_argument('--status', type=str, help="Batch status file (default: <batch>.status.jsonl); 'ok' entries are skipped on re-run")
+    parser.add_argument('--output-dir', type=str, default='.', help="Directory for the batch outputs (default: current directory)")
     args = parser.parse_args()
-    main(args.file_id, args.url)
+    if args.batch:
+        main_batch(args.batch, args.workers, args.status, args.output_dir)
+    elif args.file_id and args.url:
+        main(args.file_id, args.url)
+    else:
+        parser.error("Give a file_id and a url, or --batch")
@@ -0,0 +1,84 @@
+# Streaming heading/paragraph text extraction shared by getwebpage.py and getwebpageselenium.py
+
+from lxml import etree
+
+# Text of these elements is never part of get_text() in Beautiful Soup
+SKIPPED_TAGS = ('script', 'style', 'template')
+
+
+class TextExtractor:
+    """
+    Write the text of the given tags to a file while the HTML is still being fed, the same lines as
+    BeautifulSoup(html, 'lxml').find_all(tags) with get_text(strip=True), one per line.
+    Elements are cleared as soon as they are no longer needed, so memory stays flat however long the page is.
+    """
+
+    def __init__(self, text_file, tags):
+        self.text_file = text_file
+        self.tags = set(tags)
+        self.parser = etree.HTMLPullParser(events=('start', 'end'))
+        self.open_matches = []  # Matching elements that have started but not ended, outermost first
+        self.pending = []  # (start order, text) of matches nested in a still open match
+        self.started = 0
+        self.lines = 0
+        self.fed = False
+
+    def feed(self, chunk):
+        self.fed = self.fed or bool(chunk)
+        self.parser.feed(chunk)
+        self._drain()
+
+    def close(self):
+        if not self.fed:
+            return self.lines  # An empty page has no text; lxml would raise 'no element found'
+        self.parser.close()
+        self._drain()
+        return self.lines
+
+    def _write(self, text):
+        if self.lines:
+            self.text_file.write('\n')
+        self.text_file.write(text)
+        self.lines += 1
+
+    def _drain(self):
+        for event, element in self.parser.read_events():
+            if not isinstance(element.tag, str):
+                continue
+            if event == 'start':
+                if element.tag in self.tags:
+                    self.open_matches.append((self.started, element))
+                    self.started += 1
+                continue
+
+            if self.open_matches and self.open_matches[-1][1] is element:
+                order, _ = self.open_matches.pop()
+                self.pending.append((order, element_text(element)))
+                if self.open_matches:
+                    continue
+                # find_all() lists elements in start order, so nested matches follow their outermost match
+                for _, text in sorted(self.pending):
+                    self._write(text)
+                self.pending = []
+
+            if not self.open_matches:
+                # Nothing still open needs this element or anything before it
+                element.clear()
+                parent = element.getparent()
+                while parent is not None and element.getprevious() is not None:
+                    del parent[0]
+
+
+def element_text(element):
+    """Beautiful Soup's get_text(strip=True): every text node of the element, stripped, joined without separator."""
+    return ''.join(text.strip() for text in _strings(element) if text and text.strip())
+
+
+def _strings(element):
+    if element.tag in SKIPPED_TAGS:
+        return
+    yield element.text
+    for child in element:
+        if isinstance(child.tag, str):  # Comments and processing instructions: only their tail is page text
+            yield from _strings(child)
+        yield child.tail
@@ -0,0 +1,94 @@
+import os
+import json
+import logging
+import threading
+from typing import Callable, Hashable
+
+try:
+    import zstandard
+except ImportError:  # Optional: only needed for the zstd format (pip install zstandard)
+    zstandard = None
+
+# Root of the captured corpus, shared by the list and work crawlers
+OUTPUT_ROOT = "corpus/00_sources"
+
+
+def has_class(name: str) -> str:
+    """XPath predicate matching one token of a space-separated class attribute, like bs4's class_."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def read_keyed_jsonl(path: str, key: Callable[[dict], Hashable]) -> tuple[dict, int]:
+    """
+    Reads a keyed JSONL log without changing it: ({key: entry}, the last entry for a key winning; lines in the file).
+    Torn lines (e.g. the last one after a crash) are skipped but counted.
+    """
+    entries, lines = {}, 0
+    if not os.path.exists(path):
+        return entries, lines
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            lines += 1
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            entries[key(entry)] = entry
+    return entries, lines
+
+
+class KeyedJsonlLog:
+    """
+    Append-only JSONL log of entries keyed by key(entry). The last entry for a key wins; superseded and torn
+    lines are compacted away on load (so nothing is appended to a torn line), and every record is flushed and
+    fsync'd before it returns.
+    Subclasses set LABEL and NOUN for the load message and add their own queries.
+    """
+
+    LABEL = "log"
+    NOUN = "entries"
+
+    def __init__(self, path: str, key: Callable[[dict], Hashable]):
+        self.path = path
+        self.key = key
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._entries, lines = read_keyed_jsonl(path, key)
+        if lines != len(self._entries):
+            self._compact()
+        if os.path.exists(path):
+            logging.info(f"Loaded {self.LABEL} {path} ({len(self._entries)} {self.NOUN}).")
+        self._f = open(path, "a", encoding="utf-8")
+
+    def _compact(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in self._entries.values():
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def get(self, key: Hashable) -> dict | None:
+        with self._lock:
+            return self._entries.get(key)
+
+    def values(self) -> list:
+        """A snapshot of the current entries."""
+        with self._lock:
+            return list(self._entries.values())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def record(self, entry: dict) -> dict:
+        """Adds or replaces the entry for its key and makes it durable."""
+        with self._lock:
+            self._entries[self.key(entry)] = entry
+            self._f.write(json.dumps(entry) + "\n")
+            self._f.flush()
+            os.fsync(self._f.fileno())
+        return entry
+
+    def close(self) -> None:
+        if not self._f.closed:
+            self._f.close()
@@ -0,0 +1,180 @@
+import os
+import json
+import heapq
+import random
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+from ao3_common import KeyedJsonlLog
+from ao3_lists_output import page_key
+from ao3_lists_storage import page_name, unit_year
+
+# Delay before the n-th retry of a failed page: RETRY_BACKOFF_S * 2^(n-1), capped, plus up to 10% jitter
+RETRY_BACKOFF_MAX_S = 1800
+RETRY_JITTER = 0.1
+
+# Longest a worker waits for a retry to come due before re-checking for a stop
+WAIT_SLICE_S = 1.0
+
+
+class JobLedger(KeyedJsonlLog):
+    """
+    Record of the list pages that failed at least once, keyed by (unit, page) (see KeyedJsonlLog): status
+    ("retry", "dead" or "ok" once it finally succeeded), attempts so far, last error and time.
+    Pages that never failed are not recorded; the checkpoint manifest already covers them.
+    """
+
+    LABEL = "job ledger"
+    NOUN = "pages that failed before"
+
+    def __init__(self, path: str):
+        super().__init__(path, key=page_key)
+
+    def get_page(self, unit: int | str, page_num: int) -> dict | None:
+        return self.get((unit, page_num))
+
+    def record_attempt(
+            self, unit: int | str, page_num: int, url: str, status: str, attempts: int, error: str | None
+    ) -> dict:
+        """Adds or replaces the entry of a page and makes it durable."""
+        return self.record(
+            {
+                "year": unit_year(unit),
+                **({"window": unit} if isinstance(unit, str) else {}),
+                "page": page_num,
+                "url": url,
+                "status": status,
+                "attempts": attempts,
+                **({"error": error} if error else {}),
+                "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            }
+        )
+
+
+class JobQueue:
+    """
+    Schedules the (unit, page, base_url) jobs of a crawl for the worker pool. Ready jobs are handed out lowest
+    index first; a failed job waits out an exponential backoff in a delay heap while the workers keep draining
+    the healthy ones, and goes to the dead-letter list once it has failed max_attempts times (counted over all
+    runs through the ledger). Pages dead in an earlier run stay dead unless retry_dead is set.
+    Every job handed out is owned by the worker that took it until it reports back, so a job failed on behalf of
+    a hung worker by the supervisor is not reported twice when that worker finally returns.
+    """
+
+    def __init__(
+            self,
+            job_list: list,
+            ledger: JobLedger,
+            *,
+            max_attempts: int,
+            backoff_s: float,
+            retry_dead: bool,
+            stop_event: threading.Event,
+    ):
+        self.ledger = ledger
+        self.max_attempts = max_attempts
+        self.backoff_s = backoff_s
+        self.stop_event = stop_event
+        self._cond = threading.Condition()
+        self._jobs = job_list
+        self._attempts = {}
+        self._ready = []
+        self._delayed = []
+        self._owners = {}  # index -> worker holding the job
+        self.dead = {}  # index -> ledger entry
+        self.previously_dead = []
+
+        for index, (unit, page_num, _) in enumerate(job_list):
+            entry = ledger.get_page(unit, page_num)
+            if entry is not None and entry["status"] != "ok":
+                if entry["status"] == "dead" and not retry_dead:
+                    self.dead[index] = entry
+                    self.previously_dead.append(index)
+                    continue
+                self._attempts[index] = 0 if entry["status"] == "dead" else entry["attempts"]
+            self._ready.append(index)
+        heapq.heapify(self._ready)
+
+    def take(self, worker_id: int) -> tuple | None:
+        """Blocks until a job is ready and returns (index, job); None once every job is done, dead or stopped."""
+        with self._cond:
+            while not self.stop_event.is_set():
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    heapq.heappush(self._ready, heapq.heappop(self._delayed)[1])
+                if self._ready:
+                    index = heapq.heappop(self._ready)
+                    self._owners[index] = worker_id
+                    return index, self._jobs[index]
+                if not self._delayed and not self._owners:
+                    return None
+                # Nothing ready: wait for a retry to come due or for an in-flight job to fail back into the queue
+                wait_s = self._delayed[0][0] - now if self._delayed else WAIT_SLICE_S
+                self._cond.wait(min(wait_s, WAIT_SLICE_S))
+            return None
+
+    def done(self, index: int, worker_id: int) -> bool:
+        """
+        Marks a job as finished for good (captured, resumed, or past its unit's end).
+        Returns False, changing nothing, if the job was taken away from this worker meanwhile.
+        """
+        unit, page_num, base_url = self._jobs[index]
+        with self._cond:
+            if self._owners.get(index) != worker_id:
+                return False
+            del self._owners[index]
+            self._cond.notify_all()
+        if index in self._attempts:
+            self.ledger.record_attempt(
+                unit, page_num, f"{base_url}{page_num}", "ok", self._attempts[index], None
+            )
+        return True
+
+    def failed(self, index: int, worker_id: int, error: str) -> str | None:
+        """
+        Counts a failed attempt at a job. Returns "retry" if it was rescheduled after a backoff, "dead" if it has
+        used up its attempts and is now a dead letter, or None if the job was taken away from this worker meanwhile.
+        """
+        unit, page_num, base_url = self._jobs[index]
+        with self._cond:
+            if self._owners.get(index) != worker_id:
+                return None
+            del self._owners[index]
+            attempts = self._attempts.get(index, 0) + 1
+            self._attempts[index] = attempts
+            dead = attempts >= self.max_attempts
+            if not dead:
+                delay_s = min(RETRY_BACKOFF_MAX_S, self.backoff_s * 2 ** (attempts - 1))
+                delay_s *= 1 + random.uniform(0, RETRY_JITTER)
+                heapq.heappush(self._delayed, (time.monotonic() + delay_s, index))
+            self._cond.notify_all()
+
+        entry = self.ledger.record_attempt(
+            unit, page_num, f"{base_url}{page_num}", "dead" if dead else "retry", attempts, error
+        )
+        if dead:
+            self.dead[index] = entry
+            logging.error(f"Giving up on {page_name(unit, page_num)} after {attempts} attempts ({error}).")
+            return "dead"
+        logging.warning(
+            f"{page_name(unit, page_num)} failed (attempt {attempts}/{self.max_attempts}, {error}); "
+            f"retrying in {delay_s:.0f}s."
+        )
+        return "retry"
+
+    def waiting(self) -> int:
+        """Jobs still waiting out a backoff (left for the next run when the crawl is stopped)."""
+        with self._cond:
+            return len(self._delayed)
+
+
+def write_dead_letters(path: str, job_queue: JobQueue) -> list:
+    """Writes the pages given up on (this run or before) to a JSON summary, in job order, and returns them."""
+    entries = [job_queue.dead[index] for index in sorted(job_queue.dead)]
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(entries, f, indent=4)
+    os.replace(tmp_path, path)
+    return entries
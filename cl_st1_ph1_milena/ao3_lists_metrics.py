@@ -0,0 +1,233 @@
+# Usage
+# python ao3_lists_metrics.py report corpus/00_sources/metrics.jsonl               # Every run in the file
+# python ao3_lists_metrics.py report corpus/00_sources/metrics.jsonl --last-run --top 20
+
+import os
+import json
+import time
+import argparse
+import threading
+import collections
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# The Prometheus textfile is rewritten every this many pages (and when the run ends)
+PROM_EVERY_N_PAGES = 10
+PROM_PREFIX = "ao3_lists"
+
+# Stages in the order a page goes through them (a page only has the stages it actually ran)
+STAGES = (
+    "throttle",
+    "driver_start",
+    "navigate",
+    "backoff",
+    "consent",
+    "ready",
+    "wait_works",
+    "page_source",
+    "extract",
+    "http",
+    "write",
+    "parse",
+)
+
+# The page being processed by this thread, if any
+_current = threading.local()
+
+
+@contextmanager
+def stage(name: str):
+    """Adds the time spent in the block to the current page's stage (no-op outside a page)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record = getattr(_current, "record", None)
+        if record is not None:
+            stages = record["stages"]
+            stages[name] = stages.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def count(name: str, n: int = 1) -> None:
+    """Adds n to a counter of the current page (retries, recycles, bytes)."""
+    record = getattr(_current, "record", None)
+    if record is not None:
+        record[name] = record.get(name, 0) + n
+
+
+def note(**fields) -> None:
+    """Sets fields of the current page's record (e.g. source="http")."""
+    record = getattr(_current, "record", None)
+    if record is not None:
+        record.update(fields)
+
+
+class MetricsRecorder:
+    """
+    Structured per-page metrics: one JSONL line per processed page (stage durations in ms, bytes, works,
+    retries, recycles, status), appended across runs, plus a Prometheus textfile with this run's totals
+    for node_exporter's textfile collector.
+    """
+
+    def __init__(self, jsonl_path: str, prom_path: str):
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path
+        self.run = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self._lock = threading.Lock()
+        self._pages = collections.Counter()
+        self._stage_ms = collections.Counter()
+        self._stage_count = collections.Counter()
+        self._totals = collections.Counter()
+        self._last_page_ts = None
+        os.makedirs(os.path.dirname(jsonl_path) or ".", exist_ok=True)
+        self._f = open(jsonl_path, "a", encoding="utf-8")
+
+    def begin_page(self, unit: int | str, page_num: int) -> None:
+        _current.record = {"unit": unit, "page": page_num, "stages": {}}
+        _current.start = time.perf_counter()
+
+    def end_page(self, status: str, works: int = 0) -> None:
+        """Completes the current page with its status ("ok", "resumed", "past_end", "retry", "failed") and writes it."""
+        record = getattr(_current, "record", None)
+        if record is None:
+            return
+        _current.record = None
+        record.update(
+            run=self.run,
+            ts=time.time(),
+            worker=threading.current_thread().name,
+            status=status,
+            works=works,
+            total_ms=(time.perf_counter() - _current.start) * 1000,
+        )
+        with self._lock:
+            self._f.write(json.dumps(record) + "\n")
+            self._f.flush()
+            self._pages[status] += 1
+            for name, ms in record["stages"].items():
+                self._stage_ms[name] += ms
+                self._stage_count[name] += 1
+            for name in ("works", "bytes", "retries", "recycles"):
+                self._totals[name] += record.get(name, 0)
+            self._last_page_ts = record["ts"]
+            if sum(self._pages.values()) % PROM_EVERY_N_PAGES == 0:
+                self._write_prometheus()
+
+    def _write_prometheus(self) -> None:
+        lines = [
+            f"# HELP {PROM_PREFIX}_pages_total List pages processed in this run, by status.",
+            f"# TYPE {PROM_PREFIX}_pages_total counter",
+        ]
+        lines += [f'{PROM_PREFIX}_pages_total{{status="{status}"}} {n}' for status, n in sorted(self._pages.items())]
+        lines += [
+            f"# HELP {PROM_PREFIX}_stage_seconds Time spent per page stage in this run.",
+            f"# TYPE {PROM_PREFIX}_stage_seconds summary",
+        ]
+        for name in sorted(self._stage_ms):
+            lines.append(f'{PROM_PREFIX}_stage_seconds_sum{{stage="{name}"}} {self._stage_ms[name] / 1000:.3f}')
+            lines.append(f'{PROM_PREFIX}_stage_seconds_count{{stage="{name}"}} {self._stage_count[name]}')
+        for name, help_text in (
+            ("works", "Works captured in this run."),
+            ("bytes", "Page bytes fetched in this run."),
+            ("retries", "Navigation retries in this run."),
+            ("recycles", "Browser recycles in this run."),
+        ):
+            lines += [
+                f"# HELP {PROM_PREFIX}_{name}_total {help_text}",
+                f"# TYPE {PROM_PREFIX}_{name}_total counter",
+                f"{PROM_PREFIX}_{name}_total {self._totals[name]}",
+            ]
+        if self._last_page_ts is not None:
+            lines += [
+                f"# HELP {PROM_PREFIX}_last_page_timestamp_seconds When the last page finished.",
+                f"# TYPE {PROM_PREFIX}_last_page_timestamp_seconds gauge",
+                f"{PROM_PREFIX}_last_page_timestamp_seconds {self._last_page_ts:.0f}",
+            ]
+
+        tmp_path = f"{self.prom_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.prom_path)
+
+    def close(self) -> None:
+        with self._lock:
+            self._write_prometheus()
+            if not self._f.closed:
+                self._f.close()
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def load_records(path: str, last_run: bool = False) -> list:
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    if last_run and records:
+        run = max(r["run"] for r in records)
+        records = [r for r in records if r["run"] == run]
+    return records
+
+
+def report(records: list, top: int, bucket_min: int) -> None:
+    """Prints stage percentiles, throughput per time bucket and the slowest pages."""
+    statuses = collections.Counter(r["status"] for r in records)
+    print(f"Pages: {len(records)} ({', '.join(f'{s} {n}' for s, n in statuses.most_common())})")
+    print(
+        f"Works: {sum(r.get('works', 0) for r in records)}, bytes: {sum(r.get('bytes', 0) for r in records)}, "
+        f"retries: {sum(r.get('retries', 0) for r in records)}, recycles: {sum(r.get('recycles', 0) for r in records)}"
+    )
+
+    print(f"\n{'stage':<14}{'pages':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'total s':>10}")
+    names = [name for name in STAGES if any(name in r["stages"] for r in records)]
+    names += sorted({name for r in records for name in r["stages"]} - set(names))
+    for name in names + ["total"]:
+        if name == "total":
+            values = sorted(r["total_ms"] for r in records)
+        else:
+            values = sorted(r["stages"][name] for r in records if name in r["stages"])
+        print(
+            f"{name:<14}{len(values):>8}{percentile(values, 50):>10.0f}{percentile(values, 90):>10.0f}"
+            f"{percentile(values, 99):>10.0f}{values[-1]:>10.0f}{sum(values) / 1000:>10.1f}"
+        )
+
+    print(f"\nThroughput ({bucket_min}-minute buckets)")
+    buckets = collections.Counter(int(r["ts"] // (bucket_min * 60)) for r in records)
+    for bucket in sorted(buckets):
+        start = datetime.fromtimestamp(bucket * bucket_min * 60).strftime("%Y-%m-%d %H:%M")
+        print(f"{start}  {buckets[bucket]:>6} pages  {buckets[bucket] / bucket_min:>6.1f} pages/min")
+
+    print(f"\nSlowest {top} pages")
+    for r in sorted(records, key=lambda r: r["total_ms"], reverse=True)[:top]:
+        slowest = max(r["stages"].items(), key=lambda item: item[1], default=("-", 0))
+        print(
+            f"{r['unit']} page {r['page']:>5}  {r['total_ms']:>8.0f} ms  {r['status']:<8} "
+            f"(slowest stage: {slowest[0]} {slowest[1]:.0f} ms, {r['worker']})"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Summarise the per-page metrics of capture_ao3_lists.py.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report_parser = subparsers.add_parser("report", help="Stage percentiles, throughput and slowest pages")
+    report_parser.add_argument("metrics", type=str, help="Metrics JSONL (e.g. corpus/00_sources/metrics.jsonl)")
+    report_parser.add_argument("--last-run", action="store_true", help="Only report the most recent run")
+    report_parser.add_argument("--top", type=int, default=10, help="Slowest pages to list (default: 10)")
+    report_parser.add_argument("--bucket-min", type=int, default=10, help="Throughput bucket in minutes (default: 10)")
+    args = parser.parse_args()
+
+    records = load_records(args.metrics, args.last_run)
+    if not records:
+        raise SystemExit(f"No page metrics in {args.metrics}")
+    report(records, args.top, args.bucket_min)
+
+
+if __name__ == "__main__":
+    main()
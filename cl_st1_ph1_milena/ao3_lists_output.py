@@ -0,0 +1,401 @@
+# Usage
+# python ao3_lists_output.py corpus/00_sources/lists.jsonl corpus/00_sources/lists.parquet  # Typed Parquet dataset
+# python ao3_lists_output.py corpus/00_sources/lists.jsonl corpus/00_sources/lists.xlsx     # Excel (as strings)
+
+import os
+import json
+import logging
+import shutil
+import collections
+import argparse
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import Workbook
+
+from ao3_common import KeyedJsonlLog, read_keyed_jsonl
+from ao3_lists_storage import PageStore, unit_year
+
+# Rows read back from the JSONL stream per chunk when exporting
+EXPORT_CHUNK_ROWS = 10_000
+
+# Typed columns of the Parquet dataset; the year is the partition key (<dir>/year=2025/part-0.parquet)
+PARQUET_SCHEMA = pa.schema(
+    [
+        ("title", pa.string()),
+        ("author", pa.string()),
+        ("fandom", pa.dictionary(pa.int32(), pa.string())),
+        ("date_updated", pa.date32()),
+        ("language", pa.dictionary(pa.int32(), pa.string())),
+        ("words", pa.int64()),
+        ("chapters_posted", pa.int32()),
+        ("chapters_total", pa.int32()),  # Null while the total is unknown ("1/?")
+        ("collections", pa.int32()),
+        ("comments", pa.int32()),
+        ("kudos", pa.int32()),
+        ("bookmarks", pa.int32()),
+        ("hits", pa.int64()),
+        ("url", pa.string()),
+    ]
+)
+
+
+def to_json_line(record: dict) -> str:
+    """
+    Serialises one record exactly like pandas' to_json(orient="records", lines=True),
+    so streamed files stay byte-compatible with lists.jsonl written by earlier versions.
+    """
+    return json.dumps(record, ensure_ascii=True, separators=(",", ":")).replace("/", "\\/")
+
+
+class MetadataStream:
+    """
+    Append-only JSONL writer for work records.
+    Each page is flushed and fsync'd as soon as it is written, and records whose URL has already been
+    written (in this run or a previous one) are dropped, so the file never needs a final de-duplication pass.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.seen_urls = set()
+        self.records = 0
+        self.size = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._load_existing()
+        self._f = open(path, "a", encoding="utf-8")
+
+    def _load_existing(self) -> None:
+        """Rebuilds the de-duplication set from an existing stream, dropping a torn last line after a crash."""
+        if not os.path.exists(self.path):
+            return
+
+        good_size = 0
+        with open(self.path, "rb") as f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(raw)
+                except ValueError:
+                    break
+                self.seen_urls.add(record.get("URL"))
+                self.records += 1
+                good_size += len(raw)
+
+        if good_size != os.path.getsize(self.path):
+            logging.warning(f"Truncating incomplete trailing record in {self.path}.")
+            with open(self.path, "r+b") as f:
+                f.truncate(good_size)
+        self.size = good_size
+
+        if self.records:
+            logging.info(f"Resuming metadata stream {self.path} ({self.records} records).")
+
+    def write_page(self, works: list) -> tuple[int, int, int]:
+        """
+        Appends the new records of one page and makes them durable.
+        Returns (byte offset, byte length, records written) of the appended block.
+        """
+        offset = self.size
+        lines = []
+        for work in works:
+            url = work.get("URL")
+            if url in self.seen_urls:
+                continue
+            self.seen_urls.add(url)
+            lines.append(to_json_line(work) + "\n")
+
+        if lines:
+            block = "".join(lines)
+            self._f.write(block)
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self.records += len(lines)
+            self.size += len(block.encode("utf-8"))
+        return offset, self.size - offset, len(lines)
+
+    def close(self) -> None:
+        if not self._f.closed:
+            self._f.close()
+
+
+def entry_unit(entry: dict) -> int | str:
+    """The list unit of a manifest entry: its date window if it has one, else its year."""
+    return entry.get("window", entry["year"])
+
+
+def page_key(entry: dict) -> tuple:
+    """The (unit, page) key of a manifest or job ledger entry."""
+    return entry_unit(entry), entry["page"]
+
+
+class CheckpointManifest(KeyedJsonlLog):
+    """
+    Index of captured pages keyed by (unit, page), where the unit is the year or date window (see KeyedJsonlLog).
+    Each entry records the stored page's size, mtime and SHA-1 (as reported by the PageStore), its has_next flag,
+    its work count and the byte range of its records in the metadata stream, so a resume never has to re-parse
+    the HTML.
+    """
+
+    LABEL = "checkpoint manifest"
+    NOUN = "pages"
+
+    def __init__(self, path: str):
+        super().__init__(path, key=page_key)
+
+    def lookup(self, unit: int | str, page_num: int, store: PageStore, stream_size: int) -> dict | None:
+        """
+        Returns the manifest entry if it still describes the stored page and its records are in the stream.
+        Size and mtime are checked first; the page is only hashed when they differ.
+        """
+        entry = self.get((unit, page_num))
+        if entry is None or entry["offset"] + entry["length"] > stream_size:
+            return None
+
+        st = store.stat(unit, page_num)
+        if st is None or st["file"] != entry["file"] or st["size"] != entry["size"]:
+            return None
+        if st["mtime_ns"] != entry["mtime_ns"]:
+            if store.sha1(unit, page_num) != entry["sha1"]:
+                return None
+            self.record(dict(entry, mtime_ns=st["mtime_ns"]))
+        return entry
+
+
+def page_entry(unit: int | str, page_num: int, store: PageStore, has_next: bool, works: int) -> dict:
+    """Builds the page-describing part of a manifest entry for a freshly saved or re-parsed page."""
+    return {
+        "year": unit_year(unit),
+        **({"window": unit} if isinstance(unit, str) else {}),
+        "page": page_num,
+        **store.stat(unit, page_num),
+        "sha1": store.sha1(unit, page_num),
+        "has_next": has_next,
+        "works": works,
+    }
+
+
+def load_known_works(path: str) -> dict:
+    """Maps the URL of every record in a JSONL stream to its Date_Updated (stops at a torn last line)."""
+    known = {}
+    if not os.path.exists(path):
+        return known
+    with open(path, "rb") as f:
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                break
+            known[record.get("URL")] = record.get("Date_Updated")
+    return known
+
+
+def merge_records(path: str, new_records: list, manifest_path: str | None = None) -> tuple[int, int]:
+    """
+    Merges new or updated records into a JSONL stream in one pass. The stream is grouped by year, newest
+    first, so each year's new records are written in front of its existing ones, and existing records with
+    the same URL are dropped. Returns (records added, records replaced).
+    With a checkpoint manifest, the byte range of every page is moved along with its records in the same
+    commit (see recover_merge); pages whose range no longer matches the stream are dropped from it, to be
+    re-parsed on resume.
+    """
+    by_year = {}
+    urls = set()
+    for record in new_records:
+        if record["URL"] not in urls:
+            urls.add(record["URL"])
+            by_year.setdefault(record["Year"], []).append((to_json_line(record) + "\n").encode("utf-8"))
+
+    entries = {}
+    if manifest_path is not None:
+        entries = read_keyed_jsonl(manifest_path, page_key)[0]
+    # Page ranges in stream order; an overlapping range cannot be trusted and is dropped
+    spans, end = [], 0
+    for key, entry in sorted(entries.items(), key=lambda item: (item[1]["offset"], item[1]["length"])):
+        if entry["offset"] >= end:
+            spans.append([entry["offset"], entry["offset"] + entry["length"], key, None, None, 0])
+            end = entry["offset"] + entry["length"]
+    spans = collections.deque(spans)
+    moved = {}
+
+    def close_spans(old_pos: int, new_pos: int) -> None:
+        """Settles the new range of every page whose old range ends at or before old_pos."""
+        while spans and spans[0][1] <= old_pos:
+            _, _, key, start, stop, kept = spans.popleft()
+            start = new_pos if start is None else start
+            moved[key] = dict(entries[key], offset=start, length=(stop or start) - start, records=kept)
+
+    replaced = 0
+    old_pos = new_pos = 0
+    tmp_path = f"{path}.merge"
+    with open(tmp_path, "wb") as out:
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        logging.warning(f"Dropping incomplete trailing record in {path}.")
+                        break
+                    close_spans(old_pos, new_pos)
+                    record = json.loads(raw)
+                    for line in by_year.pop(record["Year"], ()):
+                        out.write(line)
+                        new_pos += len(line)
+                    span = spans[0] if spans and spans[0][0] <= old_pos else None
+                    old_pos += len(raw)
+                    if record.get("URL") in urls:
+                        replaced += 1
+                        continue
+                    if span is not None:
+                        span[3] = new_pos if span[3] is None else span[3]
+                        span[4] = new_pos + len(raw)
+                        span[5] += 1
+                    out.write(raw)
+                    new_pos += len(raw)
+            close_spans(old_pos, new_pos)
+        # Years that had no records yet
+        for lines in by_year.values():
+            out.writelines(lines)
+        out.flush()
+        os.fsync(out.fileno())
+
+    if manifest_path is None:
+        os.replace(tmp_path, path)
+        return len(urls) - replaced, replaced
+
+    if len(moved) != len(entries):
+        logging.warning(f"Dropping {len(entries) - len(moved)} page(s) from {manifest_path}; they will be re-parsed.")
+    manifest_tmp = f"{manifest_path}.merge"
+    with open(manifest_tmp, "w", encoding="utf-8") as f:
+        for key in entries:
+            if key in moved:
+                f.write(json.dumps(moved[key]) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    # Commit: the stream first, then the manifest; recover_merge finishes this after a crash in between
+    os.replace(tmp_path, path)
+    os.replace(manifest_tmp, manifest_path)
+    return len(urls) - replaced, replaced
+
+
+def recover_merge(path: str, manifest_path: str) -> None:
+    """
+    Completes or rolls back a merge_records run interrupted by a crash: if the merged stream was committed
+    but its manifest was not, the rebuilt manifest is committed too; otherwise both leftovers are removed.
+    """
+    stream_tmp, manifest_tmp = f"{path}.merge", f"{manifest_path}.merge"
+    if os.path.exists(manifest_tmp) and not os.path.exists(stream_tmp):
+        logging.warning(f"Completing an interrupted merge: committing {manifest_tmp}.")
+        os.replace(manifest_tmp, manifest_path)
+        return
+    for leftover in (stream_tmp, manifest_tmp):
+        if os.path.exists(leftover):
+            logging.warning(f"Removing {leftover} left by an interrupted merge.")
+            os.remove(leftover)
+
+
+def iter_jsonl_chunks(path: str, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """Yields DataFrames of at most chunk_rows records read from a JSONL stream."""
+    with pd.read_json(path, orient="records", lines=True, dtype=False, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+def _counts(values: pd.Series) -> pd.Series:
+    """Parses AO3 counts such as "1,575" into nullable integers (anything else becomes null)."""
+    return pd.to_numeric(values.astype(str).str.replace(",", "", regex=False), errors="coerce").astype("Int64")
+
+
+def typed_table(chunk: pd.DataFrame) -> pa.Table:
+    """Converts a chunk of string records to an Arrow table with PARQUET_SCHEMA."""
+    chapters = chunk["Chapters"].astype(str).str.partition("/")
+    columns = {
+        "title": chunk["Title"],
+        "author": chunk["Author"],
+        "fandom": chunk["Fandom"],
+        "date_updated": pd.to_datetime(chunk["Date_Updated"], format="%d %b %Y", errors="coerce").dt.date,
+        "language": chunk["Language"],
+        "words": _counts(chunk["Words"]),
+        "chapters_posted": _counts(chapters[0]),
+        "chapters_total": _counts(chapters[2]),
+        "collections": _counts(chunk["Collections"]),
+        "comments": _counts(chunk["Comments"]),
+        "kudos": _counts(chunk["Kudos"]),
+        "bookmarks": _counts(chunk["Bookmarks"]),
+        "hits": _counts(chunk["Hits"]),
+        "url": chunk["URL"],
+    }
+    return pa.Table.from_pandas(pd.DataFrame(columns), schema=PARQUET_SCHEMA, preserve_index=False)
+
+
+def export_parquet(jsonl_path: str, parquet_dir: str, chunk_rows: int = EXPORT_CHUNK_ROWS) -> int:
+    """
+    Writes the JSONL stream as a typed Parquet dataset partitioned by year (one zstd-compressed file per
+    year, written chunk by chunk). The dataset is built next to parquet_dir and swapped in when complete.
+    """
+    tmp_dir = f"{parquet_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    writers = {}
+    rows = 0
+    try:
+        for chunk in iter_jsonl_chunks(jsonl_path, chunk_rows):
+            for year, part in chunk.groupby("Year", sort=False):
+                if year not in writers:
+                    year_dir = os.path.join(tmp_dir, f"year={year}")
+                    os.makedirs(year_dir)
+                    path = os.path.join(year_dir, "part-0.parquet")
+                    writers[year] = pq.ParquetWriter(path, PARQUET_SCHEMA, compression="zstd")
+                writers[year].write_table(typed_table(part))
+            rows += len(chunk)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    shutil.rmtree(parquet_dir, ignore_errors=True)
+    os.replace(tmp_dir, parquet_dir)
+    return rows
+
+
+def export_excel(jsonl_path: str, excel_path: str, chunk_rows: int = EXPORT_CHUNK_ROWS) -> int:
+    """Writes the JSONL stream to an Excel file chunk by chunk (write-only workbook, flat memory)."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    rows = 0
+    for chunk in iter_jsonl_chunks(jsonl_path, chunk_rows):
+        if rows == 0:
+            ws.append(list(chunk.columns))
+        for values in chunk.itertuples(index=False, name=None):
+            ws.append(list(values))
+        rows += len(chunk)
+    wb.save(excel_path)
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export a lists.jsonl metadata stream to Parquet or Excel.")
+    parser.add_argument("jsonl", type=str, help="Input JSONL stream (e.g. corpus/00_sources/lists.jsonl)")
+    parser.add_argument(
+        "output",
+        type=str,
+        help="Output Parquet directory (e.g. corpus/00_sources/lists.parquet), or an Excel file ending in .xlsx",
+    )
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=EXPORT_CHUNK_ROWS,
+        help=f"Records read per chunk (default: {EXPORT_CHUNK_ROWS})",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    if args.output.endswith(".xlsx"):
+        rows = export_excel(args.jsonl, args.output, args.chunk_rows)
+    else:
+        rows = export_parquet(args.jsonl, args.output, args.chunk_rows)
+    logging.info(f"Exported {rows} records to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+# Usage
+# python ao3_lists_parser.py corpus/00_test/00_lists  # Compare engines and benchmark them on saved list pages
+
+import os
+import glob
+import time
+import argparse
+
+from bs4 import BeautifulSoup
+from lxml import etree, html as lxml_html
+
+from ao3_common import has_class
+
+PARSER_ENGINES = ("bs4", "lxml")
+
+WORK_URL_PREFIX = "https://archiveofourown.org"
+WORK_URL_SUFFIX = "?view_adult=true&view_full_work=true"
+
+
+def scrape_page_content_bs4(html: str, year: int):
+    """Parses AO3 list HTML and extracts metadata for work entries."""
+    soup = BeautifulSoup(html, "lxml")
+    works_data = []
+
+    ol_tag = soup.find("ol", class_="work index group")
+    if not ol_tag:
+        return works_data, False
+
+    # Pagination “Next”
+    next_button = soup.find("li", class_="next")
+    has_next = next_button is not None and next_button.find("a") is not None
+
+    for li in ol_tag.select("li.work"):
+        try:
+            fandom_h5 = li.find("h5", class_="fandoms")
+            if not fandom_h5:
+                continue
+
+            fandom_tags = fandom_h5.find_all("a", class_="tag")
+            fandom_names = [t.get_text(strip=True) for t in fandom_tags]
+
+            # Strict filter: only exactly one fandom and it must be “Original Work”
+            if len(fandom_names) != 1 or fandom_names[0] != "Original Work":
+                continue
+
+            title_tag = li.find("h4", class_="heading").find("a", recursive=False)
+            author_tag = li.find("a", rel="author")
+
+            def get_stat(class_name: str) -> str:
+                tag = li.find("dd", class_=class_name)
+                return tag.get_text(strip=True) if tag else "0"
+
+            datetime_tag = li.find("p", class_="datetime")
+
+            if title_tag and title_tag.get("href"):
+                url = f"{WORK_URL_PREFIX}{title_tag['href']}{WORK_URL_SUFFIX}"
+            else:
+                url = ""
+
+            work = {
+                "Year": year,
+                "Title": title_tag.get_text(strip=True) if title_tag else "Anonymous",
+                "Author": author_tag.get_text(strip=True) if author_tag else "Anonymous",
+                "Fandom": fandom_names[0],
+                "Date_Updated": datetime_tag.get_text(strip=True) if datetime_tag else "",
+                "Language": get_stat("language"),
+                "Words": get_stat("words"),
+                "Chapters": get_stat("chapters"),
+                "Collections": get_stat("collections"),
+                "Comments": get_stat("comments"),
+                "Kudos": get_stat("kudos"),
+                "Bookmarks": get_stat("bookmarks"),
+                "Hits": get_stat("hits"),
+                "URL": url,
+            }
+            works_data.append(work)
+        except Exception:
+            # Keep going: one malformed work item shouldn’t break the whole page
+            pass
+
+    return works_data, has_next
+
+
+# Compiled once: each expression mirrors one find()/select() of scrape_page_content_bs4
+_XP_WORK_LIST = etree.XPath('(//ol[@class="work index group"])[1]')
+_XP_NEXT = etree.XPath(f"(//li[{has_class('next')}])[1]")
+_XP_ANY_LINK = etree.XPath(".//a")
+_XP_WORKS = etree.XPath(f".//li[{has_class('work')}]")
+_XP_FANDOM_TAGS = etree.XPath(f"(.//h5[{has_class('fandoms')}])[1]//a[{has_class('tag')}]")
+_XP_FANDOMS = etree.XPath(f"(.//h5[{has_class('fandoms')}])[1]")
+_XP_HEADING = etree.XPath(f"(.//h4[{has_class('heading')}])[1]")
+_XP_TITLE = etree.XPath("a[1]")
+_XP_AUTHOR = etree.XPath("(.//a[contains(concat(' ', normalize-space(@rel), ' '), ' author ')])[1]")
+_XP_DATETIME = etree.XPath(f"(.//p[{has_class('datetime')}])[1]")
+_XP_PAGE_LINKS = etree.XPath(f"(//ol[{has_class('pagination')}])[1]/li[not(@class)]")
+_XP_STATS = {
+    name: etree.XPath(f"(.//dd[{has_class(name)}])[1]")
+    for name in ("language", "words", "chapters", "collections", "comments", "kudos", "bookmarks", "hits")
+}
+
+
+def _text(el) -> str:
+    """Equivalent of bs4's get_text(strip=True): every text node stripped, empty ones dropped, no separator."""
+    return "".join(
+        t.strip()
+        for t in el.xpath(".//text()[not(parent::script) and not(parent::style)]")
+        if t.strip()
+    )
+
+
+def scrape_page_content_lxml(html: str, year: int):
+    """Same extraction as scrape_page_content_bs4, using lxml with precompiled XPath expressions."""
+    works_data = []
+    if not html:
+        return works_data, False
+
+    root = lxml_html.document_fromstring(html)
+
+    found = _XP_WORK_LIST(root)
+    if not found:
+        return works_data, False
+    ol_tag = found[0]
+
+    next_button = _XP_NEXT(root)
+    has_next = bool(next_button) and bool(_XP_ANY_LINK(next_button[0]))
+
+    for li in _XP_WORKS(ol_tag):
+        try:
+            if not _XP_FANDOMS(li):
+                continue
+
+            fandom_names = [_text(t) for t in _XP_FANDOM_TAGS(li)]
+
+            # Strict filter: only exactly one fandom and it must be “Original Work”
+            if len(fandom_names) != 1 or fandom_names[0] != "Original Work":
+                continue
+
+            heading = _XP_HEADING(li)
+            if not heading:
+                # Mirrors the AttributeError that makes the bs4 engine skip the item
+                continue
+            title_tag = _XP_TITLE(heading[0])
+            title_tag = title_tag[0] if title_tag else None
+            author_tag = _XP_AUTHOR(li)
+            datetime_tag = _XP_DATETIME(li)
+
+            stats = {}
+            for name, xp in _XP_STATS.items():
+                tag = xp(li)
+                stats[name] = _text(tag[0]) if tag else "0"
+
+            href = title_tag.get("href") if title_tag is not None else None
+            url = f"{WORK_URL_PREFIX}{href}{WORK_URL_SUFFIX}" if href else ""
+
+            work = {
+                "Year": year,
+                "Title": _text(title_tag) if title_tag is not None else "Anonymous",
+                "Author": _text(author_tag[0]) if author_tag else "Anonymous",
+                "Fandom": fandom_names[0],
+                "Date_Updated": _text(datetime_tag[0]) if datetime_tag else "",
+                "Language": stats["language"],
+                "Words": stats["words"],
+                "Chapters": stats["chapters"],
+                "Collections": stats["collections"],
+                "Comments": stats["comments"],
+                "Kudos": stats["kudos"],
+                "Bookmarks": stats["bookmarks"],
+                "Hits": stats["hits"],
+                "URL": url,
+            }
+            works_data.append(work)
+        except Exception:
+            # Keep going: one malformed work item shouldn’t break the whole page
+            pass
+
+    return works_data, has_next
+
+
+def page_count(html: str) -> int | None:
+    """
+    Reads the number of result pages from the pagination of a list page (the highest page number listed).
+    Returns 1 for a page with works and no next page, and None when the page has no works list or has a next
+    page but no page number can be read from its pagination (the caller then searches for the last page).
+    """
+    if not html:
+        return None
+    root = lxml_html.document_fromstring(html)
+    if not _XP_WORK_LIST(root):
+        return None
+    numbers = [int(text) for text in (_text(li) for li in _XP_PAGE_LINKS(root)) if text.isdigit()]
+    if numbers:
+        return max(numbers)
+    next_button = _XP_NEXT(root)
+    if next_button and _XP_ANY_LINK(next_button[0]):
+        return None
+    return 1
+
+
+def has_works(html: str) -> bool:
+    """Whether a list page has a works list with at least one work (pages past the last one have none)."""
+    if not html:
+        return False
+    found = _XP_WORK_LIST(lxml_html.document_fromstring(html))
+    return bool(found) and bool(_XP_WORKS(found[0]))
+
+
+def scrape_page_content(html: str, year: int, engine: str = "bs4"):
+    """Parses AO3 list HTML with the chosen engine. Returns (works, has_next)."""
+    if engine == "lxml":
+        return scrape_page_content_lxml(html, year)
+    if engine == "bs4":
+        return scrape_page_content_bs4(html, year)
+    raise ValueError(f"Unknown parser engine: {engine}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check that the parser engines agree and time them per page.")
+    parser.add_argument("lists_dir", type=str, help="Directory with <year>/<year>_NNNN.html list pages")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing repetitions per page (default: 3)")
+    args = parser.parse_args()
+
+    pages = sorted(glob.glob(os.path.join(args.lists_dir, "*", "*.html")))
+    if not pages:
+        raise SystemExit(f"No list pages found under {args.lists_dir}")
+
+    timings = {engine: 0.0 for engine in PARSER_ENGINES}
+    mismatches = 0
+    for path in pages:
+        year = int(os.path.basename(os.path.dirname(path)))
+        with open(path, "r", encoding="utf-8") as f:
+            html = f.read()
+
+        results = {}
+        for engine in PARSER_ENGINES:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                results[engine] = scrape_page_content(html, year, engine=engine)
+            timings[engine] += (time.perf_counter() - start) / args.repeat
+
+        if results["bs4"] != results["lxml"]:
+            mismatches += 1
+            print(f"MISMATCH: {path}")
+
+    for engine in PARSER_ENGINES:
+        print(f"{engine:>5}: {timings[engine] / len(pages) * 1000:.1f} ms/page")
+    print(f"Speedup (bs4 / lxml): {timings['bs4'] / timings['lxml']:.1f}x over {len(pages)} pages")
+    print(f"Pages with differing records: {mismatches}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
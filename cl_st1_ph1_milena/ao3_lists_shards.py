@@ -0,0 +1,243 @@
+# Usage
+# python ao3_lists_shards.py merge --shards 4   # corpus/00_sources/00_shards/shard_*_of_4/ -> corpus/00_sources/lists.*
+# python ao3_lists_shards.py merge --shards 4 --root corpus/00_test --no-excel --allow-gaps
+
+import os
+import sys
+import json
+import logging
+import argparse
+from datetime import datetime, timezone
+
+from ao3_common import read_keyed_jsonl
+from ao3_lists_output import export_excel, export_parquet, page_key
+from ao3_lists_storage import page_name
+
+SHARDS_SUBDIR = "00_shards"
+SHARD_PLAN_FILE = "shard.json"
+GAPS_FILE = "merge_gaps.json"
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parses --shard i/N (1 <= i <= N) for argparse."""
+    try:
+        shard, shards = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, e.g. 1/4, got {value!r}")
+    if not 1 <= shard <= shards:
+        raise argparse.ArgumentTypeError(f"shard {shard} is not between 1 and {shards}")
+    return shard, shards
+
+
+def shard_owns(page_num: int, shard: int, shards: int) -> bool:
+    """
+    Whether a page belongs to a shard. Pages of every unit are dealt out in turn (page 1 to shard 1, page 2 to
+    shard 2, ...), so each shard gets an even share of every year and window whatever their sizes.
+    """
+    return (page_num - 1) % shards == shard - 1
+
+
+def shard_root(root: str, shard: int, shards: int) -> str:
+    """The output root of one shard, holding its own pages, metadata stream, manifest, ledger and metrics."""
+    return os.path.join(root, SHARDS_SUBDIR, f"shard_{shard}_of_{shards}")
+
+
+def write_shard_plan(path: str, shard: int, shards: int, units: list) -> None:
+    """Records which shard this is and the list units (with page ranges) it was planned from, for the merge."""
+    plan = {
+        "shard": shard,
+        "shards": shards,
+        "units": [{key: unit[key] for key in ("unit", "start_page", "end_page", "list_url")} for unit in units],
+        "planned_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(plan, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def load_shards(root: str, shards: int) -> list:
+    """Loads the plan, manifest and stream path of every shard; exits if one is missing or from another split."""
+    loaded = []
+    for shard in range(1, shards + 1):
+        directory = shard_root(root, shard, shards)
+        plan_path = os.path.join(directory, SHARD_PLAN_FILE)
+        if not os.path.exists(plan_path):
+            logging.error(f"Shard {shard}/{shards} has no {plan_path}; run it (or copy its outputs here) first.")
+            sys.exit(2)
+        with open(plan_path, "r", encoding="utf-8") as f:
+            plan = json.load(f)
+        if (plan["shard"], plan["shards"]) != (shard, shards):
+            logging.error(f"{plan_path} belongs to shard {plan['shard']}/{plan['shards']}, not {shard}/{shards}.")
+            sys.exit(2)
+        loaded.append(
+            {
+                "shard": shard,
+                "plan": plan,
+                "manifest": read_keyed_jsonl(os.path.join(directory, "manifest.jsonl"), page_key)[0],
+                "stream": os.path.join(directory, "lists.jsonl"),
+            }
+        )
+    return loaded
+
+
+def merged_units(loaded: list) -> list:
+    """
+    The units to cover, in the order of shard 1's plan. Shards planned at different times may disagree on
+    a unit's page count; the highest count is used, since the last page found by a shard bounds it anyway.
+    """
+    units = {}
+    for shard in loaded:
+        for unit in shard["plan"]["units"]:
+            known = units.setdefault(unit["unit"], dict(unit))
+            if unit["end_page"] != known["end_page"]:
+                logging.warning(
+                    f"Shards planned {unit['unit']} with {known['end_page']} and {unit['end_page']} pages; "
+                    f"using the larger."
+                )
+                known["end_page"] = max(known["end_page"], unit["end_page"])
+    order = [unit["unit"] for unit in loaded[0]["plan"]["units"]]
+    order += [name for name in units if name not in order]
+    return [units[name] for name in order]
+
+
+def merge_shards(root: str, shards: int, allow_gaps: bool) -> tuple[list, list]:
+    """
+    Works out the pages every unit should have and which shard captured each. A unit ends at its planned last
+    page or at the first page any shard saw without a "Next" button, whichever is lower.
+    Returns ([(unit, page, shard, manifest entry)] in crawl order, [gap entries]).
+    """
+    loaded = load_shards(root, shards)
+    last_pages = {}
+    for shard in loaded:
+        for (name, page_num), entry in shard["manifest"].items():
+            if not entry["has_next"] and page_num < last_pages.get(name, page_num + 1):
+                last_pages[name] = page_num
+
+    pages, gaps = [], []
+    for unit in merged_units(loaded):
+        name = unit["unit"]
+        end_page = min(unit["end_page"], last_pages.get(name, unit["end_page"]))
+        for page_num in range(unit["start_page"], end_page + 1):
+            found = [
+                (shard, shard["manifest"][(name, page_num)])
+                for shard in loaded
+                if (name, page_num) in shard["manifest"]
+            ]
+            if not found:
+                owner = next(s["shard"] for s in loaded if shard_owns(page_num, s["shard"], shards))
+                gaps.append({"unit": name, "page": page_num, "shard": owner, "url": f"{unit['list_url']}{page_num}"})
+                continue
+            # A page captured by several shards (e.g. after re-sharding) is taken from its owner if possible
+            shard, entry = next(
+                ((s, e) for s, e in found if shard_owns(page_num, s["shard"], shards)),
+                found[0],
+            )
+            pages.append((name, page_num, shard, entry))
+
+    gaps_path = os.path.join(root, GAPS_FILE)
+    if not gaps and os.path.exists(gaps_path):
+        os.remove(gaps_path)
+    if gaps:
+        for gap in gaps:
+            logging.error(f"Missing {page_name(gap['unit'], gap['page'])} (shard {gap['shard']}/{shards}).")
+        with open(gaps_path, "w", encoding="utf-8") as f:
+            json.dump(gaps, f, indent=4)
+        logging.error(f"{len(gaps)} page(s) missing from the shards (listed in {gaps_path}).")
+        if not allow_gaps:
+            logging.error("Nothing merged; re-run the shards concerned (or pass --allow-gaps).")
+            sys.exit(1)
+    return pages, gaps
+
+
+def write_merged(pages: list, shard_streams: list, jsonl_path: str) -> tuple[int, int, int]:
+    """
+    Writes the records of the given pages, in order, to one JSONL stream, dropping works already written
+    from an earlier page (a work can move between pages while shards crawl at different times).
+    Records of a shard stream outside every page range (e.g. a page re-parsed after a crash, whose records were
+    already in the stream) are appended at the end rather than lost.
+    Returns (records written, duplicates dropped, records appended unplaced).
+    """
+    seen_urls = set()
+    written = dropped = unplaced = 0
+    tmp_path = f"{jsonl_path}.tmp"
+    handles = {}
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            for _, _, shard, entry in pages:
+                f = handles.get(shard["stream"])
+                if f is None:
+                    f = handles[shard["stream"]] = open(shard["stream"], "rb")
+                f.seek(entry["offset"])
+                for raw in f.read(entry["length"]).splitlines(keepends=True):
+                    url = json.loads(raw).get("URL")
+                    if url in seen_urls:
+                        dropped += 1
+                        continue
+                    seen_urls.add(url)
+                    out.write(raw.decode("utf-8"))
+                    written += 1
+
+            for stream_path in shard_streams:
+                if not os.path.exists(stream_path):
+                    continue
+                with open(stream_path, "rb") as f:
+                    for raw in f:
+                        if not raw.endswith(b"\n"):
+                            break  # Torn last line of a shard that crashed
+                        url = json.loads(raw).get("URL")
+                        if url not in seen_urls:
+                            seen_urls.add(url)
+                            out.write(raw.decode("utf-8"))
+                            written += 1
+                            unplaced += 1
+    finally:
+        for f in handles.values():
+            f.close()
+    os.replace(tmp_path, jsonl_path)
+    return written, dropped, unplaced
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Combine the outputs of capture_ao3_lists.py --shard runs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    merge_parser = subparsers.add_parser(
+        "merge", help="Merge N shards into one ordered, de-duplicated lists.jsonl and Parquet dataset"
+    )
+    merge_parser.add_argument("--shards", type=int, required=True, help="Number of shards the crawl was split into")
+    merge_parser.add_argument(
+        "--root",
+        type=str,
+        default="corpus/00_sources",
+        help=f"Output root holding {SHARDS_SUBDIR}/ and receiving the merged files (default: corpus/00_sources)",
+    )
+    merge_parser.add_argument("--no-excel", action="store_true", help="Skip the lists.xlsx export")
+    merge_parser.add_argument(
+        "--allow-gaps",
+        action="store_true",
+        help=f"Merge even if pages are missing (they are still listed in {GAPS_FILE})",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    pages, gaps = merge_shards(args.root, args.shards, args.allow_gaps)
+    jsonl_path = os.path.join(args.root, "lists.jsonl")
+    shard_streams = [
+        os.path.join(shard_root(args.root, shard, args.shards), "lists.jsonl") for shard in range(1, args.shards + 1)
+    ]
+    written, dropped, unplaced = write_merged(pages, shard_streams, jsonl_path)
+    logging.info(
+        f"Merged {len(pages)} pages from {args.shards} shards into {jsonl_path}: {written} records "
+        f"({unplaced} not placed in a page, appended at the end), {dropped} duplicates dropped, "
+        f"{len(gaps)} pages missing."
+    )
+
+    rows = export_parquet(jsonl_path, os.path.join(args.root, "lists.parquet"))
+    if not args.no_excel:
+        export_excel(jsonl_path, os.path.join(args.root, "lists.xlsx"))
+    logging.info(f"SUCCESS: {rows} total records saved.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+import os
+import re
+import gzip
+import json
+import time
+import hashlib
+import threading
+
+from lxml import etree, html as lxml_html
+
+from ao3_common import zstandard
+
+STORAGE_FORMATS = ("html", "gzip", "zstd", "pack")
+
+# Per-page file suffixes, in the order they are looked up when reading
+FILE_SUFFIXES = {"html": ".html", "gzip": ".html.gz", "zstd": ".html.zst"}
+
+# A list unit is a whole year (int) or a date window of one year, named "<date_from>_<date_to>" (str)
+WINDOW_NAME_RE = re.compile(r"^(\d{4})-\d{2}-\d{2}_\d{4}-\d{2}-\d{2}$")
+
+PAGE_FILE_RE = re.compile(r"^(\d{4}|\d{4}-\d{2}-\d{2}_\d{4}-\d{2}-\d{2})_(\d{4,})\.html(?:\.gz|\.zst)?$")
+
+
+def unit_year(unit: int | str) -> int:
+    """The year a list unit belongs to."""
+    return unit if isinstance(unit, int) else int(unit[:4])
+
+
+def unit_sort_key(unit: int | str) -> tuple:
+    """Orders the units of one year: the whole year first, then its windows chronologically."""
+    return (unit_year(unit), "" if isinstance(unit, int) else unit)
+
+
+def page_name(unit: int | str, page_num: int) -> str:
+    return f"{unit}_{str(page_num).zfill(4)}"
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return data
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Reading .zst pages requires the 'zstandard' package.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+def extract_fragment(html: str) -> str:
+    """
+    Reduces a list page to the parts scrape_page_content reads: the works list (<ol class="work index group">)
+    and the pagination list holding <li class="next">. Returns the full page if there is no works list.
+    """
+    root = lxml_html.document_fromstring(html) if html else None
+    works = root.xpath('(//ol[@class="work index group"])[1]') if root is not None else []
+    if not works:
+        return html
+
+    works_html = etree.tostring(works[0], encoding="unicode", method="html", with_tail=False)
+    pagination_html = None
+    next_li = root.xpath("(//li[contains(concat(' ', normalize-space(@class), ' '), ' next ')])[1]")
+    if next_li:
+        pagination = next_li[0].getparent()
+        pagination_html = etree.tostring(pagination, encoding="unicode", method="html", with_tail=False)
+    return wrap_fragment(works_html, pagination_html)
+
+
+def wrap_fragment(works_html: str, pagination_html: str | None) -> str:
+    """Wraps the works list and (optional) pagination list HTML into a minimal page."""
+    parts = [works_html] + ([pagination_html] if pagination_html else [])
+    return "<!DOCTYPE html>\n<html><body>\n" + "\n".join(parts) + "\n</body></html>\n"
+
+
+class PageStore:
+    """
+    Storage for captured list pages under <lists_dir>/<year>/, or <lists_dir>/<year>/<window>/ for date windows.
+    Pages are written in one format but read transparently from any of them:
+    plain HTML (<unit>_NNNN.html), per-page gzip (.html.gz) or zstd (.html.zst), or one pack file per unit
+    (<unit>.pack holding compressed pages back to back, indexed by page number in <unit>.pack.idx).
+    """
+
+    def __init__(self, lists_dir: str, fmt: str = "html"):
+        if fmt not in STORAGE_FORMATS:
+            raise ValueError(f"Unknown storage format: {fmt}")
+        if fmt == "zstd" and zstandard is None:
+            raise RuntimeError("The zstd storage format requires the 'zstandard' package.")
+        self.lists_dir = lists_dir
+        self.fmt = fmt
+        # Pack pages use zstd when available, gzip otherwise; the codec is recorded per page
+        self.pack_codec = "zstd" if zstandard is not None else "gzip"
+        self._lock = threading.Lock()
+        self._packs = {}
+
+    def unit_dir(self, unit: int | str) -> str:
+        """Directory of a list unit: the year directory, or a window directory inside it."""
+        if isinstance(unit, int):
+            return os.path.join(self.lists_dir, str(unit))
+        return os.path.join(self.lists_dir, str(unit_year(unit)), unit)
+
+    def _file_path(self, unit: int | str, page_num: int, suffix: str) -> str:
+        return os.path.join(self.unit_dir(unit), page_name(unit, page_num) + suffix)
+
+    def _pack_paths(self, unit: int | str) -> tuple[str, str]:
+        base = os.path.join(self.unit_dir(unit), f"{unit}.pack")
+        return base, f"{base}.idx"
+
+    def _pack_index(self, unit: int | str) -> dict:
+        """Loads (once) the page index of a unit's pack, ignoring entries past the end of a torn pack."""
+        with self._lock:
+            index = self._packs.get(unit)
+            if index is not None:
+                return index
+
+            index = {}
+            pack_path, idx_path = self._pack_paths(unit)
+            if os.path.exists(idx_path) and os.path.exists(pack_path):
+                pack_size = os.path.getsize(pack_path)
+                with open(idx_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue
+                        if entry["offset"] + entry["length"] <= pack_size:
+                            index[entry["page"]] = entry
+            self._packs[unit] = index
+            return index
+
+    def _locate(self, unit: int | str, page_num: int) -> tuple | None:
+        """Returns ("file", path, codec) or ("pack", entry, codec) for a stored page, or None."""
+        for fmt, suffix in FILE_SUFFIXES.items():
+            path = self._file_path(unit, page_num, suffix)
+            if os.path.exists(path) and os.path.getsize(path) > 0:
+                return "file", path, fmt
+        entry = self._pack_index(unit).get(page_num)
+        if entry is not None:
+            return "pack", entry, entry["codec"]
+        return None
+
+    def exists(self, unit: int | str, page_num: int) -> bool:
+        return self._locate(unit, page_num) is not None
+
+    def _read_stored(self, unit: int | str, page_num: int) -> tuple[bytes, str] | None:
+        found = self._locate(unit, page_num)
+        if found is None:
+            return None
+        kind, where, codec = found
+        if kind == "file":
+            with open(where, "rb") as f:
+                return f.read(), codec
+        with open(self._pack_paths(unit)[0], "rb") as f:
+            f.seek(where["offset"])
+            return f.read(where["length"]), codec
+
+    def read(self, unit: int | str, page_num: int) -> str | None:
+        """Returns the page HTML (decompressed), or None if it was never stored."""
+        stored = self._read_stored(unit, page_num)
+        if stored is None:
+            return None
+        data, codec = stored
+        return _decompress(data, codec).decode("utf-8")
+
+    def stat(self, unit: int | str, page_num: int) -> dict | None:
+        """Describes the stored bytes of a page for the checkpoint manifest: file, size and mtime_ns."""
+        found = self._locate(unit, page_num)
+        if found is None:
+            return None
+        kind, where, _ = found
+        if kind == "file":
+            st = os.stat(where)
+            return {"file": os.path.basename(where), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        return {"file": f"{unit}.pack#{page_num}", "size": where["length"], "mtime_ns": where["mtime_ns"]}
+
+    def sha1(self, unit: int | str, page_num: int) -> str | None:
+        """SHA-1 of the stored (possibly compressed) bytes of a page."""
+        found = self._locate(unit, page_num)
+        if found is None:
+            return None
+        if found[0] == "pack":
+            return found[1]["sha1"]
+        data, _ = self._read_stored(unit, page_num)
+        return hashlib.sha1(data).hexdigest()
+
+    def write(self, unit: int | str, page_num: int, html: str) -> None:
+        """Stores a page in this store's format."""
+        os.makedirs(self.unit_dir(unit), exist_ok=True)
+        data = html.encode("utf-8")
+
+        if self.fmt != "pack":
+            path = self._file_path(unit, page_num, FILE_SUFFIXES[self.fmt])
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(_compress(data, self.fmt))
+            os.replace(tmp_path, path)
+            return
+
+        blob = _compress(data, self.pack_codec)
+        index = self._pack_index(unit)
+        pack_path, idx_path = self._pack_paths(unit)
+        with self._lock:
+            # Blob first, index line second: a crash in between only leaves unreferenced bytes
+            with open(pack_path, "ab") as f:
+                offset = f.tell()
+                f.write(blob)
+                f.flush()
+                os.fsync(f.fileno())
+            entry = {
+                "page": page_num,
+                "offset": offset,
+                "length": len(blob),
+                "codec": self.pack_codec,
+                "sha1": hashlib.sha1(blob).hexdigest(),
+                "mtime_ns": time.time_ns(),
+            }
+            with open(idx_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            index[page_num] = entry
+
+    def _unit_pages(self, unit: int | str) -> set:
+        found = set()
+        directory = self.unit_dir(unit)
+        for file_name in os.listdir(directory):
+            m = PAGE_FILE_RE.match(file_name)
+            if m and m.group(1) == str(unit) and os.path.getsize(os.path.join(directory, file_name)) > 0:
+                found.add((unit, int(m.group(2))))
+        found.update((unit, page_num) for page_num in self._pack_index(unit))
+        return found
+
+    def pages(self) -> list:
+        """Lists every stored (unit, page), in any format: whole-year units first, then date windows."""
+        found = set()
+        if not os.path.isdir(self.lists_dir):
+            return []
+        for year_name in os.listdir(self.lists_dir):
+            if not (year_name.isdigit() and os.path.isdir(os.path.join(self.lists_dir, year_name))):
+                continue
+            year = int(year_name)
+            found.update(self._unit_pages(year))
+            for window in os.listdir(self.unit_dir(year)):
+                m = WINDOW_NAME_RE.match(window)
+                if m and m.group(1) == year_name and os.path.isdir(self.unit_dir(window)):
+                    found.update(self._unit_pages(window))
+        return sorted(found, key=lambda p: (unit_sort_key(p[0]), p[1]))
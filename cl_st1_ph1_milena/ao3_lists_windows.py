@@ -0,0 +1,82 @@
+import re
+import logging
+from datetime import date, timedelta
+
+# Date filter parameters of an AO3 works search URL
+DATE_FROM_RE = re.compile(r"(work_search\[date_from\]=)([^&]*)")
+DATE_TO_RE = re.compile(r"(work_search\[date_to\]=)([^&]*)")
+
+# Windows wider than this many days are split into weeks; narrower ones into days
+WEEK_DAYS = 7
+
+
+def list_date_range(list_url: str) -> tuple[date, date]:
+    """Reads the date_from/date_to filter of a list URL."""
+    date_from, date_to = DATE_FROM_RE.search(list_url), DATE_TO_RE.search(list_url)
+    if not (date_from and date_to and date_from.group(2) and date_to.group(2)):
+        raise ValueError(f"List URL has no date_from/date_to filter: {list_url}")
+    return date.fromisoformat(date_from.group(2)), date.fromisoformat(date_to.group(2))
+
+
+def window_name(date_from: date, date_to: date) -> str:
+    """Deterministic name of a date window, used for its directory, page files and manifest entries."""
+    return f"{date_from.isoformat()}_{date_to.isoformat()}"
+
+
+def window_url(list_url: str, date_from: date, date_to: date) -> str:
+    """Rewrites the date filter of a list URL to one window (the URL still ends with "page=")."""
+    url = DATE_FROM_RE.sub(lambda m: m.group(1) + date_from.isoformat(), list_url, count=1)
+    return DATE_TO_RE.sub(lambda m: m.group(1) + date_to.isoformat(), url, count=1)
+
+
+def month_windows(date_from: date, date_to: date) -> list:
+    """Splits a date range into calendar-month windows (the first and last may be partial)."""
+    windows = []
+    start = date_from
+    while start <= date_to:
+        next_month = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+        end = min(next_month - timedelta(days=1), date_to)
+        windows.append((start, end))
+        start = next_month
+    return windows
+
+
+def split_window(date_from: date, date_to: date) -> list:
+    """Splits a window into week windows, or a week (or shorter) into days. A single day cannot be split."""
+    if date_from == date_to:
+        return []
+    step = WEEK_DAYS if (date_to - date_from).days + 1 > WEEK_DAYS else 1
+    windows = []
+    start = date_from
+    while start <= date_to:
+        end = min(start + timedelta(days=step - 1), date_to)
+        windows.append((start, end))
+        start = end + timedelta(days=1)
+    return windows
+
+
+def plan_windows(list_url: str, count_pages, max_pages: int, *, today: date | None = None) -> list:
+    """
+    Splits the date range of a list URL into windows of at most max_pages result pages.
+    Starts from calendar months and splits any window over the threshold into weeks, then days.
+    count_pages(url) returns the page count of a window URL, or None when it is unknown (the window is
+    then kept as it is). Days after today are dropped, as they cannot have works yet.
+    Returns [(window name, window URL, pages or None)] in chronological order.
+    """
+    date_from, date_to = list_date_range(list_url)
+    date_to = min(date_to, today or date.today())
+
+    planned = []
+    pending = month_windows(date_from, date_to)
+    while pending:
+        start, end = pending.pop(0)
+        url = window_url(list_url, start, end)
+        pages = count_pages(url)
+        if pages is not None and pages > max_pages:
+            parts = split_window(start, end)
+            if parts:
+                pending[:0] = parts
+                continue
+            logging.warning(f"Window {window_name(start, end)} has {pages} pages but cannot be split further.")
+        planned.append((window_name(start, end), url, pages))
+    return planned
@@ -0,0 +1,290 @@
+# Usage
+# python ao3_replay_server.py                                   # Serve corpus/00_test/00_lists on 127.0.0.1:8765
+# python ao3_replay_server.py --consent --latency-ms 800 --jitter-ms 400 --rate-525 0.05 --rate-429 0.02
+# python capture_ao3_lists.py --test --base-url http://127.0.0.1:8765   # Crawl it instead of AO3
+
+import re
+import time
+import random
+import logging
+import argparse
+import threading
+import collections
+import http.server
+import urllib.parse
+
+from lxml import etree, html as lxml_html
+
+from ao3_lists_storage import PageStore
+
+LISTS_DIR_DEFAULT = "corpus/00_test/00_lists"
+CONSENT_PAGE_DEFAULT = "../cl_st1_ph0_milena/ao3_work_3_consent.html"
+PORT_DEFAULT = 8765
+
+# A page past the last one: AO3 answers with a list page that has no works
+EMPTY_LIST_PAGE = "<!DOCTYPE html>\n<html><body><h2>0 Works in Original Work</h2></body></html>\n"
+ROBOTS_TXT = b"User-agent: *\nDisallow:\n"
+
+# Clients without this cookie get the consent prompt (with --consent); accepting it sets the cookie
+CONSENT_COOKIE = "accepted_tos"
+CONSENT_COOKIE_RE = re.compile(rf"(?:^|;\s*){CONSENT_COOKIE}=")
+
+# Stands in for AO3's jQuery handlers: enables the button once both boxes are ticked, then records the
+# consent in a cookie and removes the prompt
+CONSENT_JS = """<script>
+(function () {
+    var prompt = document.getElementById("tos_prompt");
+    var button = document.getElementById("accept_tos");
+    var boxes = [document.getElementById("tos_agree"), document.getElementById("data_processing_agree")];
+    boxes.forEach(function (box) {
+        box.addEventListener("click", function () {
+            button.disabled = !boxes.every(function (b) { return b.checked; });
+        });
+    });
+    button.addEventListener("click", function () {
+        document.cookie = "accepted_tos=20241119; path=/";
+        prompt.parentNode.removeChild(prompt);
+    });
+})();
+</script>"""
+
+
+def consent_prompt(consent_page: str) -> str:
+    """The visible #tos_prompt block of a saved AO3 consent page, with CONSENT_JS in place of AO3's scripts."""
+    with open(consent_page, "r", encoding="utf-8") as f:
+        root = lxml_html.document_fromstring(f.read())
+    found = root.xpath('//div[@id="tos_prompt"]')
+    if not found:
+        raise ValueError(f"No #tos_prompt in {consent_page}")
+    prompt = found[0]
+    prompt.attrib.pop("class", None)
+    prompt.set("style", "display: block;")
+    return etree.tostring(prompt, encoding="unicode", method="html", with_tail=False) + CONSENT_JS
+
+
+def with_prompt(html: str, prompt: str) -> str:
+    """Inserts the consent prompt at the start of the page body, as AO3 shows it over the list."""
+    match = re.search(r"<body[^>]*>", html)
+    if match is None:
+        return prompt + html
+    return html[:match.end()] + prompt + html[match.end():]
+
+
+class ReplayConfig:
+    """What the replay server serves and which faults it injects (rates are per list page request)."""
+
+    def __init__(
+            self,
+            lists_dir: str,
+            *,
+            consent_prompt_html: str | None = None,
+            latency_ms: float = 0.0,
+            jitter_ms: float = 0.0,
+            rate_525: float = 0.0,
+            rate_429: float = 0.0,
+            retry_after_s: int = 30,
+            rate_hang: float = 0.0,
+            hang_s: float = 300.0,
+            seed: int | None = None,
+    ):
+        self.store = PageStore(lists_dir)
+        self.consent_prompt_html = consent_prompt_html
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_525 = rate_525
+        self.rate_429 = rate_429
+        self.retry_after_s = retry_after_s
+        self.rate_hang = rate_hang
+        self.hang_s = hang_s
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = collections.Counter()
+
+    def draw_fault(self) -> str | None:
+        """Picks the fault of one request (None for a normal response)."""
+        with self._lock:
+            roll = self._random.random()
+        for fault, rate in (("hang", self.rate_hang), ("525", self.rate_525), ("429", self.rate_429)):
+            if roll < rate:
+                return fault
+            roll -= rate
+        return None
+
+    def delay_s(self) -> float:
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def count(self, outcome: str) -> None:
+        with self._lock:
+            self.counts[outcome] += 1
+
+    def page(self, query: dict) -> str | None:
+        """
+        The stored page for a list URL query: the date window, else the year, of date_from, and page.
+        Pages past the stored ones are an empty list page; None when the query is not a list URL.
+        """
+        try:
+            date_from = query["work_search[date_from]"][0]
+            date_to = query.get("work_search[date_to]", [""])[0]
+            page_num = int(query["page"][0])
+            year = int(date_from[:4])
+        except (KeyError, ValueError, IndexError):
+            return None
+        window = f"{date_from}_{date_to}"
+        for unit in (window, year):
+            html = self.store.read(unit, page_num)
+            if html is not None:
+                return html
+        return EMPTY_LIST_PAGE
+
+
+class ReplayHandler(http.server.BaseHTTPRequestHandler):
+    """Serves saved list pages by page=N, with the faults of the server's ReplayConfig."""
+
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status: int, body: bytes, content_type: str = "text/html; charset=utf-8", headers=()) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        config = self.server.config
+        parts = urllib.parse.urlsplit(self.path)
+        if parts.path == "/robots.txt":
+            self._send(200, ROBOTS_TXT, "text/plain")
+            return
+
+        html = config.page(urllib.parse.parse_qs(parts.query))
+        if html is None:
+            config.count("404")
+            self._send(404, b"Not found")
+            return
+
+        fault = config.draw_fault()
+        time.sleep(config.delay_s())
+        if fault == "hang":
+            config.count("hang")
+            logging.info(f"Hanging {self.path} for {config.hang_s:.0f}s")
+            time.sleep(config.hang_s)
+            self.close_connection = True
+            return
+        if fault == "525":
+            config.count("525")
+            self._send(525, b"SSL handshake failed")
+            return
+        if fault == "429":
+            config.count("429")
+            self._send(429, b"Retry later", headers=[("Retry-After", str(config.retry_after_s))])
+            return
+
+        consented = CONSENT_COOKIE_RE.search(self.headers.get("Cookie", "")) is not None
+        if config.consent_prompt_html is not None and not consented:
+            config.count("consent")
+            html = with_prompt(html, config.consent_prompt_html)
+        else:
+            config.count("200" if html != EMPTY_LIST_PAGE else "empty")
+        self._send(200, html.encode("utf-8"))
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+
+def start_replay_server(
+        config: ReplayConfig,
+        host: str = "127.0.0.1",
+        port: int = 0,
+) -> http.server.ThreadingHTTPServer:
+    """Starts the replay server in a daemon thread (port 0 picks a free port: see server.server_address)."""
+    server = http.server.ThreadingHTTPServer((host, port), ReplayHandler)
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Replay saved AO3 list pages over HTTP with latency and fault injection, "
+            "for crawling with capture_ao3_lists.py --base-url"
+        )
+    )
+    parser.add_argument(
+        "--lists-dir",
+        type=str,
+        default=LISTS_DIR_DEFAULT,
+        help=f"Saved list pages, in any storage format (default: {LISTS_DIR_DEFAULT})",
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=PORT_DEFAULT, help=f"Port to listen on (default: {PORT_DEFAULT})")
+    parser.add_argument(
+        "--consent",
+        action="store_true",
+        help=f"Show the AO3 Terms prompt over list pages until the client accepts it ({CONSENT_COOKIE} cookie)",
+    )
+    parser.add_argument(
+        "--consent-page",
+        type=str,
+        default=CONSENT_PAGE_DEFAULT,
+        help=f"Saved AO3 page holding the consent prompt (default: {CONSENT_PAGE_DEFAULT})",
+    )
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added delay per list page (default: 0)")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +/- jitter on that delay (default: 0)")
+    parser.add_argument("--rate-525", type=float, default=0.0, help="Share of 525 responses (default: 0)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Share of 429 responses (default: 0)")
+    parser.add_argument("--retry-after", type=int, default=30, help="Retry-After of 429 responses (default: 30)")
+    parser.add_argument(
+        "--rate-hang",
+        type=float,
+        default=0.0,
+        help="Share of requests that hang for --hang-s, then drop the connection (default: 0)",
+    )
+    parser.add_argument("--hang-s", type=float, default=300.0, help="How long a hang lasts (default: 300)")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed, to replay the same faults")
+    parser.add_argument(
+        "--log-file", type=str, default=None, help="Also write the log to this file (default: stderr only)"
+    )
+    args = parser.parse_args()
+
+    handlers = [logging.StreamHandler()]
+    if args.log_file:
+        handlers.append(logging.FileHandler(args.log_file))
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", handlers=handlers)
+
+    if args.rate_525 + args.rate_429 + args.rate_hang > 1:
+        parser.error("--rate-525, --rate-429 and --rate-hang add up to more than 1.")
+
+    config = ReplayConfig(
+        args.lists_dir,
+        consent_prompt_html=consent_prompt(args.consent_page) if args.consent else None,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_525=args.rate_525,
+        rate_429=args.rate_429,
+        retry_after_s=args.retry_after,
+        rate_hang=args.rate_hang,
+        hang_s=args.hang_s,
+        seed=args.seed,
+    )
+    server = start_replay_server(config, args.host, args.port)
+    logging.info(f"Replaying {args.lists_dir} on http://{args.host}:{server.server_address[1]} (Ctrl+C to stop).")
+    try:
+        while True:
+            time.sleep(60)
+            logging.info(f"Responses so far: {dict(config.counts)}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        logging.info(f"Responses: {dict(config.counts)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,583 @@
+import os
+import json
+import time
+import random
+import signal
+import logging
+import argparse
+import threading
+import statistics
+import collections
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from selenium import webdriver
+from selenium.webdriver.firefox.service import Service
+from selenium.webdriver.firefox.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+import ao3_lists_metrics as metrics
+
+DEBUG_DIR = "debug"
+
+# Selenium / runtime safety
+PAGE_LOAD_TIMEOUT_S_DEFAULT = 120
+SCRIPT_TIMEOUT_S = 60
+
+# Lightweight HTTP backend (reuses cookies harvested from a short Selenium session)
+HTTP_TIMEOUT_S = 30
+HTTP_POOL_SIZE = 4
+# Markers of an anti-bot interstitial instead of a real list page
+CHALLENGE_MARKERS = ("cf-chl", "challenge-platform", "Just a moment...", 'id="tos_prompt"')
+
+# Polite throttling
+SLEEP_MIN_S = 3.5
+SLEEP_MAX_S = 6.5
+
+# Global politeness budget shared by all workers. The default matches the measured pace of the former
+# sequential crawler, one page per cycle of: page load (a typical AO3 list page takes ~3 s in headless Firefox),
+# the fixed 2 s consent check, and a SLEEP_MIN_S..SLEEP_MAX_S sleep (~10 s per page, ~6 requests/minute).
+# Workers therefore only overlap page loads and never ask AO3 for pages faster than that crawler did.
+SEQUENTIAL_LOAD_S = 3.0
+SEQUENTIAL_CONSENT_CHECK_S = 2.0
+REQUESTS_PER_MINUTE_DEFAULT = 60 / (SEQUENTIAL_LOAD_S + SEQUENTIAL_CONSENT_CHECK_S + (SLEEP_MIN_S + SLEEP_MAX_S) / 2)
+
+# Adaptive pacing (--adaptive): additive increase while pages load normally, multiplicative decrease on
+# trouble. The rate always stays within --min/--max-requests-per-minute.
+ADAPTIVE_MIN_RPM_DEFAULT = 2.0
+ADAPTIVE_MAX_RPM_DEFAULT = 2 * REQUESTS_PER_MINUTE_DEFAULT
+ADAPTIVE_INCREASE_RPM = 0.2  # Added after each healthy page
+ADAPTIVE_ERROR_FACTOR = 0.5  # Timeouts, 429/5xx, challenges
+ADAPTIVE_SLOW_FACTOR = 0.8  # Load time well above the running baseline
+ADAPTIVE_SLOW_LATENCY_FACTOR = 2.0  # "Well above" = this multiple of the baseline
+ADAPTIVE_LATENCY_ALPHA = 0.1  # EWMA weight of the latency baseline
+ADAPTIVE_PENALTY_S = 60  # Global pause after a 429/525 (or the server's Retry-After)
+
+# Lean browser profile (--lean-browser): the scraper only needs the HTML, so images, stylesheets and
+# web fonts are disabled, and a PAC script sends every host other than AO3 to a dead proxy, which
+# blocks third-party scripts (analytics etc.) without touching AO3's own consent JavaScript.
+AO3_HOST = "archiveofourown.org"
+LEAN_BROWSER_PREFS = {
+    "permissions.default.image": 2,
+    "permissions.default.stylesheet": 2,
+    "gfx.downloadable_fonts.enabled": False,
+    "browser.display.use_document_fonts": 0,
+    "media.autoplay.default": 5,
+}
+LEAN_PAC_TEMPLATE = """function FindProxyForURL(url, host) {
+    var allowed = %s;
+    for (var i = 0; i < allowed.length; i++) {
+        if (host === allowed[i] || dnsDomainIs(host, "." + allowed[i])) { return "DIRECT"; }
+    }
+    return "PROXY 127.0.0.1:9";
+}"""
+
+# Recycle browser session periodically (helps long runs)
+RECYCLE_EVERY_N_PAGES = 50
+# ...or earlier when Firefox's resident memory has grown by this much since its first page
+RECYCLE_RSS_GROWTH_MB = 400
+# ...or when the median load time of the last RECYCLE_LATENCY_WINDOW pages drifts this far above
+# the median of the first RECYCLE_LATENCY_WINDOW pages of the session
+RECYCLE_LATENCY_WINDOW = 10
+RECYCLE_LATENCY_FACTOR = 1.5
+# The replacement driver is started in the background once a trigger reaches this share of its threshold
+PREWARM_AT = 0.8
+
+NAV_DURATION_JS = """
+const nav = performance.getEntriesByType("navigation")[0];
+return nav ? nav.duration : null;
+"""
+
+
+class RateLimiter:
+    """
+    Process-wide request budget shared by every worker thread.
+    Each acquire() reserves the next free slot, so the total rate never exceeds requests_per_minute.
+    """
+
+    def __init__(self, requests_per_minute: float):
+        if requests_per_minute <= 0:
+            raise ValueError("requests_per_minute must be positive")
+        self.interval_s = 60.0 / requests_per_minute
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def acquire(self) -> None:
+        """Blocks until the caller is allowed to send one request."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            # Small positive jitter keeps the spacing irregular without ever raising the rate
+            self._next_slot = slot + self.interval_s + random.uniform(0, self.interval_s * 0.2)
+        delay_s = slot - time.monotonic()
+        if delay_s > 0:
+            with metrics.stage("throttle"):
+                time.sleep(delay_s)
+
+    def report_success(self, latency_ms: float | None = None) -> None:
+        """Feedback hook for adaptive pacing; the fixed budget ignores it."""
+
+    def report_failure(self, reason: str, pause_s: float | None = None) -> None:
+        """Feedback hook for adaptive pacing; the fixed budget ignores it."""
+
+    def retry_backoff_s(self, attempt: int) -> float:
+        """Extra sleep before retrying a failed navigation."""
+        return 10 * attempt + random.uniform(0, 3)
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    RateLimiter whose budget follows AIMD: it grows by ADAPTIVE_INCREASE_RPM after every healthy page,
+    shrinks by ADAPTIVE_SLOW_FACTOR when load times climb above their running baseline, and is halved
+    on errors (with a global pause for 429/525), always within [min_rpm, max_rpm].
+    """
+
+    def __init__(self, requests_per_minute: float, *, min_rpm: float, max_rpm: float):
+        if not 0 < min_rpm <= max_rpm:
+            raise ValueError("Adaptive rate caps must satisfy 0 < min_rpm <= max_rpm")
+        super().__init__(min(max(requests_per_minute, min_rpm), max_rpm))
+        self.min_rpm = min_rpm
+        self.max_rpm = max_rpm
+        self.rpm = 60.0 / self.interval_s
+        self._baseline_ms = None
+        self._paused_until = 0.0
+
+    def _set_rate(self, rpm: float, reason: str) -> None:
+        rpm = min(max(rpm, self.min_rpm), self.max_rpm)
+        if abs(rpm - self.rpm) < 1e-9:
+            return
+        # Every cut is logged; the slow climb only when it passes a whole request/minute
+        if rpm < self.rpm or int(rpm) != int(self.rpm):
+            logging.info(f"Rate {self.rpm:.1f} -> {rpm:.1f} requests/minute ({reason}).")
+        self.rpm = rpm
+        self.interval_s = 60.0 / rpm
+
+    def acquire(self) -> None:
+        with self._lock:
+            # A pause pushes back every pending slot, whichever worker asks next
+            self._next_slot = max(self._next_slot, self._paused_until)
+        super().acquire()
+
+    def report_success(self, latency_ms: float | None = None) -> None:
+        with self._lock:
+            if latency_ms is None:
+                self._set_rate(self.rpm + ADAPTIVE_INCREASE_RPM, "healthy page")
+                return
+            if self._baseline_ms is None:
+                self._baseline_ms = latency_ms
+            if latency_ms > self._baseline_ms * ADAPTIVE_SLOW_LATENCY_FACTOR:
+                self._set_rate(
+                    self.rpm * ADAPTIVE_SLOW_FACTOR,
+                    f"slow page: {latency_ms:.0f} ms vs baseline {self._baseline_ms:.0f} ms",
+                )
+            else:
+                self._set_rate(self.rpm + ADAPTIVE_INCREASE_RPM, f"healthy page: {latency_ms:.0f} ms")
+            self._baseline_ms += ADAPTIVE_LATENCY_ALPHA * (latency_ms - self._baseline_ms)
+
+    def report_failure(self, reason: str, pause_s: float | None = None) -> None:
+        with self._lock:
+            self._set_rate(self.rpm * ADAPTIVE_ERROR_FACTOR, reason)
+            if pause_s:
+                self._paused_until = max(self._paused_until, time.monotonic() + pause_s)
+                logging.warning(f"Pausing all requests for {pause_s:.0f}s ({reason}).")
+
+    def retry_backoff_s(self, attempt: int) -> float:
+        # The halved rate (and any pause) already spaces the retry out
+        return 0.0
+
+
+def setup_driver(
+        page_load_timeout_s: int = PAGE_LOAD_TIMEOUT_S_DEFAULT,
+        *,
+        lean: bool = False,
+        page_load_strategy: str = "normal",
+        allowed_hosts: tuple = (AO3_HOST,),
+) -> webdriver.Firefox:
+    """Initializes a headless Firefox WebDriver with custom settings (optionally the lean profile)."""
+    options = Options()
+    options.add_argument("--headless")
+    options.page_load_strategy = page_load_strategy
+
+    # Ensure desktop rendering (AO3 can be picky with bot-like UAs)
+    options.set_preference(
+        "general.useragent.override",
+        "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:124.0) Gecko/20100101 Firefox/124.0",
+    )
+
+    # Reduce some long-hang cases (network stalls etc.)
+    options.set_preference("network.http.response.timeout", 120)
+    options.set_preference("network.dns.disableIPv6", True)
+
+    if lean:
+        for name, value in LEAN_BROWSER_PREFS.items():
+            options.set_preference(name, value)
+        pac = LEAN_PAC_TEMPLATE % json.dumps(list(allowed_hosts))
+        options.set_preference("network.proxy.type", 2)
+        options.set_preference("network.proxy.autoconfig_url", "data:text/plain," + urllib.parse.quote(pac))
+
+    # Let Selenium Manager locate/download the correct geckodriver and cache it
+    service = Service()
+
+    driver = webdriver.Firefox(service=service, options=options)
+    driver.set_window_size(1920, 1080)
+
+    # Hard timeouts to reduce “infinite hang” scenarios
+    driver.set_page_load_timeout(page_load_timeout_s)
+    driver.set_script_timeout(SCRIPT_TIMEOUT_S)
+
+    return driver
+
+
+def accept_consent(driver: webdriver.Firefox) -> None:
+    """Ticks both boxes and clicks the AO3 Terms of Service consent button."""
+    logging.info("Consent prompt detected. Accepting AO3 Terms...")
+    driver.find_element(By.ID, "tos_agree").click()
+    driver.find_element(By.ID, "data_processing_agree").click()
+    driver.find_element(By.ID, "accept_tos").click()
+    WebDriverWait(driver, 10).until(EC.invisibility_of_element_located((By.ID, "tos_prompt")))
+    logging.info("Terms accepted successfully.")
+
+
+def handle_consent(driver: webdriver.Firefox) -> None:
+    """Detects and clicks the AO3 Terms of Service consent prompt if present."""
+    try:
+        # Brief pause to allow overlays to trigger
+        time.sleep(2)
+        tos_prompt = driver.find_elements(By.ID, "tos_prompt")
+        if tos_prompt and tos_prompt[0].is_displayed():
+            accept_consent(driver)
+    except Exception:
+        # Prompt may already be accepted or not present (or AO3 changed markup)
+        pass
+
+
+def dump_debug_artifacts(driver: webdriver.Firefox, *, year: int, page_num: int, stage: str) -> None:
+    """Best-effort debug dump (HTML + screenshot) to diagnose EC2-only failures."""
+    try:
+        os.makedirs(DEBUG_DIR, exist_ok=True)
+        ts = time.strftime("%Y%m%d_%H%M%S")
+        prefix = f"{DEBUG_DIR}/year{year}_page{page_num:04d}_{stage}_{ts}"
+        try:
+            driver.save_screenshot(f"{prefix}.png")
+        except Exception:
+            pass
+        try:
+            with open(f"{prefix}.html", "w", encoding="utf-8") as f:
+                f.write(driver.page_source or "")
+        except Exception:
+            pass
+        logging.info(f"Saved debug artifacts: {prefix}.(html/png)")
+    except Exception:
+        pass
+
+
+def safe_get(
+        driver: webdriver.Firefox,
+        url: str,
+        *,
+        year: int,
+        page_num: int,
+        attempts: int = 3,
+        rate_limiter: RateLimiter | None = None,
+) -> bool:
+    """
+    Navigate with retries/backoff.
+    EC2 can experience intermittent slow loads / throttling; this makes the run robust.
+    Every attempt (including retries) is charged against the shared rate limiter, if given.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            with metrics.stage("navigate"):
+                driver.get(url)
+            return True
+        except TimeoutException:
+            logging.warning(
+                f"Navigation timed out (attempt {attempt}/{attempts}) for year={year}, page={page_num}, url={url}"
+            )
+            if rate_limiter is not None:
+                rate_limiter.report_failure("navigation timeout")
+            # Stop loading so we can retry without a stuck tab
+            try:
+                driver.execute_script("window.stop();")
+            except Exception:
+                pass
+        except WebDriverException:
+            logging.exception(
+                f"WebDriver error during navigation (attempt {attempt}/{attempts}) "
+                f"for year={year}, page={page_num}, url={url}"
+            )
+            if rate_limiter is not None:
+                rate_limiter.report_failure("webdriver error")
+
+        if attempt < attempts:
+            metrics.count("retries")
+            if rate_limiter is not None:
+                backoff_s = rate_limiter.retry_backoff_s(attempt)
+            else:
+                backoff_s = 10 * attempt + random.uniform(0, 3)
+            if backoff_s > 0:
+                logging.info(f"Retrying after {backoff_s:.1f}s...")
+                with metrics.stage("backoff"):
+                    time.sleep(backoff_s)
+
+    dump_debug_artifacts(driver, year=year, page_num=page_num, stage="nav_failed")
+    return False
+
+
+def rebase_url(url: str, base_url: str) -> str:
+    """Points a list URL at another server (--base-url), keeping its path and query."""
+    parts = urllib.parse.urlsplit(url)
+    return f"{base_url.rstrip('/')}{parts.path}?{parts.query}"
+
+
+def new_http_session(user_agent: str | None = None) -> requests.Session:
+    """Builds a pooled requests.Session sending a browser's Accept headers (and user agent, if given)."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(
+        {
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Accept-Language": "en-US,en;q=0.5",
+        }
+    )
+    if user_agent:
+        session.headers["User-Agent"] = user_agent
+    return session
+
+
+def export_http_session(driver: webdriver.Firefox) -> requests.Session:
+    """Builds a pooled requests.Session carrying the browser's cookies and user agent."""
+    session = new_http_session(driver.execute_script("return navigator.userAgent;"))
+    for cookie in driver.get_cookies():
+        session.cookies.set(
+            cookie["name"],
+            cookie["value"],
+            domain=cookie.get("domain"),
+            path=cookie.get("path", "/"),
+        )
+    return session
+
+
+def firefox_rss_mb(driver: webdriver.Firefox) -> float | None:
+    """Resident memory of the Firefox process tree (main + content processes), from /proc (Linux only)."""
+    pid = driver.capabilities.get("moz:processID")
+    if not pid or not os.path.isdir("/proc"):
+        return None
+
+    total_kb = 0
+    pending = [pid]
+    while pending:
+        proc = pending.pop()
+        try:
+            with open(f"/proc/{proc}/status", "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+            for task in os.listdir(f"/proc/{proc}/task"):
+                with open(f"/proc/{proc}/task/{task}/children", "r", encoding="utf-8") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return total_kb / 1024
+
+
+def transfer_session_state(old: webdriver.Firefox, new: webdriver.Firefox) -> None:
+    """
+    Copies cookies (including AO3's terms acceptance) and localStorage from one driver to another.
+    The new driver must already be on the same origin.
+    """
+    for cookie in old.get_cookies():
+        keys = ("name", "value", "path", "domain", "secure", "httpOnly", "expiry", "sameSite")
+        try:
+            new.add_cookie({k: cookie[k] for k in keys if k in cookie})
+        except WebDriverException:
+            logging.warning(f"Could not carry over cookie {cookie.get('name')!r}.")
+
+    storage = old.execute_script("return JSON.stringify(Object.assign({}, window.localStorage));")
+    new.execute_script(
+        "const items = JSON.parse(arguments[0]); for (const k in items) { localStorage.setItem(k, items[k]); }",
+        storage or "{}",
+    )
+
+
+class WorkerSession:
+    """
+    Per-worker Firefox driver and optional HTTP session, both created lazily.
+    In the browser backend, a replacement driver is pre-warmed in the background before the current one is
+    recycled (after RECYCLE_EVERY_N_PAGES pages, Firefox RSS growth or load-time drift), and cookies and
+    localStorage are carried over so the new session does not have to accept the AO3 terms again.
+    """
+
+    def __init__(self, args: argparse.Namespace, rate_limiter: RateLimiter):
+        self.args = args
+        self.rate_limiter = rate_limiter
+        self.driver = None
+        self.http = None
+        # A replay server (--base-url) has no cookies to hand over: the http backend skips the browser bootstrap
+        if args.backend == "http" and args.base_url:
+            self.http = new_http_session()
+        self.browser_pages = 0
+        # The lean profile's PAC script must also let through the --base-url host
+        self.allowed_hosts = (AO3_HOST,)
+        if args.base_url:
+            self.allowed_hosts += (urllib.parse.urlsplit(args.base_url).hostname,)
+        # Set once this browser session has been seen past the consent check (carried over on recycle)
+        self.consented = False
+        # Why the last browser fetch failed, for the job ledger
+        self.last_error = None
+        # Set by the supervisor when it killed a hung driver; the next page starts a new one
+        self._driver_killed = False
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._spare = None
+        self._origin = None
+        self._latencies = collections.deque(maxlen=RECYCLE_LATENCY_WINDOW)
+        self._baseline_latency = None
+        self._baseline_rss = None
+
+    def _new_driver(self) -> webdriver.Firefox:
+        return setup_driver(
+            page_load_timeout_s=self.args.page_load_timeout,
+            lean=self.args.lean_browser,
+            allowed_hosts=self.allowed_hosts,
+            # The readiness script does the waiting, so navigation can return at DOMContentLoaded
+            page_load_strategy="eager" if self.args.readiness == "event" else "normal",
+        )
+
+    def _reset_stats(self) -> None:
+        self.browser_pages = 0
+        self._latencies.clear()
+        self._baseline_latency = None
+        self._baseline_rss = None
+
+    def get_driver(self) -> webdriver.Firefox:
+        if self._driver_killed:
+            self._driver_killed = False
+            self.quit_driver()
+        if self.driver is None:
+            with metrics.stage("driver_start"):
+                self.driver = self._new_driver()
+            self.consented = False
+            self._reset_stats()
+        return self.driver
+
+    def quit_driver(self) -> None:
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+            self.driver = None
+
+    def kill_driver(self) -> bool:
+        """
+        Called from the supervisor thread: kills the Firefox and geckodriver processes of the current driver,
+        so that a call blocked on them fails instead of hanging. Returns False if there was no driver.
+        """
+        driver = self.driver
+        if driver is None:
+            return False
+        self._driver_killed = True
+        pids = [driver.capabilities.get("moz:processID")]
+        try:
+            pids.append(driver.service.process.pid)
+        except AttributeError:
+            pass
+        for pid in pids:
+            if pid:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except OSError:
+                    pass
+        return True
+
+    def close(self) -> None:
+        self.quit_driver()
+        if self._spare is not None:
+            try:
+                self._spare.result().quit()
+            except Exception:
+                pass
+            self._spare = None
+        self._executor.shutdown(wait=True)
+
+    def _warm_driver(self, origin: str) -> webdriver.Firefox:
+        """Background task: starts Firefox and parks it on a tiny same-origin page so cookies can be added."""
+        driver = self._new_driver()
+        try:
+            self.rate_limiter.acquire()
+            driver.get(f"{origin}/robots.txt")
+        except Exception:
+            logging.warning("Pre-warmed driver could not reach the site; cookies will not be carried over.")
+        return driver
+
+    def _start_prewarm(self) -> None:
+        if self._spare is None and self._origin is not None:
+            logging.info("Pre-warming replacement browser session...")
+            self._spare = self._executor.submit(self._warm_driver, self._origin)
+
+    def _trigger_levels(self) -> dict:
+        """Each recycle trigger as a fraction of its threshold (>= 1 means recycle now)."""
+        levels = {"pages": self.browser_pages / RECYCLE_EVERY_N_PAGES}
+
+        rss = firefox_rss_mb(self.driver)
+        if rss is not None:
+            if self._baseline_rss is None:
+                self._baseline_rss = rss
+            levels["rss"] = (rss - self._baseline_rss) / RECYCLE_RSS_GROWTH_MB
+
+        if self._baseline_latency is not None and len(self._latencies) == RECYCLE_LATENCY_WINDOW:
+            drift = statistics.median(self._latencies) / self._baseline_latency - 1
+            levels["latency"] = drift / (RECYCLE_LATENCY_FACTOR - 1)
+        return levels
+
+    def _recycle(self, reason: str) -> None:
+        logging.info(f"Cycling browser session ({reason})...")
+        metrics.count("recycles")
+        self._start_prewarm()
+        new_driver = None
+        if self._spare is not None:
+            try:
+                new_driver = self._spare.result()
+                transfer_session_state(self.driver, new_driver)
+            except Exception:
+                logging.exception("Could not hand over to the pre-warmed driver; starting a cold one.")
+                self.consented = False
+            self._spare = None
+
+        old_driver, self.driver = self.driver, new_driver
+        # Let the old Firefox shut down off the critical path
+        self._executor.submit(old_driver.quit)
+        self._reset_stats()
+
+    def after_browser_page(self, load_ms: float | None = None) -> None:
+        """Hands cookies over to HTTP (http backend) or pre-warms/recycles the driver (browser backend)."""
+        self.browser_pages += 1
+        if self.args.backend == "http":
+            self.http = export_http_session(self.driver)
+            logging.info("Exported browser cookies to the HTTP session; closing browser.")
+            self.quit_driver()
+            return
+
+        parsed = urllib.parse.urlsplit(self.driver.current_url)
+        self._origin = f"{parsed.scheme}://{parsed.netloc}"
+        if load_ms:
+            self._latencies.append(load_ms)
+            if self._baseline_latency is None and len(self._latencies) == RECYCLE_LATENCY_WINDOW:
+                self._baseline_latency = statistics.median(self._latencies)
+
+        levels = self._trigger_levels()
+        due = [name for name, level in levels.items() if level >= 1]
+        if due:
+            self._recycle(", ".join(f"{name} {levels[name]:.0%}" for name in due))
+        elif max(levels.values()) >= PREWARM_AT:
+            self._start_prewarm()
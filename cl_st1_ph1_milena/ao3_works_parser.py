@@ -0,0 +1,117 @@
+# Usage
+# python ao3_works_parser.py ../cl_st1_ph0_milena/ao3_work_2.html        # Print the status and chapter text
+
+import re
+import argparse
+
+from lxml import etree, html as lxml_html
+
+from ao3_common import has_class
+
+WORK_ID_RE = re.compile(r"/works/(\d+)")
+
+# Work page outcomes: "ok" has chapter text; "restricted" (registered users only) and "gone" (deleted or
+# hidden) are final; anything else is "failed" and is retried
+WORK_STATUSES = ("ok", "restricted", "gone", "failed")
+
+# Markers of work pages without readable text
+RESTRICTED_MARKERS = ("only available to registered users", "restricted=true")
+GONE_MARKERS = ("Error 404", "The page you were looking for doesn't exist", "has been hidden by")
+# The adult content interstitial shown instead of the work when ?view_adult=true was lost (e.g. by a redirect)
+ADULT_WARNING_MARKERS = ("This work could have adult content",)
+
+
+_XP_CHAPTERS = etree.XPath('//div[@id="chapters"]')
+# Multi-chapter works: one div.chapter per chapter; one-shots: the userstuff div sits directly in #chapters
+_XP_CHAPTER_DIVS = etree.XPath("./div[starts-with(@id, 'chapter-')]")
+_XP_CHAPTER_TITLE = etree.XPath(f".//div[{has_class('preface')}]//h3[{has_class('title')}]")
+_XP_USERSTUFF = etree.XPath(f".//div[{has_class('userstuff')}]")
+_XP_LANDMARKS = etree.XPath(f".//h3[{has_class('landmark')}]")
+
+
+def work_id(url: str) -> str | None:
+    m = WORK_ID_RE.search(url)
+    return m.group(1) if m else None
+
+
+def _block_text(userstuff) -> str:
+    """Paragraphs of a userstuff div, one per line, with <br> kept as line breaks."""
+    for landmark in _XP_LANDMARKS(userstuff):
+        landmark.drop_tree()
+    for br in userstuff.iter("br"):
+        br.tail = "\n" + (br.tail or "")
+
+    lines = []
+    if userstuff.text and userstuff.text.strip():
+        lines.append(userstuff.text.strip())
+    for child in userstuff:
+        if not isinstance(child.tag, str):
+            continue
+        text = child.text_content().strip()
+        if text:
+            lines.append(text)
+        if child.tail and child.tail.strip():
+            lines.append(child.tail.strip())
+    return "\n".join(lines)
+
+
+def work_status(html: str, url: str = "") -> str:
+    """Classifies a fetched work page (see WORK_STATUSES)."""
+    if not html:
+        return "failed"
+    if "<div id=\"chapters\"" in html:
+        return "ok"
+    if any(marker in html or marker in url for marker in RESTRICTED_MARKERS):
+        return "restricted"
+    if any(marker in html for marker in GONE_MARKERS):
+        return "gone"
+    return "failed"
+
+
+def is_adult_warning(html: str) -> bool:
+    """Whether a work page is the adult content warning rather than the work (a "failed" page worth retrying)."""
+    return bool(html) and "<div id=\"chapters\"" not in html and any(m in html for m in ADULT_WARNING_MARKERS)
+
+
+def work_text(html: str) -> list:
+    """
+    Extracts the chapters of a full-work page (?view_full_work=true) as [(chapter title, text)].
+    One-shots have a single chapter with an empty title. Returns [] when the page has no #chapters.
+    """
+    root = lxml_html.document_fromstring(html)
+    found = _XP_CHAPTERS(root)
+    if not found:
+        return []
+
+    chapters = []
+    chapter_divs = _XP_CHAPTER_DIVS(found[0])
+    for div in chapter_divs or [found[0]]:
+        title = _XP_CHAPTER_TITLE(div)
+        bodies = _XP_USERSTUFF(div)
+        if not bodies:
+            continue
+        chapters.append((title[0].text_content().strip() if title else "", _block_text(bodies[0])))
+    return chapters
+
+
+def format_text(chapters: list) -> str:
+    """Chapter text as saved in <work_id>.txt: each chapter's title line (if any), then its paragraphs."""
+    parts = [f"{title}\n{text}" if title else text for title, text in chapters]
+    return "\n\n".join(parts) + "\n"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Extract the chapter text of a saved AO3 full-work page.")
+    parser.add_argument("html", type=str, help="Saved work page (?view_full_work=true)")
+    args = parser.parse_args()
+
+    with open(args.html, "r", encoding="utf-8") as f:
+        html = f.read()
+    status = work_status(html)
+    print(f"Status: {status}")
+    if status == "ok":
+        print(format_text(work_text(html)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import os
+import gzip
+
+from ao3_common import KeyedJsonlLog, zstandard
+
+WORK_FORMATS = ("gzip", "zstd")
+WORK_SUFFIXES = {"gzip": ".html.gz", "zstd": ".html.zst"}
+
+
+class WorkStore:
+    """
+    Storage for captured work pages under <works_dir>/<year>/: the compressed page (<work_id>.html.gz or
+    .html.zst) and its extracted chapter text (<work_id>.txt, plain UTF-8). Both are written atomically.
+    """
+
+    def __init__(self, works_dir: str, fmt: str = "gzip"):
+        if fmt not in WORK_FORMATS:
+            raise ValueError(f"Unknown work storage format: {fmt}")
+        if fmt == "zstd" and zstandard is None:
+            raise RuntimeError("The zstd storage format requires the 'zstandard' package.")
+        self.works_dir = works_dir
+        self.fmt = fmt
+
+    def paths(self, year: int, work_id: str) -> tuple[str, str]:
+        """(page path, text path) of a work in this store's format."""
+        base = os.path.join(self.works_dir, str(year), work_id)
+        return base + WORK_SUFFIXES[self.fmt], base + ".txt"
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def write(self, year: int, work_id: str, html: str, text: str | None) -> dict:
+        """Stores a work page (and its text, if any) and describes them for the status index."""
+        html_path, text_path = self.paths(year, work_id)
+        os.makedirs(os.path.dirname(html_path), exist_ok=True)
+        data = html.encode("utf-8")
+        if self.fmt == "zstd":
+            blob = zstandard.ZstdCompressor(level=10).compress(data)
+        else:
+            blob = gzip.compress(data, compresslevel=6, mtime=0)
+        self._write_atomic(html_path, blob)
+        entry = {"html_file": os.path.relpath(html_path, self.works_dir), "html_bytes": len(blob)}
+        if text is not None:
+            self._write_atomic(text_path, text.encode("utf-8"))
+            entry["text_file"] = os.path.relpath(text_path, self.works_dir)
+        return entry
+
+    def has_files(self, entry: dict) -> bool:
+        """Whether the files an index entry points to are still there."""
+        return all(
+            os.path.exists(os.path.join(self.works_dir, entry[key]))
+            for key in ("html_file", "text_file")
+            if key in entry
+        )
+
+
+class WorkIndex(KeyedJsonlLog):
+    """Status index of captured works keyed by work id: status, attempts, files and counts (see KeyedJsonlLog)."""
+
+    LABEL = "work index"
+    NOUN = "works"
+
+    def __init__(self, path: str):
+        super().__init__(path, key=lambda entry: entry["work_id"])
+
+    def counts(self) -> dict:
+        counts = {}
+        for entry in self.values():
+            counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        return counts
@@ -0,0 +1,350 @@
+# Usage
+# python benchmark_ao3_lists.py parse                    # Per-page parse time and peak RSS of each parser engine
+# python benchmark_ao3_lists.py reparse --jobs 1 4       # Reparse throughput with 1 and 4 processes
+# python benchmark_ao3_lists.py crawl --capture-args "--workers 2 --backend http"   # End-to-end test crawl
+# python benchmark_ao3_lists.py all --save-baseline      # Run every part and record the results as the baseline
+
+import os
+import sys
+import json
+import time
+import shlex
+import resource
+import argparse
+import platform
+import subprocess
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from ao3_lists_metrics import load_records, percentile
+from ao3_lists_parser import PARSER_ENGINES, scrape_page_content
+from ao3_lists_storage import PageStore, unit_year
+from ao3_replay_server import ReplayConfig, start_replay_server
+from reparse_ao3_lists import parse_page
+
+# Fixtures: the saved test crawl (5 pages of each year) and the records it produced
+FIXTURE_ROOT = "corpus/00_test"
+FIXTURE_LISTS_DIR = os.path.join(FIXTURE_ROOT, "00_lists")
+FIXTURE_JSONL = os.path.join(FIXTURE_ROOT, "lists.jsonl")
+INPUT_JSON = "ao3_original_work_lists.json"
+CAPTURE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "capture_ao3_lists.py")
+
+BASELINE_JSON = os.path.join(FIXTURE_ROOT, "benchmark_baseline.json")
+# A metric regresses when it is this much worse than its baseline (timings on one machine vary by ~10%)
+TOLERANCE_DEFAULT = 0.25
+
+PARSE_REPEAT_DEFAULT = 5
+REPARSE_ROUNDS_DEFAULT = 10
+CRAWL_TIMEOUT_S = 1800
+
+
+def metric(value: float, better: str) -> dict:
+    return {"value": round(value, 3), "better": better}
+
+
+def fixture_pages() -> list:
+    """(unit, page, html) of every fixture page, in capture order."""
+    store = PageStore(FIXTURE_LISTS_DIR)
+    return [(unit, page_num, store.read(unit, page_num)) for unit, page_num in store.pages()]
+
+
+def fixture_records() -> int:
+    with open(FIXTURE_JSONL, "r", encoding="utf-8") as f:
+        return sum(1 for _ in f)
+
+
+def max_rss_kib() -> float:
+    """
+    Peak resident memory of this process so far, in KiB. On Linux it is read from VmHWM: ru_maxrss is carried
+    over through exec from the parent at fork time, so in a freshly spawned process it starts at the parent's RSS.
+    """
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return float(line.split()[1])
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if sys.platform == "darwin" else peak  # Bytes on macOS
+
+
+def parse_peak_rss(engine: str) -> tuple[float, float, int]:
+    """
+    Run in a fresh interpreter: parses every fixture page once with one engine.
+    Returns (peak RSS with the pages loaded, before parsing, in KiB; peak RSS after parsing, in KiB; works).
+    """
+    pages = fixture_pages()
+    before_kib = max_rss_kib()
+    works = sum(len(scrape_page_content(html, unit_year(unit), engine=engine)[0]) for unit, _, html in pages)
+    return before_kib, max_rss_kib(), works
+
+
+def bench_parse(args: argparse.Namespace) -> dict:
+    """
+    Per-page scrape_page_content time (best of --repeat runs) and the peak RSS of parsing every page, per engine.
+    RSS (unlike tracemalloc) includes lxml's C allocations; each engine is measured in its own fresh process.
+    """
+    pages = fixture_pages()
+    expected = fixture_records()
+    results = {}
+    for engine in PARSER_ENGINES:
+        times_ms, works = [], 0
+        for unit, page_num, html in pages:
+            best = None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                page_works, _ = scrape_page_content(html, unit_year(unit), engine=engine)
+                elapsed = (time.perf_counter() - start) * 1000
+                best = elapsed if best is None else min(best, elapsed)
+            times_ms.append(best)
+            works += len(page_works)
+
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            before_kib, peak_kib, _ = pool.submit(parse_peak_rss, engine).result()
+
+        if works != expected:
+            print(f"WARNING: {engine} parsed {works} works from the fixtures, {FIXTURE_JSONL} has {expected}.")
+        times_ms.sort()
+        print(
+            f"{engine:>5}: {len(pages)} pages, {works} works, p50 {percentile(times_ms, 50):.1f} ms, "
+            f"p90 {percentile(times_ms, 90):.1f} ms, max {times_ms[-1]:.1f} ms; "
+            f"peak RSS {peak_kib:.0f} KiB (+{peak_kib - before_kib:.0f} KiB for parsing)"
+        )
+        results[f"{engine}_page_ms_p50"] = metric(percentile(times_ms, 50), "lower")
+        results[f"{engine}_page_ms_p90"] = metric(percentile(times_ms, 90), "lower")
+        results[f"{engine}_peak_rss_kib"] = metric(peak_kib, "lower")
+        results[f"{engine}_parse_rss_kib"] = metric(peak_kib - before_kib, "lower")
+    return results
+
+
+def bench_reparse(args: argparse.Namespace) -> dict:
+    """Throughput of the reparse_ao3_lists.py page task over the fixtures, repeated --rounds times."""
+    store = PageStore(FIXTURE_LISTS_DIR)
+    tasks = [(unit, page_num, FIXTURE_LISTS_DIR, args.parser) for unit, page_num in store.pages()] * args.rounds
+    results = {}
+    for jobs in args.jobs:
+        chunksize = max(1, len(tasks) // (jobs * 8))
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            # Warm-up: start the processes and import the parser before timing
+            list(pool.map(parse_page, tasks[:jobs]))
+            start = time.perf_counter()
+            works = sum(len(result[2]) for result in pool.map(parse_page, tasks, chunksize=chunksize))
+            elapsed = time.perf_counter() - start
+
+        pages_per_s = len(tasks) / elapsed
+        print(
+            f"{jobs:>3} process(es): {len(tasks)} pages ({works} works) in {elapsed:.2f} s, "
+            f"{pages_per_s:.1f} pages/s, {pages_per_s / jobs:.1f} pages/s per core ({args.parser} engine)"
+        )
+        results[f"j{jobs}_pages_per_s"] = metric(pages_per_s, "higher")
+        results[f"j{jobs}_pages_per_s_per_core"] = metric(pages_per_s / jobs, "higher")
+    return results
+
+
+def bench_crawl(args: argparse.Namespace) -> dict:
+    """
+    Runs capture_ao3_lists.py --test in a scratch directory against ao3_replay_server.py serving the fixtures,
+    checks its lists.jsonl against the fixture one and reads its page metrics.
+    """
+    with open(INPUT_JSON, "r", encoding="utf-8") as f:
+        year_configs = json.load(f)
+    store = PageStore(FIXTURE_LISTS_DIR)
+    years = {unit_year(unit) for unit, _ in store.pages()}
+    pages = max(page_num for _, page_num in store.pages())
+
+    server = start_replay_server(ReplayConfig(FIXTURE_LISTS_DIR))
+    origin = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with tempfile.TemporaryDirectory(prefix="ao3_bench_") as work_dir:
+            configs = [config for config in year_configs if config["year"] in years]
+            with open(os.path.join(work_dir, INPUT_JSON), "w", encoding="utf-8") as f:
+                json.dump(configs, f, indent=4)
+
+            command = [
+                sys.executable,
+                CAPTURE_SCRIPT,
+                "--test",
+                "--pages",
+                str(pages),
+                "--no-excel",
+                "--requests-per-minute",
+                str(args.requests_per_minute),
+                "--base-url",
+                origin,
+            ] + shlex.split(args.capture_args)
+            print(f"Running {' '.join(command[1:])} ({len(configs)} years x {pages} pages)...")
+            start = time.perf_counter()
+            completed = subprocess.run(
+                command,
+                cwd=work_dir,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=CRAWL_TIMEOUT_S,
+            )
+            elapsed = time.perf_counter() - start
+            if completed.returncode != 0:
+                log_path = os.path.join(work_dir, "capture_ao3_lists.log")
+                with open(log_path, "r", encoding="utf-8") as f:
+                    tail = f.readlines()[-20:]
+                raise SystemExit(f"capture_ao3_lists.py exited with {completed.returncode}:\n{''.join(tail)}")
+
+            with open(os.path.join(work_dir, "corpus/00_sources/lists.jsonl"), "rb") as f:
+                captured = f.read()
+            with open(FIXTURE_JSONL, "rb") as f:
+                identical = captured == f.read()
+            records = load_records(os.path.join(work_dir, "corpus/00_sources/metrics.jsonl"))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    pages_per_min = len(records) / elapsed * 60
+    print(
+        f"Captured {len(records)} pages in {elapsed:.1f} s ({pages_per_min:.1f} pages/min); "
+        f"lists.jsonl {'matches' if identical else 'DIFFERS FROM'} {FIXTURE_JSONL}."
+    )
+    results = {
+        "total_s": metric(elapsed, "lower"),
+        "pages_per_min": metric(pages_per_min, "higher"),
+    }
+    stages = sorted({name for r in records for name in r["stages"]})
+    for name in stages + ["total"]:
+        if name == "total":
+            values = sorted(r["total_ms"] for r in records)
+        else:
+            values = sorted(r["stages"][name] for r in records if name in r["stages"])
+        print(f"  {name:<14} p50 {percentile(values, 50):>8.1f} ms  p90 {percentile(values, 90):>8.1f} ms")
+        results[f"{name}_ms_p50"] = metric(percentile(values, 50), "lower")
+    if not identical:
+        raise SystemExit(f"The benchmark crawl produced different records from {FIXTURE_JSONL}.")
+    return results
+
+
+BENCHMARKS = {"parse": bench_parse, "reparse": bench_reparse, "crawl": bench_crawl}
+
+
+def run_config(part: str, args: argparse.Namespace) -> dict:
+    """The options a part's numbers depend on; a baseline is only compared with a run of the same config."""
+    if part == "parse":
+        return {"repeat": args.repeat}
+    if part == "reparse":
+        return {"rounds": args.rounds, "parser": args.parser}
+    return {"capture_args": args.capture_args, "requests_per_minute": args.requests_per_minute}
+
+
+def compare(part: str, results: dict, baseline: dict | None, tolerance: float) -> list:
+    """Prints each metric against its baseline and returns the names of the regressed ones."""
+    regressions = []
+    if baseline is None:
+        print(f"No {part} baseline to compare with (record one with --save-baseline).")
+        return regressions
+    print(f"\n{part} vs baseline of {baseline['recorded_at']} ({baseline['host']}):")
+    print(f"  {'metric':<32}{'now':>12}{'baseline':>12}{'change':>9}")
+    for name, current in results.items():
+        previous = baseline["metrics"].get(name)
+        if previous is None or not previous["value"]:
+            print(f"  {name:<32}{current['value']:>12.3f}  (no baseline)")
+            continue
+        change = current["value"] / previous["value"] - 1
+        worse = change if current["better"] == "lower" else -change
+        flag = "REGRESSION" if worse > tolerance else ""
+        if flag:
+            regressions.append(name)
+        print(f"  {name:<32}{current['value']:>12.3f}{previous['value']:>12.3f}{change:>+9.1%}  {flag}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=f"Benchmark parsing, reparsing and an end-to-end test crawl on the fixtures in {FIXTURE_ROOT}."
+    )
+    parser.add_argument("part", choices=list(BENCHMARKS) + ["all"], help="What to benchmark")
+    parser.add_argument("--baseline", type=str, default=BASELINE_JSON, help=f"Baseline file (default: {BASELINE_JSON})")
+    parser.add_argument("--save-baseline", action="store_true", help="Record this run as the new baseline")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=TOLERANCE_DEFAULT,
+        help=f"Relative slowdown flagged as a regression (default: {TOLERANCE_DEFAULT})",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=PARSE_REPEAT_DEFAULT,
+        help=f"parse: timing repetitions per page, the best is kept (default: {PARSE_REPEAT_DEFAULT})",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        nargs="+",
+        default=sorted({1, os.cpu_count() or 1}),
+        help="reparse: process counts to measure (default: 1 and all cores)",
+    )
+    parser.add_argument(
+        "--rounds",
+        type=int,
+        default=REPARSE_ROUNDS_DEFAULT,
+        help=f"reparse: passes over the fixture pages (default: {REPARSE_ROUNDS_DEFAULT})",
+    )
+    parser.add_argument(
+        "--parser",
+        choices=PARSER_ENGINES,
+        default="lxml",
+        help="reparse: parser engine (default: lxml)",
+    )
+    parser.add_argument(
+        "--capture-args",
+        type=str,
+        default="",
+        help='crawl: extra capture_ao3_lists.py options, e.g. "--workers 2 --backend http"',
+    )
+    parser.add_argument(
+        "--requests-per-minute",
+        type=float,
+        default=600.0,
+        help="crawl: request budget of the benchmark crawl (default: 600, no real site is hit)",
+    )
+    args = parser.parse_args()
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baselines = json.load(f)
+
+    parts = list(BENCHMARKS) if args.part == "all" else [args.part]
+    regressions = []
+    for part in parts:
+        print(f"== {part} ==")
+        results = BENCHMARKS[part](args)
+        config = run_config(part, args)
+        baseline = baselines.get(part)
+        if baseline is not None and baseline.get("config") != config:
+            print(f"The {part} baseline was recorded with {baseline.get('config')}, not {config}; not comparing.")
+            baseline = None
+        regressions += [f"{part}.{name}" for name in compare(part, results, baseline, args.tolerance)]
+        if args.save_baseline:
+            baselines[part] = {
+                "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "host": f"{platform.node()}, {os.cpu_count()} cores, Python {platform.python_version()}",
+                "config": config,
+                "metrics": results,
+            }
+        print()
+
+    if args.save_baseline:
+        tmp_path = f"{args.baseline}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2)
+        os.replace(tmp_path, args.baseline)
+        print(f"Saved the baseline to {args.baseline}.")
+
+    if regressions:
+        print(f"REGRESSIONS (more than {args.tolerance:.0%} worse than the baseline): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,210 +1,1170 @@
 import os
 import json
 import time
-import random
 import logging
 import argparse
 import sys
-import pandas as pd
-from bs4 import BeautifulSoup
+import queue
+import threading
+from datetime import datetime, timedelta, timezone
+import requests
 from selenium import webdriver
-from selenium.webdriver.firefox.service import Service
-from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.common.exceptions import WebDriverException
+
+import ao3_lists_metrics as metrics
+from ao3_common import OUTPUT_ROOT
+from ao3_lists_jobs import JobLedger, JobQueue, write_dead_letters
+from ao3_lists_metrics import MetricsRecorder
+from ao3_lists_output import (
+    CheckpointManifest,
+    MetadataStream,
+    entry_unit,
+    export_excel,
+    export_parquet,
+    load_known_works,
+    merge_records,
+    page_entry,
+    recover_merge,
+)
+from ao3_lists_parser import (
+    PARSER_ENGINES,
+    WORK_URL_PREFIX,
+    WORK_URL_SUFFIX,
+    has_works,
+    page_count,
+    scrape_page_content,
+)
+from ao3_lists_shards import SHARD_PLAN_FILE, parse_shard, shard_owns, shard_root, write_shard_plan
+from ao3_lists_storage import STORAGE_FORMATS, PageStore, extract_fragment, page_name, unit_year, wrap_fragment
+from ao3_lists_windows import list_date_range, plan_windows, window_name
+from ao3_session import (
+    ADAPTIVE_MAX_RPM_DEFAULT,
+    ADAPTIVE_MIN_RPM_DEFAULT,
+    ADAPTIVE_PENALTY_S,
+    CHALLENGE_MARKERS,
+    HTTP_TIMEOUT_S,
+    NAV_DURATION_JS,
+    PAGE_LOAD_TIMEOUT_S_DEFAULT,
+    REQUESTS_PER_MINUTE_DEFAULT,
+    SEQUENTIAL_CONSENT_CHECK_S,
+    SEQUENTIAL_LOAD_S,
+    SLEEP_MAX_S,
+    SLEEP_MIN_S,
+    AdaptiveRateLimiter,
+    RateLimiter,
+    WorkerSession,
+    accept_consent,
+    dump_debug_artifacts,
+    handle_consent,
+    rebase_url,
+    safe_get,
+)
 
 # Configuration
 INPUT_JSON = "ao3_original_work_lists.json"
-OUTPUT_ROOT = "corpus/00_sources"
 LISTS_DIR = os.path.join(OUTPUT_ROOT, "00_lists")
 JSONL_OUT = os.path.join(OUTPUT_ROOT, "lists.jsonl")
 EXCEL_OUT = os.path.join(OUTPUT_ROOT, "lists.xlsx")
+PARQUET_OUT = os.path.join(OUTPUT_ROOT, "lists.parquet")
+METRICS_OUT = os.path.join(OUTPUT_ROOT, "metrics.jsonl")
+METRICS_PROM_OUT = os.path.join(OUTPUT_ROOT, "metrics.prom")
+MANIFEST_OUT = os.path.join(OUTPUT_ROOT, "manifest.jsonl")
+JOBS_OUT = os.path.join(OUTPUT_ROOT, "jobs.jsonl")
+DEAD_LETTERS_OUT = os.path.join(OUTPUT_ROOT, "dead_letters.json")
+PAGE_COUNTS_OUT = os.path.join(OUTPUT_ROOT, "page_counts.json")
+DELTA_DIR = os.path.join(OUTPUT_ROOT, "00_delta")
 LOG_FILE = "capture_ao3_lists.log"
-DEBUG_DIR = "debug"
 
 # Selenium / runtime safety
-PAGE_LOAD_TIMEOUT_S_DEFAULT = 120
-SCRIPT_TIMEOUT_S = 60
 WAIT_FOR_WORKS_S = 20
 
-# Polite throttling
-SLEEP_MIN_S = 3.5
-SLEEP_MAX_S = 6.5
+# In-page extraction (--extract fragment/records): returns only the works list and the pagination list
+# instead of serialising the whole DOM through driver.page_source. With records=true it also builds the
+# records in the page, following the same rules as scrape_page_content.
+EXTRACT_MODES = ("page", "fragment", "records")
+EXTRACT_JS = r"""
+const withRecords = arguments[0];
+const works = Array.from(document.querySelectorAll("ol")).find(o => o.getAttribute("class") === "work index group");
+if (!works) { return null; }
+const next = document.querySelector("li.next");
+const result = {
+    works: works.outerHTML,
+    pagination: next ? next.parentElement.outerHTML : null,
+    has_next: !!(next && next.querySelector("a")),
+    rows: null,
+};
+if (!withRecords) { return result; }
 
-# Recycle browser session periodically (helps long runs)
-RECYCLE_EVERY_N_PAGES = 50
+// get_text(strip=True): every text node trimmed, empty ones dropped, no separator
+const text = el => {
+    const walker = document.createTreeWalker(el, NodeFilter.SHOW_TEXT);
+    let out = "", node;
+    while ((node = walker.nextNode())) {
+        const parent = node.parentNode.nodeName;
+        if (parent !== "SCRIPT" && parent !== "STYLE") { out += node.nodeValue.trim(); }
+    }
+    return out;
+};
+result.rows = [];
+for (const li of works.querySelectorAll("li.work")) {
+    try {
+        const fandomH5 = li.querySelector("h5.fandoms");
+        if (!fandomH5) { continue; }
+        const fandoms = Array.from(fandomH5.querySelectorAll("a.tag")).map(text);
+        if (fandoms.length !== 1 || fandoms[0] !== "Original Work") { continue; }
+        const heading = li.querySelector("h4.heading");
+        if (!heading) { continue; }
+        const title = Array.from(heading.children).find(c => c.tagName === "A") || null;
+        const author = li.querySelector('a[rel~="author"]');
+        const datetime = li.querySelector("p.datetime");
+        const stat = name => { const dd = li.querySelector("dd." + name); return dd ? text(dd) : "0"; };
+        result.rows.push([
+            title ? text(title) : "Anonymous",
+            author ? text(author) : "Anonymous",
+            fandoms[0],
+            datetime ? text(datetime) : "",
+            stat("language"), stat("words"), stat("chapters"), stat("collections"),
+            stat("comments"), stat("kudos"), stat("bookmarks"), stat("hits"),
+            title ? title.getAttribute("href") : null,
+        ]);
+    } catch (e) {
+        // Keep going: one malformed work item shouldn't break the whole page
+    }
+}
+return result;
+"""
+RECORD_FIELDS = (
+    "Title", "Author", "Fandom", "Date_Updated", "Language", "Words", "Chapters",
+    "Collections", "Comments", "Kudos", "Bookmarks", "Hits",
+)
 
+# Navigation timing and bytes transferred for the current page (Resource Timing API)
+PAGE_STATS_JS = """
+const nav = performance.getEntriesByType("navigation")[0];
+const resources = performance.getEntriesByType("resource");
+return {
+    load_ms: nav ? nav.duration : null,
+    requests: resources.length + 1,
+    bytes: (nav ? nav.transferSize : 0) + resources.reduce((sum, r) => sum + (r.transferSize || 0), 0),
+};
+"""
 
-def setup_driver(page_load_timeout_s: int = PAGE_LOAD_TIMEOUT_S_DEFAULT) -> webdriver.Firefox:
-    """Initializes a headless Firefox WebDriver with custom settings."""
-    options = Options()
-    options.add_argument("--headless")
+# Event-driven readiness (--readiness event): one execute_async_script call watches the DOM with a
+# MutationObserver and returns as soon as the works list, the consent prompt or an empty finished page
+# is seen, instead of sleeping 2 s for the consent overlay and then polling for the works list.
+# The consent prompt is added by AO3's document-ready JavaScript, so it is only judged once loading completes.
+READINESS_MODES = ("fixed", "event")
+READY_JS = r"""
+const timeoutMs = arguments[0], checkConsent = arguments[1], done = arguments[arguments.length - 1];
+let finished = false, observer = null, timer = null;
+const finish = state => {
+    if (finished) { return; }
+    finished = true;
+    if (observer) { observer.disconnect(); }
+    clearTimeout(timer);
+    document.removeEventListener("readystatechange", check);
+    done({state: state, ready_ms: performance.now()});
+};
+const check = () => {
+    const complete = document.readyState === "complete";
+    if (checkConsent) {
+        if (!complete) { return; }
+        const tos = document.getElementById("tos_prompt");
+        if (tos && (tos.offsetWidth || tos.offsetHeight || tos.getClientRects().length)) { return finish("consent"); }
+    }
+    if (document.getElementsByClassName("work").length) { return finish("works"); }
+    if (complete) { finish("empty"); }
+};
+observer = new MutationObserver(check);
+observer.observe(document.documentElement, {childList: true, subtree: true});
+document.addEventListener("readystatechange", check);
+timer = setTimeout(() => finish("timeout"), timeoutMs);
+check();
+"""
 
-    # Ensure desktop rendering (AO3 can be picky with bot-like UAs)
-    options.set_preference(
-        "general.useragent.override",
-        "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:124.0) Gecko/20100101 Firefox/124.0",
-    )
+# Page-count discovery: cached counts younger than this are reused without a request
+PAGE_COUNT_MAX_AGE_H_DEFAULT = 24
+# Date windows (--windows) are split until each has at most this many result pages
+WINDOW_MAX_PAGES_DEFAULT = 100
+# Delta crawl (--since-last-run): a unit stops after this many consecutive works already in lists.jsonl
+KNOWN_STREAK_DEFAULT = 100
+# Progress and ETA are logged every this many finished pages
+PROGRESS_EVERY_N_PAGES = 10
 
-    # Reduce some long-hang cases (network stalls etc.)
-    options.set_preference("network.http.response.timeout", 120)
-    options.set_preference("network.dns.disableIPv6", True)
+# A page is given up on after this many failed captures (each with --nav-attempts navigations), over all runs
+MAX_ATTEMPTS_DEFAULT = 4
+# Delay before the first retry of a failed page; doubled for each further retry
+RETRY_BACKOFF_S_DEFAULT = 60
 
-    # Let Selenium Manager locate/download the correct geckodriver and cache it
-    service = Service()
+# Exit status when the crawl finished but some pages could not be captured (listed in dead_letters.json)
+EXIT_DEAD_LETTERS = 3
 
-    driver = webdriver.Firefox(service=service, options=options)
-    driver.set_window_size(1920, 1080)
+# A worker busy on one page for this long is stalled: its browser is killed, and if that does not free it
+# within the same time again, the worker is replaced. Must exceed --nav-attempts x --page-load-timeout.
+STALL_MINUTES_DEFAULT = 15
+# Browser kills plus worker replacements allowed per run before the run gives up
+MAX_RESTARTS_DEFAULT = 5
+HEARTBEAT_CHECK_S = 30
+# Exit status when the restart budget ran out (EX_TEMPFAIL): run again to resume from the checkpoints
+EXIT_STALLED = 75
 
-    # Hard timeouts to reduce “infinite hang” scenarios
-    driver.set_page_load_timeout(page_load_timeout_s)
-    driver.set_script_timeout(SCRIPT_TIMEOUT_S)
 
-    return driver
+def wait_until_ready(driver: webdriver.Firefox, *, check_consent: bool, timeout_s: float = WAIT_FOR_WORKS_S) -> dict:
+    """
+    Waits in-page (READY_JS) for the works list, the consent prompt or a finished page without works.
+    Returns {"state": "works" | "consent" | "empty" | "timeout" | "error", "ready_ms": ms since navigation start}.
+    """
+    try:
+        return driver.execute_async_script(READY_JS, int(timeout_s * 1000), check_consent)
+    except WebDriverException:
+        logging.exception("Readiness script failed.")
+        return {"state": "error", "ready_ms": None}
+
+
+class CrawlState:
+    """
+    Thread-safe bookkeeping shared by the worker pool: per-unit (year or date window) end pages, errors and a
+    reorder buffer that streams finished pages to the metadata file in job order, whatever order workers finish in.
+    A page waiting out a retry backoff does not hold the buffer: the pages behind it are written without it and
+    it is appended whenever it finally succeeds.
+    """
 
+    def __init__(
+            self,
+            job_list: list,
+            store: PageStore,
+            stream: MetadataStream,
+            manifest: CheckpointManifest,
+            recorder: MetricsRecorder,
+            last_pages: dict | None = None,
+    ):
+        self._lock = threading.Lock()
+        self._end_page = {}
+        self._jobs = job_list
+        # Last planned page of each unit; a shard's jobs do not include every unit's last page
+        self._last_page = last_pages
+        if last_pages is None:
+            self._last_page = {}
+            for unit, page_num, _ in job_list:
+                self._last_page[unit] = max(page_num, self._last_page.get(unit, 0))
+        self.store = store
+        self.recorder = recorder
+        self._stream = stream
+        self._manifest = manifest
+        self._finished = {}
+        self._deferred = set()
+        self._next_index = 0
+        self._started = time.monotonic()
+        self._done = 0
+        self._resumed = 0
+        self.stop_event = threading.Event()
+        self.error = None
 
-def handle_consent(driver: webdriver.Firefox) -> None:
-    """Detects and clicks the AO3 Terms of Service consent prompt if present."""
+    def _past_end(self, unit: int | str, page_num: int) -> bool:
+        end_page = self._end_page.get(unit)
+        return end_page is not None and page_num > end_page
+
+    def is_past_end(self, unit: int | str, page_num: int) -> bool:
+        with self._lock:
+            return self._past_end(unit, page_num)
+
+    def job(self, index: int) -> tuple:
+        """The (unit, page) of the job at index."""
+        return self._jobs[index][:2]
+
+    def is_last_planned(self, unit: int | str, page_num: int) -> bool:
+        return self._last_page.get(unit) == page_num
+
+    def mark_end(self, unit: int | str, page_num: int) -> None:
+        """Records that no page after page_num should be captured for this unit."""
+        with self._lock:
+            end_page = self._end_page.get(unit)
+            if end_page is None or page_num < end_page:
+                self._end_page[unit] = page_num
+
+    def checkpoint(self, unit: int | str, page_num: int) -> dict | None:
+        """Returns the manifest entry of a saved page whose stored bytes and records are unchanged."""
+        return self._manifest.lookup(unit, page_num, self.store, self._stream.size)
+
+    def _write(self, index: int, result: tuple | None) -> None:
+        unit, page_num = self._jobs[index][:2]
+        if result is None or self._past_end(unit, page_num):
+            return
+        works, entry = result
+        if entry is None:
+            # Checkpoint hit: records are already in the stream
+            return
+        offset, length, records = self._stream.write_page(works)
+        self._manifest.record(dict(entry, offset=offset, length=length, records=records))
+
+    def _advance(self) -> None:
+        """Writes every page now contiguous with the already-written ones, skipping pages in retry."""
+        while self._next_index in self._finished or self._next_index in self._deferred:
+            if self._next_index in self._finished:
+                self._write(self._next_index, self._finished.pop(self._next_index))
+            else:
+                self._deferred.discard(self._next_index)
+            self._next_index += 1
+
+    def defer(self, index: int) -> None:
+        """
+        Marks a job as waiting out a retry backoff. The pages behind it are written as soon as they are
+        contiguous without it; the job ledger records the gap until the page succeeds or is given up on.
+        """
+        with self._lock:
+            self._deferred.add(index)
+            self._advance()
+
+    def finish(self, index: int, result: tuple | None) -> None:
+        """
+        Marks a job as done with its (works, manifest entry) result and writes every page
+        that is now contiguous with the already-written ones. A page the buffer already skipped while it was in
+        retry is written straight away, after the pages that overtook it.
+        """
+        with self._lock:
+            self._deferred.discard(index)
+            if index < self._next_index:
+                self._write(index, result)
+            else:
+                self._finished[index] = result
+                self._advance()
+            # Jobs past a unit's end are skipped for free and count as neither done nor planned
+            unit, page_num = self._jobs[index][:2]
+            if self._past_end(unit, page_num):
+                return
+            self._done += 1
+            if result is not None and result[1] is None:
+                self._resumed += 1
+            if self._done % PROGRESS_EVERY_N_PAGES == 0:
+                self._log_progress()
+
+    def log_progress(self) -> None:
+        with self._lock:
+            self._log_progress()
+
+    def _log_progress(self) -> None:
+        """Logs pages done out of the planned total, with an ETA from this run's fetch rate."""
+        planned = sum(1 for unit, page_num, _ in self._jobs if not self._past_end(unit, page_num))
+        done = min(self._done, planned)
+        fetched = self._done - self._resumed
+        elapsed_s = time.monotonic() - self._started
+        eta = "unknown"
+        if done == planned:
+            eta = "0:00:00"
+        elif fetched:
+            eta = str(timedelta(seconds=round((planned - done) * elapsed_s / fetched)))
+        logging.info(f"Progress: {done}/{planned} pages ({100 * done / max(planned, 1):.1f}%), ETA {eta}.")
+
+    def flush(self) -> None:
+        """Writes any pages still buffered behind an unfinished job (used on shutdown)."""
+        with self._lock:
+            for index in sorted(self._finished):
+                self._write(index, self._finished.pop(index))
+
+    def fail(self, error: BaseException) -> None:
+        with self._lock:
+            if self.error is None:
+                self.error = error
+        self.stop_event.set()
+
+
+def unit_label(unit: int | str) -> str:
+    return f"year {unit}" if isinstance(unit, int) else f"window {unit}"
+
+
+def build_jobs(units: list, args: argparse.Namespace) -> list:
+    """Expands the planned list units into an ordered list of (unit, page, base_url) jobs; only its own with --shard."""
+    jobs = []
+    for unit in units:
+        start_page, end_page = unit["start_page"], unit["end_page"]
+        shard = f", shard {args.shard[0]}/{args.shard[1]}" if args.shard else ""
+        logging.info(
+            f">>> Queueing {unit_label(unit['unit']).capitalize()} (Range: {start_page} to {end_page}{shard})"
+        )
+
+        for page_num in range(start_page, end_page + 1):
+            if args.shard is None or shard_owns(page_num, *args.shard):
+                jobs.append((unit["unit"], page_num, unit["list_url"]))
+    return jobs
+
+
+def load_page_counts(path: str) -> dict:
+    """Loads the page-count cache: {list_url: {"year", ["window",] "pages", "method", "discovered_at"}}."""
+    if not os.path.exists(path):
+        return {}
     try:
-        # Brief pause to allow overlays to trigger
-        time.sleep(2)
-        tos_prompt = driver.find_elements(By.ID, "tos_prompt")
-        if tos_prompt and tos_prompt[0].is_displayed():
-            logging.info("Consent prompt detected. Accepting AO3 Terms...")
-            driver.find_element(By.ID, "tos_agree").click()
-            driver.find_element(By.ID, "data_processing_agree").click()
-            driver.find_element(By.ID, "accept_tos").click()
-            WebDriverWait(driver, 10).until(EC.invisibility_of_element_located((By.ID, "tos_prompt")))
-            logging.info("Terms accepted successfully.")
-    except Exception:
-        # Prompt may already be accepted or not present (or AO3 changed markup)
-        pass
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except ValueError:
+        logging.warning(f"Ignoring unreadable page-count cache {path}.")
+        return {}
+
 
+def save_page_counts(path: str, page_counts: dict) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Shards running side by side share this cache
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(page_counts, f, indent=4)
+    os.replace(tmp_path, path)
 
-def dump_debug_artifacts(driver: webdriver.Firefox, *, year: int, page_num: int, stage: str) -> None:
-    """Best-effort debug dump (HTML + screenshot) to diagnose EC2-only failures."""
+
+def page_count_is_fresh(entry: dict | None, max_age_h: float) -> bool:
+    if entry is None:
+        return False
+    discovered_at = datetime.fromisoformat(entry["discovered_at"])
+    return datetime.now(timezone.utc) - discovered_at < timedelta(hours=max_age_h)
+
+
+def fetch_page(
+        session: "WorkerSession",
+        url: str,
+        *,
+        year: int,
+        page_num: int,
+        rate_limiter: RateLimiter,
+        probe: bool = False,
+) -> tuple:
+    """
+    Fetches a list page over HTTP when a session exists, else (or on failure) in the browser.
+    A probe (page count search) may land past the last page: an HTTP page without works is then returned as is
+    instead of falling back to the browser, and the browser writes no debug artifacts for it.
+    Returns (html, in-page result), or (None, None) on failure.
+    """
+    page_source, extracted = None, None
+    if session.http is not None:
+        page_source = http_get(
+            session.http, url, year=year, page_num=page_num, rate_limiter=rate_limiter, allow_empty=probe
+        )
+        metrics.note(source="http")
+    if page_source is None:
+        fetched = browser_get_page(
+            session, url, year=year, page_num=page_num, rate_limiter=rate_limiter, dump_debug=not probe
+        )
+        metrics.note(source="browser")
+        if fetched is not None:
+            page_source, extracted = fetched
+    return page_source, extracted
+
+
+def search_page_count(
+        session: "WorkerSession",
+        base_url: str,
+        unit: int | str,
+        hint: int,
+        rate_limiter: RateLimiter,
+) -> int | None:
+    """
+    Finds the last page with works by probing: doubles from the hint until a page is empty, then bisects.
+    A probe that fails is treated as empty, so the result can only err low (the crawl warns when the last
+    planned page of a unit still has a next page).
+    """
+    def probe(page_num: int) -> bool:
+        url = f"{base_url}{page_num}"
+        html, _ = fetch_page(session, url, year=unit, page_num=page_num, rate_limiter=rate_limiter, probe=True)
+        return has_works(html)
+
+    if not probe(1):
+        return None
+    low, high = 1, max(hint, 2)
+    while probe(high):
+        low, high = high, high * 2
+    # Invariant: page low has works, page high does not
+    while high - low > 1:
+        mid = (low + high) // 2
+        if probe(mid):
+            low = mid
+        else:
+            high = mid
+    return low
+
+
+class PageCounter:
+    """
+    Page counts of list URLs, reusing counts cached in page_counts.json when younger than
+    --page-count-max-age hours. A stale count is read from the pagination of page 1, or found by binary
+    search when page 1 has no readable pagination, then cached with a timestamp. The browser/HTTP session
+    used for discovery is only started when a count has to be fetched. With refresh off, cached counts are
+    returned whatever their age and nothing is fetched.
+    """
+
+    def __init__(self, args: argparse.Namespace, rate_limiter: RateLimiter, cache_path: str, refresh: bool = True):
+        self.args = args
+        self.rate_limiter = rate_limiter
+        self.cache_path = cache_path
+        self.refresh = refresh
+        self.page_counts = load_page_counts(cache_path)
+        self._session = None
+
+    def count(self, unit: int | str, base_url: str, hint: int) -> int | None:
+        """Returns the number of result pages of a list URL, or None when it could not be discovered."""
+        cached = self.page_counts.get(base_url)
+        if not self.refresh:
+            return cached["pages"] if cached else None
+        if page_count_is_fresh(cached, self.args.page_count_max_age):
+            return cached["pages"]
+
+        if self._session is None:
+            self._session = WorkerSession(self.args, self.rate_limiter)
+        year = unit_year(unit)
+        url = f"{base_url}1"
+        html, _ = fetch_page(self._session, url, year=unit, page_num=1, rate_limiter=self.rate_limiter)
+        pages, method = page_count(html), "pagination"
+        if pages is None:
+            logging.warning(f"No pagination readable on page 1 of {unit_label(unit)}; searching for the last page.")
+            pages = search_page_count(self._session, base_url, unit, hint, self.rate_limiter)
+            method = "search"
+        if pages is None:
+            logging.error(f"Could not discover the page count of {unit_label(unit)}.")
+            return None
+
+        logging.info(f"Discovered {pages} pages for {unit_label(unit)} ({method}).")
+        self.page_counts[base_url] = {
+            "year": year,
+            **({"window": unit} if isinstance(unit, str) else {}),
+            "pages": pages,
+            "method": method,
+            "discovered_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        save_page_counts(self.cache_path, self.page_counts)
+        return pages
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+
+
+def plan_units(year_configs: list, args: argparse.Namespace, rate_limiter: RateLimiter) -> list:
+    """
+    Resolves what to crawl as list units with their page ranges: one unit per year, or with --windows
+    the year's date windows (see ao3_lists_windows.plan_windows). Page counts are discovered unless in
+    test mode (every unit is capped at --pages) or with --no-discover (end_page from the input JSON,
+    --window-pages for windows; the has_next check still ends each unit).
+    A delta crawl (--since-last-run) discovers nothing: its units have no end_page, as it stops at known works
+    or the last page, and --windows splits them by the cached counts of the last full crawl.
+    """
+    counter = None
+    if args.since_last_run:
+        if args.windows and not args.test:
+            counter = PageCounter(args, rate_limiter, PAGE_COUNTS_OUT, refresh=False)
+    elif not (args.test or args.no_discover):
+        counter = PageCounter(args, rate_limiter, PAGE_COUNTS_OUT)
+    units = []
     try:
-        os.makedirs(DEBUG_DIR, exist_ok=True)
-        ts = time.strftime("%Y%m%d_%H%M%S")
-        prefix = f"{DEBUG_DIR}/year{year}_page{page_num:04d}_{stage}_{ts}"
-        try:
-            driver.save_screenshot(f"{prefix}.png")
-        except Exception:
-            pass
-        try:
-            with open(f"{prefix}.html", "w", encoding="utf-8") as f:
-                f.write(driver.page_source or "")
-        except Exception:
-            pass
-        logging.info(f"Saved debug artifacts: {prefix}.(html/png)")
-    except Exception:
-        pass
+        for config in year_configs:
+            year, base_url = config["year"], config["list_url"]
+            if args.windows:
+                def count_pages(url: str) -> int | None:
+                    return counter.count(window_name(*list_date_range(url)), url, 1) if counter is not None else None
 
+                for name, url, pages in plan_windows(base_url, count_pages, args.window_pages):
+                    if args.test:
+                        end_page = args.pages
+                    elif args.since_last_run:
+                        end_page = None
+                    else:
+                        end_page = pages or args.window_pages
+                    units.append({"unit": name, "list_url": url, "start_page": 1, "end_page": end_page})
+                continue
+
+            pages = counter.count(year, base_url, config.get("end_page", 1)) if counter is not None else None
+            if args.test:
+                end_page = args.pages
+            elif args.since_last_run:
+                end_page = None
+            elif pages is not None:
+                end_page = pages
+            else:
+                if counter is not None:
+                    logging.error(f"Using end_page from {INPUT_JSON} for {year}.")
+                end_page = config["end_page"]
+            start_page = config.get("start_page", 1)
+            units.append({"unit": year, "list_url": base_url, "start_page": start_page, "end_page": end_page})
+    finally:
+        if counter is not None:
+            counter.close()
+    return units
 
-def safe_get(
-        driver: webdriver.Firefox,
+
+def http_get(
+        session: requests.Session,
         url: str,
         *,
         year: int,
         page_num: int,
-        attempts: int = 3,
-) -> bool:
+        rate_limiter: RateLimiter | None = None,
+        allow_empty: bool = False,
+) -> str | None:
+    """
+    Fetches a list page over plain HTTP.
+    Returns None on a challenge page, 5xx/429/403 or network error so the caller can fall back to the browser,
+    and on a page without a works list unless allow_empty is set.
     """
-    Navigate with retries/backoff.
-    EC2 can experience intermittent slow loads / throttling; this makes the run robust.
+    if rate_limiter is not None:
+        rate_limiter.acquire()
+    start = time.monotonic()
+    try:
+        with metrics.stage("http"):
+            response = session.get(url, timeout=HTTP_TIMEOUT_S)
+    except requests.exceptions.RequestException as e:
+        logging.warning(f"HTTP fetch failed for year={year}, page={page_num}: {e}. Falling back to browser.")
+        if rate_limiter is not None:
+            rate_limiter.report_failure("HTTP network error")
+        return None
+    elapsed_ms = (time.monotonic() - start) * 1000
+
+    if response.status_code >= 500 or response.status_code in (403, 429):
+        logging.warning(
+            f"HTTP {response.status_code} for year={year}, page={page_num}. Falling back to browser."
+        )
+        if rate_limiter is not None:
+            pause_s = None
+            if response.status_code in (429, 525):
+                retry_after = response.headers.get("Retry-After", "")
+                pause_s = float(retry_after) if retry_after.isdigit() else ADAPTIVE_PENALTY_S
+            rate_limiter.report_failure(f"HTTP {response.status_code}", pause_s)
+        return None
+
+    metrics.count("bytes", len(response.content))
+    html = response.text
+    challenge = any(marker in html for marker in CHALLENGE_MARKERS)
+    if challenge or ('class="work index group"' not in html and not allow_empty):
+        logging.warning(f"Challenge or unexpected page for year={year}, page={page_num}. Falling back to browser.")
+        if rate_limiter is not None and challenge:
+            rate_limiter.report_failure("challenge page")
+        return None
+
+    if rate_limiter is not None:
+        rate_limiter.report_success(elapsed_ms)
+    return html
+
+
+def browser_get_page(
+        session: WorkerSession,
+        url: str,
+        *,
+        year: int,
+        page_num: int,
+        rate_limiter: RateLimiter,
+        dump_debug: bool = True,
+) -> tuple | None:
     """
-    for attempt in range(1, attempts + 1):
+    Loads a list page in Firefox (consent + works wait), saving debug artifacts on failure if dump_debug is set.
+    Returns (html, in-page result) where the in-page result is None in 'page' extract mode, or None on failure.
+    """
+    driver = session.get_driver()
+    session.last_error = None
+    ok = safe_get(
+        driver,
+        url,
+        year=year,
+        page_num=page_num,
+        attempts=session.args.nav_attempts,
+        rate_limiter=rate_limiter,
+    )
+    if not ok:
+        logging.error(f"driver.get() failed for page {page_num}.")
+        session.last_error = "navigation failed"
+        return None
+
+    ready_ms = None
+    if session.args.readiness == "event":
+        with metrics.stage("ready"):
+            ready = wait_until_ready(driver, check_consent=not session.consented)
+        if ready["state"] == "consent":
+            with metrics.stage("consent"):
+                try:
+                    accept_consent(driver)
+                except Exception:
+                    logging.exception("Could not accept the AO3 Terms.")
+            with metrics.stage("ready"):
+                ready = wait_until_ready(driver, check_consent=False)
+        if ready["state"] != "works":
+            logging.error(f"Page {page_num} not ready ({ready['state']}).")
+            if ready["state"] != "empty":
+                rate_limiter.report_failure(f"page not ready ({ready['state']})")
+            if dump_debug:
+                dump_debug_artifacts(driver, year=year, page_num=page_num, stage=f"no_works_{ready['state']}")
+            session.last_error = f"page not ready ({ready['state']})"
+            return None
+        session.consented = True
+        ready_ms = ready["ready_ms"]
+        logging.info(f"Page {page_num} ready after {ready_ms:.0f} ms.")
+    else:
+        with metrics.stage("consent"):
+            handle_consent(driver)
+
         try:
-            driver.get(url)
-            return True
-        except TimeoutException:
-            logging.warning(
-                f"Navigation timed out (attempt {attempt}/{attempts}) for year={year}, page={page_num}, url={url}"
-            )
-            # Stop loading so we can retry without a stuck tab
-            try:
-                driver.execute_script("window.stop();")
-            except Exception:
-                pass
+            with metrics.stage("wait_works"):
+                WebDriverWait(driver, WAIT_FOR_WORKS_S).until(
+                    EC.presence_of_element_located((By.CLASS_NAME, "work"))
+                )
+        except Exception:
+            logging.error(f"Page {page_num} timed out or is empty.")
+            if dump_debug:
+                dump_debug_artifacts(driver, year=year, page_num=page_num, stage="no_works_timeout")
+            session.last_error = "works list timed out"
+            return None
+
+    extracted = None
+    if session.args.extract == "page":
+        with metrics.stage("page_source"):
+            page_source = driver.page_source
+    else:
+        with metrics.stage("extract"):
+            extracted = driver.execute_script(EXTRACT_JS, session.args.extract == "records")
+        if extracted is None:
+            logging.error(f"Page {page_num} has no works list.")
+            if dump_debug:
+                dump_debug_artifacts(driver, year=year, page_num=page_num, stage="no_works_list")
+            session.last_error = "no works list"
+            return None
+        page_source = wrap_fragment(extracted["works"], extracted["pagination"])
+    metrics.count("bytes", len(page_source.encode("utf-8")))
+    if ready_ms is not None:
+        load_ms = ready_ms
+    else:
+        try:
+            load_ms = driver.execute_script(NAV_DURATION_JS)
         except WebDriverException:
-            logging.exception(
-                f"WebDriver error during navigation (attempt {attempt}/{attempts}) "
-                f"for year={year}, page={page_num}, url={url}"
-            )
+            load_ms = None
+    rate_limiter.report_success(load_ms)
+    session.after_browser_page(load_ms)
+    return page_source, extracted
+
+
+def records_from_rows(rows: list, year: int) -> list:
+    """Turns the rows built in-page by EXTRACT_JS into the same dicts scrape_page_content returns."""
+    works = []
+    for row in rows:
+        work = {"Year": year}
+        work.update(zip(RECORD_FIELDS, row))
+        href = row[-1]
+        work["URL"] = f"{WORK_URL_PREFIX}{href}{WORK_URL_SUFFIX}" if href else ""
+        works.append(work)
+    return works
+
 
-        if attempt < attempts:
-            backoff_s = 10 * attempt + random.uniform(0, 3)
-            logging.info(f"Retrying after {backoff_s:.1f}s...")
-            time.sleep(backoff_s)
+def save_and_parse(
+        store: PageStore,
+        unit: int | str,
+        page_num: int,
+        page_source: str,
+        extracted: dict | None,
+        args: argparse.Namespace,
+) -> tuple:
+    """Stores a freshly fetched page and returns its (works, has_next)."""
+    with metrics.stage("write"):
+        store.write(unit, page_num, extract_fragment(page_source) if args.fragment else page_source)
+    with metrics.stage("parse"):
+        if extracted is not None and extracted["rows"] is not None:
+            return records_from_rows(extracted["rows"], unit_year(unit)), extracted["has_next"]
+        return scrape_page_content(page_source, unit_year(unit), engine=args.parser)
 
-    dump_debug_artifacts(driver, year=year, page_num=page_num, stage="nav_failed")
-    return False
 
+def capture_page(
+        session: WorkerSession,
+        job: tuple,
+        state: CrawlState,
+        rate_limiter: RateLimiter,
+) -> tuple | None:
+    """
+    Captures (or resumes from checkpoint) a single list page.
+    Returns (works, manifest entry), with a None entry when the page is already recorded, or None on failure
+    (or when the page turned out to be past its unit's end); the caller schedules any retry.
+    """
+    unit, page_num, base_url = job
+    year = unit_year(unit)
+    store = state.store
 
-def scrape_page_content(html: str, year: int):
-    """Parses AO3 list HTML and extracts metadata for work entries."""
-    soup = BeautifulSoup(html, "lxml")
-    works_data = []
+    # Checkpointing: if the page is already stored, resume from the manifest or re-parse it
+    if store.exists(unit, page_num):
+        metrics.note(source="store")
+        entry = state.checkpoint(unit, page_num)
+        if entry is not None:
+            result = ([], None)
+            has_next = entry["has_next"]
+        else:
+            logging.info(f"Skipping {page_name(unit, page_num)} (exists, not in manifest). Parsing content...")
+            with metrics.stage("parse"):
+                works, has_next = scrape_page_content(store.read(unit, page_num), year, engine=session.args.parser)
+            result = (works, page_entry(unit, page_num, store, has_next, len(works)))
 
-    ol_tag = soup.find("ol", class_="work index group")
-    if not ol_tag:
-        return works_data, False
+        if not has_next:
+            logging.info(f"End of results reached at page {page_num} (no 'Next' button).")
+            state.mark_end(unit, page_num)
+        return result
 
-    # Pagination “Next”
-    next_button = soup.find("li", class_="next")
-    has_next = next_button is not None and next_button.find("a") is not None
+    url = f"{base_url}{page_num}"
+    logging.info(f"Fetching Page {page_num}: {url}")
 
-    for li in ol_tag.select("li.work"):
-        try:
-            fandom_h5 = li.find("h5", class_="fandoms")
-            if not fandom_h5:
-                continue
+    page_source, extracted = fetch_page(session, url, year=unit, page_num=page_num, rate_limiter=rate_limiter)
+    if page_source is None:
+        if not state.is_past_end(unit, page_num):
+            # Otherwise another worker already found the last page; this one is simply beyond it
+            logging.error(f"Could not capture page {page_num} of {unit_label(unit)}.")
+        return None
 
-            fandom_tags = fandom_h5.find_all("a", class_="tag")
-            fandom_names = [t.get_text(strip=True) for t in fandom_tags]
+    page_works, has_next = save_and_parse(store, unit, page_num, page_source, extracted, session.args)
+    logging.info(f"Captured {len(page_works)} Original Works from page {page_num}.")
 
-            # Strict filter: only exactly one fandom and it must be “Original Work”
-            if len(fandom_names) != 1 or fandom_names[0] != "Original Work":
-                continue
+    if not has_next:
+        logging.info(f"Reached the definitive end of results for {unit_label(unit)} at page {page_num}.")
+        state.mark_end(unit, page_num)
+    elif state.is_last_planned(unit, page_num) and not session.args.test:
+        logging.warning(
+            f"Page {page_num} is the last planned page of {unit_label(unit)} but has a next page; the page count "
+            f"is stale (rediscover with --page-count-max-age 0)."
+        )
+    return page_works, page_entry(unit, page_num, store, has_next, len(page_works))
 
-            title_tag = li.find("h4", class_="heading").find("a", recursive=False)
-            author_tag = li.find("a", rel="author")
 
-            def get_stat(class_name: str) -> str:
-                tag = li.find("dd", class_=class_name)
-                return tag.get_text(strip=True) if tag else "0"
+def crawl_worker(
+        worker_id: int,
+        job_queue: JobQueue,
+        state: CrawlState,
+        rate_limiter: RateLimiter,
+        args: argparse.Namespace,
+        supervisor: "CrawlSupervisor",
+) -> None:
+    """
+    Drains (unit, page) jobs with a dedicated Firefox driver and/or HTTP session. A failed page goes back to
+    the queue to wait out its backoff while this worker moves on to the next ready page. The worker exits
+    without reporting if the supervisor took its page away while it was hung.
+    """
+    threading.current_thread().name = f"worker-{worker_id}"
+    session = WorkerSession(args, rate_limiter)
+    supervisor.register(worker_id, session)
 
-            datetime_tag = li.find("p", class_="datetime")
+    try:
+        while not state.stop_event.is_set():
+            supervisor.idle(worker_id)
+            item = job_queue.take(worker_id)
+            if item is None:
+                break
 
-            if title_tag and title_tag.get("href"):
-                url = f"https://archiveofourown.org{title_tag['href']}?view_adult=true&view_full_work=true"
+            index, job = item
+            unit, page_num = job[0], job[1]
+            if state.is_past_end(unit, page_num):
+                job_queue.done(index, worker_id)
+                state.finish(index, None)
+                continue
+
+            supervisor.busy(worker_id, index)
+            state.recorder.begin_page(unit, page_num)
+            result = capture_page(session, job, state, rate_limiter)
+            if result is None and not state.is_past_end(unit, page_num):
+                outcome = job_queue.failed(index, worker_id, session.last_error or "fetch failed")
+                if outcome is None:
+                    break
+                if outcome == "retry":
+                    state.recorder.end_page("retry")
+                    state.defer(index)
+                    continue
+                state.recorder.end_page("failed")
             else:
-                url = ""
-
-            work = {
-                "Year": year,
-                "Title": title_tag.get_text(strip=True) if title_tag else "Anonymous",
-                "Author": author_tag.get_text(strip=True) if author_tag else "Anonymous",
-                "Fandom": fandom_names[0],
-                "Date_Updated": datetime_tag.get_text(strip=True) if datetime_tag else "",
-                "Language": get_stat("language"),
-                "Words": get_stat("words"),
-                "Chapters": get_stat("chapters"),
-                "Collections": get_stat("collections"),
-                "Comments": get_stat("comments"),
-                "Kudos": get_stat("kudos"),
-                "Bookmarks": get_stat("bookmarks"),
-                "Hits": get_stat("hits"),
-                "URL": url,
+                if not job_queue.done(index, worker_id):
+                    break
+                if result is None:
+                    state.recorder.end_page("past_end")
+                else:
+                    state.recorder.end_page("resumed" if result[1] is None else "ok", len(result[0]))
+            state.finish(index, result)
+    except Exception as e:
+        logging.exception(f"Critical Error in worker {worker_id}")
+        state.fail(e)
+    finally:
+        supervisor.idle(worker_id)
+        session.close()
+
+
+class CrawlSupervisor:
+    """
+    Runs the crawl workers and watches their heartbeats: each worker reports when it starts a page and when it
+    goes back to the queue. A worker busy on one page for --stall-minutes is stalled. Its browser is killed
+    first, which makes a call hung on geckodriver or Firefox fail so the page is retried with a new browser.
+    If the worker is still stuck after the same time again, its page is failed on its behalf and a new worker
+    takes its place, leaving the hung thread behind. Every kill or replacement is charged to the restart
+    budget; once it is used up the crawl stops, so that a fresh process can resume from the checkpoints.
+    """
+
+    def __init__(
+            self,
+            job_queue: JobQueue,
+            state: CrawlState,
+            rate_limiter: RateLimiter,
+            args: argparse.Namespace,
+    ):
+        self.job_queue = job_queue
+        self.state = state
+        self.rate_limiter = rate_limiter
+        self.args = args
+        self.stall_s = args.stall_minutes * 60
+        self.restarts = 0
+        self.exhausted = False
+        self._lock = threading.Lock()
+        self._workers = {}  # worker id -> {"thread", "session", "index", "since", "killed"}
+        self._next_id = 1
+
+    def start_worker(self) -> None:
+        with self._lock:
+            worker_id = self._next_id
+            self._next_id += 1
+            thread = threading.Thread(
+                target=crawl_worker,
+                args=(worker_id, self.job_queue, self.state, self.rate_limiter, self.args, self),
+                daemon=True,
+            )
+            self._workers[worker_id] = {
+                "thread": thread, "session": None, "index": None, "since": None, "killed": False
             }
-            works_data.append(work)
-        except Exception:
-            # Keep going: one malformed work item shouldn’t break the whole page
-            pass
+        thread.start()
+
+    def _update(self, worker_id: int, **fields) -> None:
+        with self._lock:
+            # A replaced worker is no longer watched
+            if worker_id in self._workers:
+                self._workers[worker_id].update(fields)
+
+    def register(self, worker_id: int, session: WorkerSession) -> None:
+        self._update(worker_id, session=session)
 
-    return works_data, has_next
+    def busy(self, worker_id: int, index: int) -> None:
+        """Heartbeat: the worker has started the job at index."""
+        self._update(worker_id, index=index, since=time.monotonic(), killed=False)
+
+    def idle(self, worker_id: int) -> None:
+        """Heartbeat: the worker is waiting for a job (or exiting), which never counts as a stall."""
+        self._update(worker_id, index=None, since=None, killed=False)
+
+    def run(self) -> None:
+        """Starts --workers workers and returns once they have all finished or the restart budget is used up."""
+        for _ in range(self.args.workers):
+            self.start_worker()
+        last_check = time.monotonic()
+        while not self.exhausted:
+            with self._lock:
+                threads = [worker["thread"] for worker in self._workers.values()]
+            if not any(thread.is_alive() for thread in threads):
+                break
+            time.sleep(1)
+            if self.stall_s > 0 and time.monotonic() - last_check >= HEARTBEAT_CHECK_S:
+                self.check()
+                last_check = time.monotonic()
+
+    def stop(self) -> None:
+        """Asks the workers to stop after their current page and waits for those not known to be hung."""
+        self.state.stop_event.set()
+        with self._lock:
+            workers = list(self._workers.values())
+        for worker in workers:
+            worker["thread"].join(timeout=0 if worker["killed"] else (self.stall_s or None))
+
+    def check(self) -> None:
+        """Kills the browser of, or replaces, each worker that has been busy on one page for too long."""
+        now = time.monotonic()
+        replaced = []
+        with self._lock:
+            for worker_id, worker in list(self._workers.items()):
+                if worker["index"] is None or not worker["thread"].is_alive() or now - worker["since"] < self.stall_s:
+                    continue
+                if self.restarts >= self.args.max_restarts:
+                    logging.error(
+                        f"worker-{worker_id} is stalled and the restart budget of {self.args.max_restarts} is used "
+                        f"up; stopping so that a new run can resume from the checkpoints."
+                    )
+                    self.exhausted = True
+                    self.state.stop_event.set()
+                    break
+                unit, page_num = self.state.job(worker["index"])
+                stalled_min = (now - worker["since"]) / 60
+                self.restarts += 1
+                if not worker["killed"] and worker["session"] is not None and worker["session"].kill_driver():
+                    logging.warning(
+                        f"worker-{worker_id} has been on page {page_num} of {unit_label(unit)} for "
+                        f"{stalled_min:.0f} min; killed its browser (restart {self.restarts}/{self.args.max_restarts})."
+                    )
+                    worker.update(since=now, killed=True)
+                else:
+                    logging.warning(
+                        f"worker-{worker_id} is stuck on page {page_num} of {unit_label(unit)} ({stalled_min:.0f} min "
+                        f"without progress); replacing it (restart {self.restarts}/{self.args.max_restarts})."
+                    )
+                    del self._workers[worker_id]
+                    replaced.append((worker_id, worker["index"]))
+
+        for worker_id, index in replaced:
+            outcome = self.job_queue.failed(index, worker_id, "worker stalled")
+            if outcome == "retry":
+                self.state.defer(index)
+            elif outcome == "dead":
+                self.state.finish(index, None)
+            self.start_worker()
+
+
+def delta_crawl_unit(
+        session: WorkerSession,
+        unit: dict,
+        known: dict,
+        store: PageStore,
+        rate_limiter: RateLimiter,
+        recorder: MetricsRecorder,
+) -> list:
+    """
+    Crawls one list unit from page 1 and returns its new or updated records (URL unknown, or a different
+    Date_Updated), stopping once --known-streak consecutive works are already in lists.jsonl, at the last
+    page, or at end_page when the unit has one (test mode).
+    """
+    args = session.args
+    name = unit["unit"]
+    records, streak, page_num = [], 0, 0
+    while unit["end_page"] is None or page_num < unit["end_page"]:
+        page_num += 1
+        url = f"{unit['list_url']}{page_num}"
+        logging.info(f"Fetching Page {page_num}: {url}")
+        recorder.begin_page(name, page_num)
+        page_source, extracted = fetch_page(session, url, year=name, page_num=page_num, rate_limiter=rate_limiter)
+        if page_source is None:
+            recorder.end_page("failed")
+            logging.error(f"Stopping delta crawl of {unit_label(name)} at page {page_num}; later changes are missed.")
+            break
+
+        works, has_next = save_and_parse(store, name, page_num, page_source, extracted, args)
+        recorder.end_page("ok", len(works))
+        changed = 0
+        for work in works:
+            if known.get(work["URL"]) == work["Date_Updated"]:
+                streak += 1
+            else:
+                streak = 0
+                changed += 1
+                records.append(work)
+        logging.info(f"Page {page_num}: {changed} new or updated of {len(works)} works.")
+
+        if streak >= args.known_streak:
+            logging.info(f"{streak} consecutive known works; {unit_label(name)} is up to date.")
+            break
+        if not has_next:
+            break
+    return records
+
+
+def delta_worker(
+        worker_id: int,
+        units: queue.Queue,
+        results: dict,
+        known: dict,
+        store: PageStore,
+        rate_limiter: RateLimiter,
+        recorder: MetricsRecorder,
+        args: argparse.Namespace,
+) -> None:
+    """Drains list units for a delta crawl; each unit is crawled by one worker, units in parallel."""
+    threading.current_thread().name = f"worker-{worker_id}"
+    session = WorkerSession(args, rate_limiter)
+    try:
+        while True:
+            try:
+                index, unit = units.get_nowait()
+            except queue.Empty:
+                break
+            results[index] = delta_crawl_unit(session, unit, known, store, rate_limiter, recorder)
+    except Exception:
+        logging.exception(f"Critical Error in worker {worker_id}")
+    finally:
+        session.close()
+
+
+def log_job_summary(job_queue: JobQueue) -> None:
+    """Writes the pages given up on to dead_letters.json and logs them, with any retries left for the next run."""
+    dead = write_dead_letters(DEAD_LETTERS_OUT, job_queue)
+    if dead:
+        logging.error(f"{len(dead)} page(s) could not be captured (see {DEAD_LETTERS_OUT}):")
+        for entry in dead:
+            unit = entry_unit(entry)
+            logging.error(
+                f"  {unit_label(unit)}, page {entry['page']}: {entry['attempts']} attempts, "
+                f"last error: {entry.get('error', 'unknown')}"
+            )
+    waiting = job_queue.waiting()
+    if waiting:
+        logging.warning(f"{waiting} failed page(s) were still waiting for a retry; the next run picks them up.")
+
+
+def use_output_root(root: str) -> None:
+    """Points the per-run outputs (pages, metadata stream, manifest, ledger, metrics, exports) at another root."""
+    global LISTS_DIR, JSONL_OUT, EXCEL_OUT, PARQUET_OUT, METRICS_OUT, METRICS_PROM_OUT, MANIFEST_OUT, JOBS_OUT
+    global DEAD_LETTERS_OUT
+    LISTS_DIR = os.path.join(root, "00_lists")
+    JSONL_OUT = os.path.join(root, "lists.jsonl")
+    EXCEL_OUT = os.path.join(root, "lists.xlsx")
+    PARQUET_OUT = os.path.join(root, "lists.parquet")
+    METRICS_OUT = os.path.join(root, "metrics.jsonl")
+    METRICS_PROM_OUT = os.path.join(root, "metrics.prom")
+    MANIFEST_OUT = os.path.join(root, "manifest.jsonl")
+    JOBS_OUT = os.path.join(root, "jobs.jsonl")
+    DEAD_LETTERS_OUT = os.path.join(root, "dead_letters.json")
+
+
+def export_outputs(args: argparse.Namespace) -> None:
+    """Exports lists.jsonl to the typed Parquet dataset (the primary output) and, unless --no-excel, to Excel."""
+    rows = export_parquet(JSONL_OUT, PARQUET_OUT)
+    if not args.no_excel:
+        export_excel(JSONL_OUT, EXCEL_OUT)
+    logging.info(f"SUCCESS: {rows} total records saved.")
+
+
+def run_delta_crawl(
+        units: list,
+        args: argparse.Namespace,
+        rate_limiter: RateLimiter,
+        recorder: MetricsRecorder,
+) -> None:
+    """
+    --since-last-run: re-crawls every unit from page 1 until it reaches works already captured, then
+    merges the new or updated records into lists.jsonl and re-exports it.
+    Pages are saved under 00_delta/<run timestamp>/, leaving the full crawl's pages and manifest untouched.
+    """
+    known = load_known_works(JSONL_OUT)
+    if not known:
+        logging.error(f"--since-last-run needs an existing {JSONL_OUT}; run a full capture first.")
+        sys.exit(2)
+    logging.info(f"Delta crawl against {len(known)} known works (stop after {args.known_streak} in a row).")
+
+    store = PageStore(os.path.join(DELTA_DIR, datetime.now().strftime("%Y%m%d_%H%M%S")), args.storage)
+    work = queue.Queue()
+    for index, unit in enumerate(units):
+        work.put((index, unit))
+    results = {}
+    threads = [
+        threading.Thread(
+            target=delta_worker,
+            args=(i, work, results, known, store, rate_limiter, recorder, args),
+            daemon=True,
+        )
+        for i in range(1, args.workers + 1)
+    ]
+    for t in threads:
+        t.start()
+    try:
+        for t in threads:
+            t.join()
+    except KeyboardInterrupt:
+        logging.warning("Interrupted; nothing merged.")
+        sys.exit(1)
+
+    if len(results) != len(units):
+        logging.error("A worker failed; nothing merged.")
+        sys.exit(1)
+
+    new_records = [record for index in sorted(results) for record in results[index]]
+    added, replaced = merge_records(JSONL_OUT, new_records, MANIFEST_OUT)
+    logging.info(f"Merged {added} new and {replaced} updated records into {JSONL_OUT}.")
+
+    export_outputs(args)
 
 
 def main() -> None:
@@ -229,125 +1189,345 @@ def main() -> None:
         default=3,
         help="Retries for driver.get() navigation timeouts (default: 3)",
     )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=1,
+        help="Number of parallel Firefox drivers (default: 1)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["browser", "http"],
+        default="browser",
+        help=(
+            "Page fetch backend: 'browser' renders every page in Firefox; 'http' accepts consent in a short "
+            "Firefox session, then fetches with its cookies over plain HTTP, falling back to the browser on "
+            "challenges or 5xx responses (default: browser)"
+        ),
+    )
+    parser.add_argument(
+        "--parser",
+        choices=PARSER_ENGINES,
+        default="bs4",
+        help="List page parser engine; both produce identical records, 'lxml' is several times faster (default: bs4)",
+    )
+    parser.add_argument(
+        "--storage",
+        choices=STORAGE_FORMATS,
+        default="html",
+        help=(
+            "How new pages are saved: 'html' files, per-page 'gzip'/'zstd' files, or one indexed 'pack' file "
+            "per year. Existing pages are read back in any format (default: html)"
+        ),
+    )
+    parser.add_argument(
+        "--fragment",
+        action="store_true",
+        help="Save only the works list and pagination instead of the full page",
+    )
+    parser.add_argument(
+        "--extract",
+        choices=EXTRACT_MODES,
+        default="page",
+        help=(
+            "What the browser returns: the full 'page' source, only the works list and pagination "
+            "('fragment'), or the fragment plus records built in-page ('records') (default: page)"
+        ),
+    )
+    parser.add_argument(
+        "--lean-browser",
+        action="store_true",
+        help="Block images, stylesheets, web fonts and third-party hosts in Firefox",
+    )
+    parser.add_argument(
+        "--readiness",
+        choices=READINESS_MODES,
+        default="fixed",
+        help=(
+            "How to tell a page is ready: 'fixed' sleeps 2 s for the consent overlay then waits for the works "
+            "list; 'event' uses one in-page MutationObserver wait and skips the consent check once accepted "
+            "(default: fixed)"
+        ),
+    )
+    parser.add_argument(
+        "--requests-per-minute",
+        type=float,
+        default=REQUESTS_PER_MINUTE_DEFAULT,
+        help=(
+            f"Global request budget shared by all workers (default: {REQUESTS_PER_MINUTE_DEFAULT:.1f}, the pace of "
+            f"the former sequential crawler: ~{SEQUENTIAL_LOAD_S:.0f} s page load + "
+            f"{SEQUENTIAL_CONSENT_CHECK_S:.0f} s consent check + {SLEEP_MIN_S}-{SLEEP_MAX_S} s sleep per page)"
+        ),
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help=(
+            "Adapt the request budget to the site: raise it slowly while pages load normally, cut it on slow "
+            "pages, timeouts, 429/5xx responses and challenges (starts from --requests-per-minute)"
+        ),
+    )
+    parser.add_argument(
+        "--min-requests-per-minute",
+        type=float,
+        default=ADAPTIVE_MIN_RPM_DEFAULT,
+        help=f"Lowest budget --adaptive may fall to (default: {ADAPTIVE_MIN_RPM_DEFAULT:.1f})",
+    )
+    parser.add_argument(
+        "--max-requests-per-minute",
+        type=float,
+        default=ADAPTIVE_MAX_RPM_DEFAULT,
+        help=f"Highest budget --adaptive may climb to (default: {ADAPTIVE_MAX_RPM_DEFAULT:.1f})",
+    )
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=MAX_ATTEMPTS_DEFAULT,
+        help=(
+            f"Failed captures of a page, over all runs, before it is given up on and listed in {DEAD_LETTERS_OUT} "
+            f"(default: {MAX_ATTEMPTS_DEFAULT})"
+        ),
+    )
+    parser.add_argument(
+        "--retry-backoff",
+        type=float,
+        default=RETRY_BACKOFF_S_DEFAULT,
+        help=(
+            "Seconds a failed page waits before its first retry, doubled for each further retry; the other pages "
+            f"are fetched meanwhile (default: {RETRY_BACKOFF_S_DEFAULT})"
+        ),
+    )
+    parser.add_argument(
+        "--retry-dead",
+        action="store_true",
+        help=f"Give the pages given up on in earlier runs (status 'dead' in {JOBS_OUT}) another --max-attempts tries",
+    )
+    parser.add_argument(
+        "--stall-minutes",
+        type=float,
+        default=STALL_MINUTES_DEFAULT,
+        help=(
+            "Minutes a worker may spend on one page before its browser is killed, then the worker replaced; must "
+            "exceed --nav-attempts x --page-load-timeout; 0 disables the watchdog "
+            f"(default: {STALL_MINUTES_DEFAULT})"
+        ),
+    )
+    parser.add_argument(
+        "--max-restarts",
+        type=int,
+        default=MAX_RESTARTS_DEFAULT,
+        help=(
+            "Browser kills and worker replacements per run before giving up with exit status "
+            f"{EXIT_STALLED} (default: {MAX_RESTARTS_DEFAULT})"
+        ),
+    )
+    parser.add_argument(
+        "--no-discover",
+        action="store_true",
+        help=f"Use end_page from {INPUT_JSON} instead of discovering each year's page count",
+    )
+    parser.add_argument(
+        "--page-count-max-age",
+        type=float,
+        default=PAGE_COUNT_MAX_AGE_H_DEFAULT,
+        help=(
+            f"Reuse page counts cached in {PAGE_COUNTS_OUT} when younger than this many hours; "
+            f"0 forces rediscovery (default: {PAGE_COUNT_MAX_AGE_H_DEFAULT})"
+        ),
+    )
+    parser.add_argument(
+        "--windows",
+        action="store_true",
+        help=(
+            "Split each year into date windows (months, then weeks or days) of at most --window-pages pages, "
+            "to avoid deep pagination"
+        ),
+    )
+    parser.add_argument(
+        "--window-pages",
+        type=int,
+        default=WINDOW_MAX_PAGES_DEFAULT,
+        help=f"Largest page count of one date window (default: {WINDOW_MAX_PAGES_DEFAULT})",
+    )
+    parser.add_argument(
+        "--since-last-run",
+        action="store_true",
+        help=(
+            "Delta crawl: re-crawl each year from page 1 until --known-streak consecutive works are already in "
+            "lists.jsonl, then merge the new or updated records"
+        ),
+    )
+    parser.add_argument(
+        "--known-streak",
+        type=int,
+        default=KNOWN_STREAK_DEFAULT,
+        help=f"Consecutive known works that end a delta crawl of a year or window (default: {KNOWN_STREAK_DEFAULT})",
+    )
+    parser.add_argument(
+        "--base-url",
+        type=str,
+        default=None,
+        help=(
+            "Fetch the list pages from this server instead of AO3, e.g. ao3_replay_server.py at "
+            "http://127.0.0.1:8765 (path and query of each list URL are kept)"
+        ),
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        default=None,
+        metavar="I/N",
+        help=(
+            "Capture only shard I of N: every Nth page of each year or window, starting at page I, with its own "
+            f"outputs under {OUTPUT_ROOT}/00_shards/shard_I_of_N/; combine the N shards with "
+            "'python ao3_lists_shards.py merge --shards N'"
+        ),
+    )
+    parser.add_argument(
+        "--no-excel",
+        action="store_true",
+        help=f"Skip the {EXCEL_OUT} export (the Parquet dataset {PARQUET_OUT} is always written)",
+    )
     args = parser.parse_args()
 
+    # Shards running side by side keep their own logs and outputs
+    log_file = LOG_FILE
+    if args.shard:
+        log_file = f"{os.path.splitext(LOG_FILE)[0]}_shard_{args.shard[0]}_of_{args.shard[1]}.log"
+        use_output_root(shard_root(OUTPUT_ROOT, *args.shard))
+
     # Logging Setup
     logging.basicConfig(
         level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(message)s",
-        handlers=[logging.FileHandler(LOG_FILE), logging.StreamHandler()],
+        format="%(asctime)s - %(levelname)s - %(threadName)s - %(message)s",
+        handlers=[logging.FileHandler(log_file), logging.StreamHandler()],
     )
 
     if not os.path.exists(INPUT_JSON):
         logging.error(f"Input file {INPUT_JSON} not found.")
         sys.exit(2)
 
-    with open(INPUT_JSON, "r", encoding="utf-8") as f:
-        year_configs = json.load(f)
-
-    driver = setup_driver(page_load_timeout_s=args.page_load_timeout)
-    all_metadata = []
-
-    try:
-        for config in year_configs:
-            year = config["year"]
-            base_url = config["list_url"]
-
-            start_page = config.get("start_page", 1)
-            end_page = args.pages if args.test else config["end_page"]
-
-            year_dir = os.path.join(LISTS_DIR, str(year))
-            os.makedirs(year_dir, exist_ok=True)
-
-            logging.info(f">>> Processing Year {year} (Range: {start_page} to {end_page})")
-
-            for page_num in range(start_page, end_page + 1):
-                file_name = f"{year}_{str(page_num).zfill(4)}.html"
-                file_path = os.path.join(year_dir, file_name)
-
-                # Checkpointing: if file exists and is non-empty, parse it and keep going
-                if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-                    logging.info(f"Skipping {file_name} (exists). Parsing content...")
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        works, has_next = scrape_page_content(f.read(), year)
-                        all_metadata.extend(works)
+    if args.workers < 1:
+        logging.error("--workers must be at least 1.")
+        sys.exit(2)
 
-                    if not has_next:
-                        logging.info(f"End of results reached at page {page_num} (no 'Next' button).")
-                        break
-                    continue
+    if args.max_attempts < 1:
+        logging.error("--max-attempts must be at least 1.")
+        sys.exit(2)
 
-                url = f"{base_url}{page_num}"
-                logging.info(f"Fetching Page {page_num}: {url}")
+    if args.shard and args.since_last_run:
+        logging.error("--since-last-run re-crawls the merged lists.jsonl and cannot be sharded.")
+        sys.exit(2)
 
-                ok = safe_get(
-                    driver,
-                    url,
-                    year=year,
-                    page_num=page_num,
-                    attempts=args.nav_attempts,
-                )
-                if not ok:
-                    logging.error(f"driver.get() failed for page {page_num}. Stopping year {year}.")
-                    break
+    with open(INPUT_JSON, "r", encoding="utf-8") as f:
+        year_configs = json.load(f)
+    if args.base_url:
+        year_configs = [dict(config, list_url=rebase_url(config["list_url"], args.base_url)) for config in year_configs]
+        logging.warning(
+            f"Fetching from {args.base_url} instead of AO3; outputs still go to {OUTPUT_ROOT}, "
+            f"so run from a scratch directory to keep them apart from a real capture."
+        )
 
-                handle_consent(driver)
+    if args.adaptive:
+        try:
+            rate_limiter = AdaptiveRateLimiter(
+                args.requests_per_minute,
+                min_rpm=args.min_requests_per_minute,
+                max_rpm=args.max_requests_per_minute,
+            )
+        except ValueError as e:
+            logging.error(str(e))
+            sys.exit(2)
+        budget = (
+            f"an adaptive budget of {rate_limiter.rpm:.1f} requests/minute "
+            f"(bounds {rate_limiter.min_rpm:.1f}-{rate_limiter.max_rpm:.1f})"
+        )
+    else:
+        rate_limiter = RateLimiter(args.requests_per_minute)
+        budget = f"a global budget of {args.requests_per_minute:.1f} requests/minute"
 
-                try:
-                    WebDriverWait(driver, WAIT_FOR_WORKS_S).until(
-                        EC.presence_of_element_located((By.CLASS_NAME, "work"))
-                    )
-                except Exception:
-                    logging.error(f"Page {page_num} timed out or is empty. Stopping year {year}.")
-                    dump_debug_artifacts(driver, year=year, page_num=page_num, stage="no_works_timeout")
-                    break
+    threading.current_thread().name = "discovery"
+    units = plan_units(year_configs, args, rate_limiter)
+    threading.current_thread().name = "MainThread"
 
-                page_source = driver.page_source
-                with open(file_path, "w", encoding="utf-8") as f:
-                    f.write(page_source)
+    recover_merge(JSONL_OUT, MANIFEST_OUT)
+    recorder = MetricsRecorder(METRICS_OUT, METRICS_PROM_OUT)
+    if args.since_last_run:
+        logging.info(f"Starting {args.workers} worker(s) with {budget}.")
+        try:
+            run_delta_crawl(units, args, rate_limiter, recorder)
+        finally:
+            recorder.close()
+        return
 
-                page_works, has_next = scrape_page_content(page_source, year)
-                all_metadata.extend(page_works)
-                logging.info(f"Captured {len(page_works)} Original Works from page {page_num}.")
+    job_list = build_jobs(units, args)
+    if args.shard:
+        write_shard_plan(os.path.join(os.path.dirname(JSONL_OUT), SHARD_PLAN_FILE), *args.shard, units)
 
-                if not has_next:
-                    logging.info(f"Reached the definitive end of results for {year} at page {page_num}.")
-                    break
+    stream = MetadataStream(JSONL_OUT)
+    manifest = CheckpointManifest(MANIFEST_OUT)
+    store = PageStore(LISTS_DIR, args.storage)
+    state = CrawlState(
+        job_list, store, stream, manifest, recorder, last_pages={unit["unit"]: unit["end_page"] for unit in units}
+    )
+    ledger = JobLedger(JOBS_OUT)
+    job_queue = JobQueue(
+        job_list,
+        ledger,
+        max_attempts=args.max_attempts,
+        backoff_s=args.retry_backoff,
+        retry_dead=args.retry_dead,
+        stop_event=state.stop_event,
+    )
+    for index in job_queue.previously_dead:
+        state.finish(index, None)
+    if job_queue.previously_dead:
+        logging.warning(
+            f"Skipping {len(job_queue.previously_dead)} page(s) given up on in an earlier run "
+            f"(listed in {DEAD_LETTERS_OUT}; --retry-dead tries them again)."
+        )
+    logging.info(f"Starting {args.workers} worker(s) with {budget}.")
 
-                time.sleep(random.uniform(SLEEP_MIN_S, SLEEP_MAX_S))
+    supervisor = CrawlSupervisor(job_queue, state, rate_limiter, args)
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        logging.warning("Interrupted; waiting for workers to stop...")
+        supervisor.stop()
+        sys.exit(1)
+    finally:
+        if supervisor.exhausted:
+            supervisor.stop()
+        # Whatever was captured is already durable; this only drains pages buffered behind a gap
+        state.flush()
+        state.log_progress()
+        log_job_summary(job_queue)
+        stream.close()
+        manifest.close()
+        ledger.close()
+        recorder.close()
 
-                if page_num % RECYCLE_EVERY_N_PAGES == 0:
-                    logging.info("Cycling browser session...")
-                    try:
-                        driver.quit()
-                    except Exception:
-                        pass
-                    driver = setup_driver(page_load_timeout_s=args.page_load_timeout)
+    if supervisor.exhausted:
+        sys.exit(EXIT_STALLED)
 
-    except Exception:
-        logging.exception("Critical Error")
+    if state.error is not None:
         sys.exit(1)
-    finally:
-        try:
-            driver.quit()
-        except Exception:
-            pass
 
-    if not all_metadata:
+    if not stream.records:
         logging.error("No metadata collected; treating as failure.")
         sys.exit(1)
 
-    os.makedirs(OUTPUT_ROOT, exist_ok=True)
-    df = pd.DataFrame(all_metadata)
-
-    # Drop duplicates based on URL
-    if "URL" in df.columns:
-        df = df.drop_duplicates(subset=["URL"])
-
-    df.to_json(JSONL_OUT, orient="records", lines=True)
-    df.to_excel(EXCEL_OUT, index=False)
-    logging.info(f"SUCCESS: {len(df)} total records saved.")
+    if args.shard:
+        logging.info(
+            f"Shard {args.shard[0]}/{args.shard[1]} finished; once all shards have, combine them with "
+            f"'python ao3_lists_shards.py merge --shards {args.shard[1]}'."
+        )
+    else:
+        export_outputs(args)
+    if job_queue.dead:
+        sys.exit(EXIT_DEAD_LETTERS)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
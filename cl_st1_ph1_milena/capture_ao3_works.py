@@ -0,0 +1,461 @@
+# Usage
+# python capture_ao3_works.py --test                                # First works of corpus/00_sources/lists.jsonl
+# python capture_ao3_works.py --workers 4 --backend http --adaptive  # Every work in lists.jsonl (resumable)
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import queue
+import threading
+from datetime import datetime, timezone
+
+import requests
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import WebDriverException
+
+from ao3_common import OUTPUT_ROOT
+from ao3_works_parser import format_text, is_adult_warning, work_id, work_status, work_text
+from ao3_works_storage import WORK_FORMATS, WorkIndex, WorkStore
+from ao3_session import (
+    ADAPTIVE_MAX_RPM_DEFAULT,
+    ADAPTIVE_MIN_RPM_DEFAULT,
+    ADAPTIVE_PENALTY_S,
+    CHALLENGE_MARKERS,
+    HTTP_TIMEOUT_S,
+    NAV_DURATION_JS,
+    PAGE_LOAD_TIMEOUT_S_DEFAULT,
+    REQUESTS_PER_MINUTE_DEFAULT,
+    AdaptiveRateLimiter,
+    RateLimiter,
+    WorkerSession,
+    dump_debug_artifacts,
+    handle_consent,
+    rebase_url,
+    safe_get,
+)
+
+# Configuration
+LISTS_JSONL = os.path.join(OUTPUT_ROOT, "lists.jsonl")
+WORKS_DIR = os.path.join(OUTPUT_ROOT, "00_works")
+INDEX_OUT = os.path.join(OUTPUT_ROOT, "works_index.jsonl")
+LOG_FILE = "capture_ao3_works.log"
+
+# Works still "failed" after this many attempts (over all runs) are left alone
+MAX_ATTEMPTS_DEFAULT = 3
+# Works captured in test mode
+TEST_WORKS = 20
+# Jobs buffered ahead of the fetchers, per worker: lists.jsonl is streamed, never loaded whole
+QUEUE_PER_WORKER = 4
+# Progress is logged every this many finished works
+PROGRESS_EVERY_N_WORKS = 25
+
+# Statuses that are not fetched again ("ok" only while its files still exist)
+FINAL_STATUSES = ("ok", "restricted", "gone")
+
+
+def http_get_work(
+        session: requests.Session,
+        url: str,
+        *,
+        wid: str,
+        rate_limiter: RateLimiter,
+) -> tuple | None:
+    """
+    Fetches a work page over plain HTTP and returns (status, html, final URL).
+    Returns None on a challenge page, 5xx/429/403/404, network error or an unrecognised page, so the caller can
+    fall back to the browser.
+    """
+    rate_limiter.acquire()
+    start = time.monotonic()
+    try:
+        response = session.get(url, timeout=HTTP_TIMEOUT_S)
+    except requests.exceptions.RequestException as e:
+        logging.warning(f"HTTP fetch failed for work {wid}: {e}. Falling back to browser.")
+        rate_limiter.report_failure("HTTP network error")
+        return None
+    elapsed_ms = (time.monotonic() - start) * 1000
+
+    if response.status_code == 404:
+        # AO3 also answers 404 to logged-out requests for some restricted works, so the browser decides
+        logging.info(f"HTTP 404 for work {wid}; confirming in the browser.")
+        rate_limiter.report_success(elapsed_ms)
+        return None
+    if response.status_code >= 500 or response.status_code in (403, 429):
+        logging.warning(f"HTTP {response.status_code} for work {wid}. Falling back to browser.")
+        pause_s = None
+        if response.status_code in (429, 525):
+            retry_after = response.headers.get("Retry-After", "")
+            pause_s = float(retry_after) if retry_after.isdigit() else ADAPTIVE_PENALTY_S
+        rate_limiter.report_failure(f"HTTP {response.status_code}", pause_s)
+        return None
+
+    html = response.text
+    challenged = any(marker in html for marker in CHALLENGE_MARKERS)
+    status = work_status(html, response.url)
+    if challenged or status == "failed":
+        logging.warning(f"Challenge or unexpected page for work {wid}. Falling back to browser.")
+        if challenged:
+            rate_limiter.report_failure("challenge page")
+        return None
+
+    rate_limiter.report_success(elapsed_ms)
+    return status, html, response.url
+
+
+def consent_prompt_visible(driver) -> bool:
+    """Whether the AO3 Terms overlay is still shown (assumed so if the browser cannot tell)."""
+    try:
+        prompt = driver.find_elements(By.ID, "tos_prompt")
+        return bool(prompt) and prompt[0].is_displayed()
+    except WebDriverException:
+        return True
+
+
+def browser_get_work(session: WorkerSession, url: str, *, year: int, wid: str, rate_limiter: RateLimiter) -> tuple:
+    """
+    Loads a work page in Firefox, accepting the AO3 Terms until a work has been seen with the overlay gone.
+    A page that is still the adult content warning is loaded once more, then left "failed" for a later attempt.
+    Returns (status, html, final URL); html is None when navigation failed.
+    """
+    driver = session.get_driver()
+    for load in range(2):
+        if not safe_get(
+            driver,
+            url,
+            year=year,
+            page_num=int(wid),
+            attempts=session.args.nav_attempts,
+            rate_limiter=rate_limiter,
+        ):
+            logging.error(f"driver.get() failed for work {wid}.")
+            return "failed", None, url
+
+        if not session.consented:
+            handle_consent(driver)
+
+        html = driver.page_source
+        final_url = driver.current_url
+        status = work_status(html, final_url)
+        if status == "ok" and not consent_prompt_visible(driver):
+            session.consented = True
+        if load or not is_adult_warning(html):
+            break
+        # Accepting the Terms can redirect to the work without ?view_adult=true
+        logging.warning(f"Work {wid} shows the adult content warning; loading it again.")
+        session.consented = False
+
+    if status == "failed":
+        warning = is_adult_warning(html)
+        logging.error(f"Work {wid} {'still shows the adult content warning' if warning else 'has no chapter text'}.")
+        if any(marker in html for marker in CHALLENGE_MARKERS):
+            rate_limiter.report_failure("challenge page")
+        stage = "work_adult_warning" if warning else "work_no_text"
+        dump_debug_artifacts(driver, year=year, page_num=int(wid), stage=stage)
+        return status, html, final_url
+
+    try:
+        load_ms = driver.execute_script(NAV_DURATION_JS)
+    except WebDriverException:
+        load_ms = None
+    rate_limiter.report_success(load_ms)
+    session.after_browser_page(load_ms)
+    return status, html, final_url
+
+
+def capture_work(
+        session: WorkerSession,
+        record: dict,
+        store: WorkStore,
+        index: WorkIndex,
+        rate_limiter: RateLimiter,
+) -> str:
+    """Fetches one work, stores its page and text and records its status. Returns the status."""
+    url, year = record["URL"], record["Year"]
+    wid = work_id(url)
+    if session.args.base_url:
+        url = rebase_url(url, session.args.base_url)
+    logging.info(f"Fetching work {wid}: {url}")
+
+    fetched = None
+    if session.http is not None:
+        fetched = http_get_work(session.http, url, wid=wid, rate_limiter=rate_limiter)
+    if fetched is None:
+        fetched = browser_get_work(session, url, year=year, wid=wid, rate_limiter=rate_limiter)
+    status, html, final_url = fetched
+
+    previous = index.get(wid)
+    entry = {
+        "work_id": wid,
+        "year": year,
+        "url": record["URL"],
+        "status": status,
+        "attempts": (previous["attempts"] if previous else 0) + 1,
+        "fetched_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    if status == "ok":
+        chapters = work_text(html)
+        text = format_text(chapters)
+        entry.update(store.write(year, wid, html, text), chapters=len(chapters), text_chars=len(text))
+        logging.info(f"Captured work {wid}: {len(chapters)} chapter(s), {len(text)} characters.")
+    else:
+        if status != "failed" and final_url != url:
+            entry["final_url"] = final_url
+        logging.info(f"Work {wid}: {status}.")
+    index.record(entry)
+    return status
+
+
+def is_done(entry: dict | None, store: WorkStore, max_attempts: int) -> bool:
+    """Whether a work needs no fetch: a final status (with its files), or out of attempts."""
+    if entry is None:
+        return False
+    if entry["status"] in FINAL_STATUSES:
+        return entry["status"] != "ok" or store.has_files(entry)
+    return entry["attempts"] >= max_attempts
+
+
+class WorkQueue:
+    """
+    Streams the records of lists.jsonl into a bounded queue, skipping works that are already done,
+    and counts what the fetchers finish.
+    """
+
+    def __init__(self, args: argparse.Namespace, store: WorkStore, index: WorkIndex):
+        self.args = args
+        self.store = store
+        self.index = index
+        self.jobs = queue.Queue(maxsize=args.workers * QUEUE_PER_WORKER)
+        self.stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self.queued = 0
+        self.skipped = 0
+        self.feeding = True
+        self.finished = {}
+
+    def _put(self, item) -> bool:
+        while not self.stop_event.is_set():
+            try:
+                self.jobs.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def feed(self) -> None:
+        """Producer thread: queues every work to fetch, then one end marker per worker."""
+        seen = set()
+        try:
+            with open(self.args.input, "r", encoding="utf-8") as f:
+                for line in f:
+                    if self.args.test and self.queued >= TEST_WORKS:
+                        break
+                    record = json.loads(line)
+                    wid = work_id(record["URL"])
+                    if wid is None or wid in seen:
+                        continue
+                    seen.add(wid)
+                    if is_done(self.index.get(wid), self.store, self.args.max_attempts):
+                        self.skipped += 1
+                        continue
+                    if not self._put(record):
+                        return
+                    self.queued += 1
+        finally:
+            self.feeding = False
+            logging.info(f"Queued {self.queued} works ({self.skipped} already done).")
+            for _ in range(self.args.workers):
+                self._put(None)
+
+    def finish(self, status: str) -> None:
+        with self._lock:
+            self.finished[status] = self.finished.get(status, 0) + 1
+            if sum(self.finished.values()) % PROGRESS_EVERY_N_WORKS == 0:
+                self._log_progress()
+
+    def log_progress(self) -> None:
+        with self._lock:
+            self._log_progress()
+
+    def _log_progress(self) -> None:
+        done = sum(self.finished.values())
+        rate = done / max(time.monotonic() - self._started, 1e-9) * 60
+        total = f"{self.queued}+" if self.feeding else str(self.queued)
+        statuses = ", ".join(f"{status} {n}" for status, n in sorted(self.finished.items()))
+        logging.info(f"Progress: {done}/{total} works ({statuses}), {rate:.1f} works/minute.")
+
+
+def work_worker(
+        worker_id: int,
+        work_queue: WorkQueue,
+        store: WorkStore,
+        index: WorkIndex,
+        rate_limiter: RateLimiter,
+        args: argparse.Namespace,
+) -> None:
+    """Fetches queued works with a dedicated Firefox driver and/or HTTP session until the end marker."""
+    threading.current_thread().name = f"worker-{worker_id}"
+    session = WorkerSession(args, rate_limiter)
+    try:
+        while not work_queue.stop_event.is_set():
+            try:
+                record = work_queue.jobs.get(timeout=1)
+            except queue.Empty:
+                continue
+            if record is None:
+                break
+            work_queue.finish(capture_work(session, record, store, index, rate_limiter))
+    except Exception:
+        logging.exception(f"Critical Error in worker {worker_id}")
+        work_queue.stop_event.set()
+    finally:
+        session.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Capture the full text of the AO3 works listed in lists.jsonl.")
+    parser.add_argument("--test", "-t", action="store_true", help=f"Run in test mode (first {TEST_WORKS} works)")
+    parser.add_argument(
+        "--input",
+        type=str,
+        default=LISTS_JSONL,
+        help=f"Work list from capture_ao3_lists.py (default: {LISTS_JSONL})",
+    )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=1,
+        help="Number of parallel fetchers, each with its own Firefox driver (default: 1)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["browser", "http"],
+        default="browser",
+        help=(
+            "Fetch every work in Firefox ('browser'), or accept consent in Firefox and fetch over plain HTTP "
+            "with its cookies, falling back to the browser ('http') (default: browser)"
+        ),
+    )
+    parser.add_argument(
+        "--storage",
+        choices=WORK_FORMATS,
+        default="gzip",
+        help="Compression of the saved work pages (default: gzip)",
+    )
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=MAX_ATTEMPTS_DEFAULT,
+        help=f"Attempts, over all runs, before a failing work is left alone (default: {MAX_ATTEMPTS_DEFAULT})",
+    )
+    parser.add_argument(
+        "--requests-per-minute",
+        type=float,
+        default=REQUESTS_PER_MINUTE_DEFAULT,
+        help=f"Global request budget shared by all workers (default: {REQUESTS_PER_MINUTE_DEFAULT:.1f})",
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="Adapt the request budget to the site, as in capture_ao3_lists.py --adaptive",
+    )
+    parser.add_argument(
+        "--min-requests-per-minute",
+        type=float,
+        default=ADAPTIVE_MIN_RPM_DEFAULT,
+        help=f"Lowest budget --adaptive may fall to (default: {ADAPTIVE_MIN_RPM_DEFAULT:.1f})",
+    )
+    parser.add_argument(
+        "--max-requests-per-minute",
+        type=float,
+        default=ADAPTIVE_MAX_RPM_DEFAULT,
+        help=f"Highest budget --adaptive may climb to (default: {ADAPTIVE_MAX_RPM_DEFAULT:.1f})",
+    )
+    parser.add_argument(
+        "--page-load-timeout",
+        type=int,
+        default=PAGE_LOAD_TIMEOUT_S_DEFAULT,
+        help=f"Selenium page load timeout (seconds, default: {PAGE_LOAD_TIMEOUT_S_DEFAULT})",
+    )
+    parser.add_argument(
+        "--nav-attempts",
+        type=int,
+        default=3,
+        help="Retries for driver.get() navigation timeouts (default: 3)",
+    )
+    parser.add_argument(
+        "--lean-browser",
+        action="store_true",
+        help="Block images, stylesheets, web fonts and third-party hosts in Firefox",
+    )
+    parser.add_argument(
+        "--base-url",
+        type=str,
+        default=None,
+        help="Fetch the works from this server instead of AO3 (path and query of each work URL are kept)",
+    )
+    parser.set_defaults(readiness="fixed")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(threadName)s - %(message)s",
+        handlers=[logging.FileHandler(LOG_FILE), logging.StreamHandler()],
+    )
+
+    if not os.path.exists(args.input):
+        logging.error(f"Input file {args.input} not found; run capture_ao3_lists.py first.")
+        sys.exit(2)
+    if args.workers < 1:
+        logging.error("--workers must be at least 1.")
+        sys.exit(2)
+
+    if args.adaptive:
+        try:
+            rate_limiter = AdaptiveRateLimiter(
+                args.requests_per_minute,
+                min_rpm=args.min_requests_per_minute,
+                max_rpm=args.max_requests_per_minute,
+            )
+        except ValueError as e:
+            logging.error(str(e))
+            sys.exit(2)
+    else:
+        rate_limiter = RateLimiter(args.requests_per_minute)
+
+    store = WorkStore(WORKS_DIR, args.storage)
+    index = WorkIndex(INDEX_OUT)
+    work_queue = WorkQueue(args, store, index)
+    logging.info(f"Starting {args.workers} worker(s) at {args.requests_per_minute:.1f} requests/minute.")
+
+    threads = [threading.Thread(target=work_queue.feed, name="feeder", daemon=True)]
+    threads += [
+        threading.Thread(target=work_worker, args=(i, work_queue, store, index, rate_limiter, args), daemon=True)
+        for i in range(1, args.workers + 1)
+    ]
+    for t in threads:
+        t.start()
+    try:
+        for t in threads:
+            t.join()
+    except KeyboardInterrupt:
+        logging.warning("Interrupted; waiting for workers to finish their current work...")
+        work_queue.stop_event.set()
+        for t in threads:
+            t.join()
+        sys.exit(1)
+    finally:
+        work_queue.log_progress()
+        index.close()
+
+    logging.info(f"Work index {INDEX_OUT}: {index.counts()}.")
+    if work_queue.stop_event.is_set():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# Usage
+# python measure_lean_browser.py            # First 5 pages of the first year in ao3_original_work_lists.json
+# python measure_lean_browser.py --pages 10 --year 2024
+# python measure_lean_browser.py --replay     # The test fixtures from a local replay server, without AO3
+
+import json
+import time
+import random
+import argparse
+import statistics
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+from ao3_lists_storage import PageStore, unit_year
+from ao3_replay_server import ReplayConfig, start_replay_server
+from ao3_session import AO3_HOST, SLEEP_MAX_S, SLEEP_MIN_S, handle_consent, rebase_url, setup_driver
+from capture_ao3_lists import INPUT_JSON, PAGE_STATS_JS, WAIT_FOR_WORKS_S
+
+# Saved test crawl served by --replay
+FIXTURE_LISTS_DIR = "corpus/00_test/00_lists"
+
+
+def load_page(driver, url: str) -> dict:
+    """Loads one list page the way the crawler does and returns its timing and transfer statistics."""
+    start = time.perf_counter()
+    driver.get(url)
+    handle_consent(driver)
+    WebDriverWait(driver, WAIT_FOR_WORKS_S).until(EC.presence_of_element_located((By.CLASS_NAME, "work")))
+    stats = driver.execute_script(PAGE_STATS_JS)
+    stats["ready_ms"] = (time.perf_counter() - start) * 1000
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure page-load latency and bytes transferred with the lean browser profile on and off."
+    )
+    parser.add_argument("--pages", "-p", type=int, default=5, help="List pages to load per profile (default: 5)")
+    parser.add_argument("--year", type=int, default=None, help="Year to sample (default: first in the input JSON)")
+    parser.add_argument(
+        "--replay",
+        action="store_true",
+        help=f"Load the pages from a local replay server of {FIXTURE_LISTS_DIR} instead of AO3 (no sleeps)",
+    )
+    args = parser.parse_args()
+
+    with open(INPUT_JSON, "r", encoding="utf-8") as f:
+        year_configs = json.load(f)
+    server = None
+    allowed_hosts = (AO3_HOST,)
+    if args.replay:
+        store = PageStore(FIXTURE_LISTS_DIR)
+        saved = {(unit_year(unit), page_num) for unit, page_num in store.pages()}
+        year_configs = [c for c in year_configs if (c["year"], 1) in saved]
+    config = next(c for c in year_configs if args.year in (None, c["year"]))
+    urls = [f"{config['list_url']}{page_num}" for page_num in range(1, args.pages + 1)]
+    if args.replay:
+        urls = [url for page_num, url in enumerate(urls, 1) if (config["year"], page_num) in saved]
+        server = start_replay_server(ReplayConfig(FIXTURE_LISTS_DIR))
+        origin = f"http://127.0.0.1:{server.server_address[1]}"
+        urls = [rebase_url(url, origin) for url in urls]
+        # The lean profile's PAC script must let the replay server through like AO3
+        allowed_hosts += ("127.0.0.1",)
+
+    drivers = {"full": setup_driver(), "lean": setup_driver(lean=True, allowed_hosts=allowed_hosts)}
+    results = {profile: [] for profile in drivers}
+    try:
+        # Same pages, profiles interleaved so both see the same site conditions
+        for url in urls:
+            for profile, driver in drivers.items():
+                stats = load_page(driver, url)
+                results[profile].append(stats)
+                print(
+                    f"{profile:>4} page={url.rsplit('=', 1)[1]}: ready {stats['ready_ms']:.0f} ms, "
+                    f"load {stats['load_ms'] or 0:.0f} ms, {stats['requests']} requests, {stats['bytes']} bytes"
+                )
+                if not args.replay:
+                    time.sleep(random.uniform(SLEEP_MIN_S, SLEEP_MAX_S))
+    finally:
+        for driver in drivers.values():
+            driver.quit()
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    print()
+    for profile, rows in results.items():
+        print(
+            f"{profile:>4}: median ready {statistics.median(r['ready_ms'] for r in rows):.0f} ms, "
+            f"median requests {statistics.median(r['requests'] for r in rows):.0f}, "
+            f"median bytes {statistics.median(r['bytes'] for r in rows):.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# Usage
+# python reparse_ao3_lists.py                      # Rebuild corpus/00_sources/lists.jsonl, manifest, parquet and xlsx
+# python reparse_ao3_lists.py --root corpus/00_test --jobs 4
+
+import os
+import sys
+import json
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from ao3_lists_output import (
+    CheckpointManifest,
+    MetadataStream,
+    export_excel,
+    export_parquet,
+    page_entry,
+    recover_merge,
+)
+from ao3_lists_parser import PARSER_ENGINES, scrape_page_content
+from ao3_lists_storage import PageStore, unit_sort_key, unit_year
+
+INPUT_JSON = "ao3_original_work_lists.json"
+OUTPUT_ROOT = "corpus/00_sources"
+LOG_FILE = "reparse_ao3_lists.log"
+
+# One read-only store per pool process, so pack indexes are loaded once per process
+_store = None
+
+
+def discover_pages(store: PageStore, year_order: list) -> list:
+    """
+    Lists stored pages (in any storage format) as (unit, page), ordered like a capture run:
+    years in the order of the input JSON (unknown years after them, newest first), within a year the
+    whole-year pages and then its date windows chronologically, pages ascending.
+    """
+    rank = {year: i for i, year in enumerate(year_order)}
+
+    def order(p: tuple) -> tuple:
+        year = unit_year(p[0])
+        return rank.get(year, len(rank)), -year, unit_sort_key(p[0]), p[1]
+
+    return sorted(store.pages(), key=order)
+
+
+def parse_page(job: tuple) -> tuple:
+    """Process pool task: parses one stored page and describes it for the manifest."""
+    global _store
+    unit, page_num, lists_dir, engine = job
+    if _store is None or _store.lists_dir != lists_dir:
+        _store = PageStore(lists_dir)
+    works, has_next = scrape_page_content(_store.read(unit, page_num), unit_year(unit), engine=engine)
+    return unit, page_num, works, page_entry(unit, page_num, _store, has_next, len(works))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Rebuild lists.jsonl (and manifest/parquet/xlsx) from saved AO3 list pages, without a browser."
+    )
+    parser.add_argument(
+        "--root",
+        type=str,
+        default=OUTPUT_ROOT,
+        help=f"Output root holding 00_lists/ (default: {OUTPUT_ROOT})",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Parser processes (default: all cores)",
+    )
+    parser.add_argument(
+        "--parser",
+        choices=PARSER_ENGINES,
+        default="lxml",
+        help="List page parser engine (default: lxml)",
+    )
+    parser.add_argument("--no-excel", action="store_true", help="Skip the lists.xlsx export")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        handlers=[logging.FileHandler(LOG_FILE), logging.StreamHandler()],
+    )
+
+    year_order = []
+    if os.path.exists(INPUT_JSON):
+        with open(INPUT_JSON, "r", encoding="utf-8") as f:
+            year_order = [config["year"] for config in json.load(f)]
+
+    lists_dir = os.path.join(args.root, "00_lists")
+    pages = discover_pages(PageStore(lists_dir), year_order)
+    if not pages:
+        logging.error(f"No saved list pages found under {lists_dir}.")
+        sys.exit(2)
+    logging.info(f"Reparsing {len(pages)} pages with {args.jobs} process(es) ({args.parser} engine)...")
+
+    jsonl_out = os.path.join(args.root, "lists.jsonl")
+    manifest_out = os.path.join(args.root, "manifest.jsonl")
+    # Settle an interrupted delta merge first, so its leftovers are not committed over the rebuilt files later
+    recover_merge(jsonl_out, manifest_out)
+    tmp_jsonl, tmp_manifest = f"{jsonl_out}.reparse", f"{manifest_out}.reparse"
+    for path in (tmp_jsonl, tmp_manifest):
+        if os.path.exists(path):
+            os.remove(path)
+
+    stream = MetadataStream(tmp_jsonl)
+    manifest = CheckpointManifest(tmp_manifest)
+    ended_units = set()
+    tasks = [(unit, page_num, lists_dir, args.parser) for unit, page_num in pages]
+    chunksize = max(1, len(tasks) // (args.jobs * 8))
+
+    try:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            # map() yields in submission order, so the merge is deterministic whatever the scheduling
+            for unit, page_num, works, entry in pool.map(parse_page, tasks, chunksize=chunksize):
+                if unit in ended_units:
+                    logging.warning(f"Ignoring {unit} page {page_num}: after the last page of the unit.")
+                    continue
+                offset, length, records = stream.write_page(works)
+                manifest.record(dict(entry, offset=offset, length=length, records=records))
+                if not entry["has_next"]:
+                    ended_units.add(unit)
+    finally:
+        stream.close()
+        manifest.close()
+
+    os.replace(tmp_jsonl, jsonl_out)
+    os.replace(tmp_manifest, manifest_out)
+    logging.info(f"Wrote {stream.records} records to {jsonl_out}.")
+
+    parquet_out = os.path.join(args.root, "lists.parquet")
+    rows = export_parquet(jsonl_out, parquet_out)
+    logging.info(f"Exported {rows} records to {parquet_out}.")
+
+    if not args.no_excel:
+        excel_out = os.path.join(args.root, "lists.xlsx")
+        rows = export_excel(jsonl_out, excel_out)
+        logging.info(f"Exported {rows} records to {excel_out}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -29,6 +29,11 @@ SNS_REGION="sa-east-1"  # Region of the SNS topic above
 # Will be set in main(), used for notifications
 SCRIPT_INVOCATION=""
 
+# A program exiting with this status asks to be run again (capture_ao3_lists.py exits with it when its
+# hang watchdog used up its restart budget); the new run resumes from the checkpoints.
+RERUN_EXIT_CODE=75
+MAX_RERUNS=3  # Reruns per invocation before the instance is stopped anyway
+
 
 # ---------------------------------------------------------------------------
 # Python runner
@@ -61,9 +66,19 @@ run_python_program() {
   fi
 
   # -u for unbuffered output (logs stream immediately, useful with nohup)
-  python -u "$python_program" "${python_args[@]}"
+  local status=0 reruns=0
+  while true; do
+    status=0
+    python -u "$python_program" "${python_args[@]}" || status=$?
+    if [[ "$status" -ne "$RERUN_EXIT_CODE" || "$reruns" -ge "$MAX_RERUNS" ]]; then
+      break
+    fi
+    reruns=$((reruns + 1))
+    echo "$python_program asked to be run again (exit status $status); rerun $reruns/$MAX_RERUNS..." >&2
+  done
 
   conda deactivate || true
+  return "$status"
 }
 
 
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The phase-1 modules are flat scripts run from their own directory
+PH1_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PH1_DIR)
+
+TEST_LISTS_DIR = os.path.join(PH1_DIR, "corpus", "00_test", "00_lists")
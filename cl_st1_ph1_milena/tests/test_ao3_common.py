@@ -0,0 +1,42 @@
+import json
+
+from ao3_common import KeyedJsonlLog, read_keyed_jsonl
+from ao3_works_storage import WorkIndex
+
+
+def test_last_entry_wins_and_log_is_compacted_on_load(tmp_path):
+    path = tmp_path / "index.jsonl"
+    lines = [
+        {"work_id": "1", "status": "failed"},
+        {"work_id": "2", "status": "ok"},
+        {"work_id": "1", "status": "ok"},
+    ]
+    path.write_text("".join(json.dumps(entry) + "\n" for entry in lines) + '{"work_id": "3", "sta', encoding="utf-8")
+
+    index = WorkIndex(str(path))
+    assert index.get("1")["status"] == "ok"
+    assert index.get("3") is None
+    assert index.counts() == {"ok": 2}
+    index.record({"work_id": "3", "status": "gone"})
+    index.close()
+
+    entries, read = read_keyed_jsonl(str(path), lambda entry: entry["work_id"])
+    assert read == 3
+    assert entries["3"]["status"] == "gone"
+
+
+def test_torn_last_line_is_dropped_before_appending(tmp_path):
+    path = tmp_path / "index.jsonl"
+    path.write_text('{"work_id": "1", "status": "ok"}\n{"work_id": "2", "sta', encoding="utf-8")
+    index = WorkIndex(str(path))
+    index.record({"work_id": "2", "status": "ok"})
+    index.close()
+    assert WorkIndex(str(path)).counts() == {"ok": 2}
+
+
+def test_new_log_is_created(tmp_path):
+    log = KeyedJsonlLog(str(tmp_path / "sub" / "log.jsonl"), key=lambda entry: entry["id"])
+    assert len(log) == 0
+    log.record({"id": "a"})
+    log.close()
+    assert (tmp_path / "sub" / "log.jsonl").read_text(encoding="utf-8") == '{"id": "a"}\n'
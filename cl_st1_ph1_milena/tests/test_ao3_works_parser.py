@@ -0,0 +1,23 @@
+import os
+
+from ao3_works_parser import is_adult_warning, work_status
+from conftest import PH1_DIR
+
+PH0_DIR = os.path.join(os.path.dirname(PH1_DIR), "cl_st1_ph0_milena")
+
+
+def read_sample(name: str) -> str:
+    with open(os.path.join(PH0_DIR, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def test_adult_warning_page_is_failed_and_recognised():
+    html = read_sample("ao3_work_2_warning.html")
+    assert work_status(html) == "failed"
+    assert is_adult_warning(html)
+
+
+def test_work_page_is_not_a_warning():
+    html = read_sample("ao3_work_2.html")
+    assert work_status(html) == "ok"
+    assert not is_adult_warning(html)
@@ -0,0 +1,48 @@
+import os
+import json
+
+from ao3_lists_metrics import MetricsRecorder
+from ao3_lists_output import CheckpointManifest, MetadataStream, page_entry
+from ao3_lists_parser import scrape_page_content
+from ao3_lists_storage import PageStore
+from capture_ao3_lists import CrawlState
+from conftest import TEST_LISTS_DIR
+
+YEAR = 2020
+PAGES = [1, 2, 3]
+
+
+def test_pages_behind_a_retry_are_written_before_it(tmp_path):
+    root = str(tmp_path)
+    fixtures = PageStore(TEST_LISTS_DIR)
+    store = PageStore(os.path.join(root, "00_lists"))
+    stream = MetadataStream(os.path.join(root, "lists.jsonl"))
+    manifest = CheckpointManifest(os.path.join(root, "manifest.jsonl"))
+    recorder = MetricsRecorder(os.path.join(root, "metrics.jsonl"), os.path.join(root, "metrics.prom"))
+    state = CrawlState([(YEAR, page_num, "") for page_num in PAGES], store, stream, manifest, recorder)
+
+    def result(page_num: int) -> tuple:
+        html = fixtures.read(YEAR, page_num)
+        store.write(YEAR, page_num, html)
+        works, has_next = scrape_page_content(html, YEAR, engine="lxml")
+        return works, page_entry(YEAR, page_num, store, has_next, len(works))
+
+    def on_disk() -> list:
+        with open(manifest.path, "r", encoding="utf-8") as f:
+            return [json.loads(line)["page"] for line in f]
+
+    # Job 0 fails into its backoff; jobs 1 and 2 succeed meanwhile
+    state.finish(1, result(2))
+    state.defer(0)
+    state.finish(2, result(3))
+    assert on_disk() == [2, 3]
+    written = stream.records
+
+    # The retry succeeds: its records are appended after the pages that overtook it
+    state.finish(0, result(1))
+    assert on_disk() == [2, 3, 1]
+    assert stream.records > written
+    page_1 = manifest.get((YEAR, 1))
+    assert page_1["offset"] == os.path.getsize(stream.path) - page_1["length"]
+    stream.close()
+    manifest.close()
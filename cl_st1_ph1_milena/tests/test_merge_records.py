@@ -0,0 +1,82 @@
+import os
+import json
+
+from ao3_lists_output import CheckpointManifest, MetadataStream, merge_records, page_entry, recover_merge
+from ao3_lists_parser import scrape_page_content
+from ao3_lists_storage import PageStore
+from conftest import TEST_LISTS_DIR
+
+PAGES = [(2021, 1), (2021, 2), (2020, 1), (2020, 2), (2020, 3)]
+
+
+def capture(root: str) -> dict:
+    """Captures some fixture pages like a crawl would; returns {(unit, page): [URL, ...]}."""
+    fixtures = PageStore(TEST_LISTS_DIR)
+    store = PageStore(os.path.join(root, "00_lists"))
+    stream = MetadataStream(os.path.join(root, "lists.jsonl"))
+    manifest = CheckpointManifest(os.path.join(root, "manifest.jsonl"))
+    urls = {}
+    for unit, page_num in PAGES:
+        html = fixtures.read(unit, page_num)
+        store.write(unit, page_num, html)
+        works, has_next = scrape_page_content(html, unit, engine="lxml")
+        offset, length, records = stream.write_page(works)
+        entry = page_entry(unit, page_num, store, has_next, len(works))
+        manifest.record(dict(entry, offset=offset, length=length, records=records))
+        urls[(unit, page_num)] = [work["URL"] for work in works]
+    stream.close()
+    manifest.close()
+    return urls
+
+
+def page_urls(path: str, entry: dict) -> list:
+    with open(path, "rb") as f:
+        f.seek(entry["offset"])
+        return [json.loads(line)["URL"] for line in f.read(entry["length"]).splitlines()]
+
+
+def test_resume_after_merge_reads_the_right_records(tmp_path):
+    root = str(tmp_path)
+    urls = capture(root)
+    jsonl_path, manifest_path = os.path.join(root, "lists.jsonl"), os.path.join(root, "manifest.jsonl")
+    updated_url = urls[(2020, 2)][1]
+    new_records = [
+        {"Year": 2020, "Title": "Updated", "URL": updated_url},
+        {"Year": 2021, "Title": "New", "URL": "https://archiveofourown.org/works/1?view_adult=true"},
+    ]
+
+    assert merge_records(jsonl_path, new_records, manifest_path) == (1, 1)
+
+    # Resume: every page is still a checkpoint hit and its range holds its own records
+    stream = MetadataStream(jsonl_path)
+    manifest = CheckpointManifest(manifest_path)
+    store = PageStore(os.path.join(root, "00_lists"))
+    for unit, page_num in PAGES:
+        entry = manifest.lookup(unit, page_num, store, stream.size)
+        assert entry is not None
+        expected = [url for url in urls[(unit, page_num)] if url != updated_url]
+        assert page_urls(jsonl_path, entry) == expected
+        assert entry["records"] == len(expected)
+    stream.close()
+    manifest.close()
+
+
+def test_interrupted_merge_is_completed_or_rolled_back(tmp_path):
+    jsonl_path, manifest_path = str(tmp_path / "lists.jsonl"), str(tmp_path / "manifest.jsonl")
+    for path, text in ((jsonl_path, "old\n"), (manifest_path, "old\n")):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    # Crash before the stream was committed: both leftovers go
+    for path in (f"{jsonl_path}.merge", f"{manifest_path}.merge"):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("new\n")
+    recover_merge(jsonl_path, manifest_path)
+    assert not os.path.exists(f"{jsonl_path}.merge") and not os.path.exists(f"{manifest_path}.merge")
+    assert open(manifest_path, encoding="utf-8").read() == "old\n"
+
+    # Crash after the stream was committed: the rebuilt manifest is committed too
+    with open(f"{manifest_path}.merge", "w", encoding="utf-8") as f:
+        f.write("new\n")
+    recover_merge(jsonl_path, manifest_path)
+    assert open(manifest_path, encoding="utf-8").read() == "new\n"
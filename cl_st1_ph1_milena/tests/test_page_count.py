@@ -0,0 +1,55 @@
+import os
+import re
+
+import capture_ao3_lists
+from ao3_lists_parser import has_works, page_count
+from ao3_replay_server import EMPTY_LIST_PAGE
+from conftest import TEST_LISTS_DIR
+
+
+def read_list_page(year: int, page_num: int) -> str:
+    with open(os.path.join(TEST_LISTS_DIR, str(year), f"{year}_{page_num:04d}.html"), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def rewrite_pagination(html: str, rewrite) -> str:
+    return re.sub(
+        r'(<ol class="pagination[^>]*>)(.*?)(</ol>)',
+        lambda m: m.group(1) + rewrite(m.group(2)) + m.group(3),
+        html,
+        flags=re.S,
+    )
+
+
+def test_page_count_reads_pagination():
+    assert page_count(read_list_page(2020, 1)) == 831
+
+
+def test_page_count_is_unknown_when_pagination_is_unreadable():
+    # Markup change: the page number items get a class, so no page number can be read, but there is a next page
+    html = rewrite_pagination(read_list_page(2020, 1), lambda items: items.replace("<li>", '<li class="page">'))
+    assert has_works(html)
+    assert page_count(html) is None
+
+
+def test_page_count_is_one_without_pagination_or_next_page():
+    html = rewrite_pagination(read_list_page(2020, 1), lambda items: "")
+    assert page_count(html) == 1
+
+
+def test_page_count_and_has_works_on_page_past_the_end():
+    assert page_count(EMPTY_LIST_PAGE) is None
+    assert not has_works(EMPTY_LIST_PAGE)
+
+
+def test_search_probes_past_the_end(monkeypatch):
+    last_page = 37
+    full_page, calls = read_list_page(2020, 1), []
+
+    def fake_fetch_page(session, url, *, year, page_num, rate_limiter, probe=False):
+        calls.append((page_num, probe))
+        return (full_page if page_num <= last_page else EMPTY_LIST_PAGE), None
+
+    monkeypatch.setattr(capture_ao3_lists, "fetch_page", fake_fetch_page)
+    assert capture_ao3_lists.search_page_count(None, "https://example.org/works?page=", 2020, 4, None) == last_page
+    assert all(probe for _, probe in calls)